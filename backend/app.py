@@ -1,283 +1,406 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, abort, request
 from flask import send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
-from openai import OpenAI
+from flask_socketio import SocketIO, emit, join_room
 from dotenv import load_dotenv
-from io import BytesIO
+import atexit
+import hmac
 import os
-import requests
 import json
-from datetime import datetime
-import re
+import queue
 import uuid
-import sqlite3
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from case_journal import CaseJournal
+from case_sessions import HISTORY_SUMMARY_CHARS, CaseSessionStore, shorten
+from extraction import extract_patient_info
+from hospital_index import HospitalDirectory
+from http_transport import HTTPTransport, iter_body
+from inventory_view import InventoryView
+from operator_fanout import OPERATORS_ROOM, STREAMED_EVENTS, OperatorFanout
+from knowledge_base import KnowledgeBase
+from lifecycle import Lifecycle, bootstrap_databases
+from name_index import PatientNameIndex
+from patient_store import PatientStore
+from prompt_builder import PromptBuilder, case_severity
+from resource_store import ResourceStore
+from scheduler import BACKGROUND, CRITICAL, LANES, NORMAL, OPERATOR, Overloaded, Scheduler, StagePool
+from shared_state import create_shared_state
+from streaming import ChunkSequencer, SentenceSplitter
+from stt import AudioChunkBuffer, create_backend as create_stt_backend
+from tasks import BackgroundResult
+from telemetry import Registry, SamplingProfiler, Tracer, configure_logging, log_event
+from tts_cache import CHUNK_BYTES, TTSCache
 
 load_dotenv()
 
+# Start-up phases, readiness for /healthz and the time to the first served call. The warm-up
+# (WARMUP_ENABLED) loads the knowledge base and inventory and opens WARMUP_CONNECTIONS keep-alive
+# connections to the Deepgram host (plus one to Cerebras), each handshake bounded by WARMUP_TIMEOUT
+# seconds, before /healthz reports ready; disabled, everything loads on first use instead
+lifecycle = Lifecycle()
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "5"))
+
+# Routes and Socket.IO handlers are declared on these at import; create_app() binds them to the
+# Flask app, so importing this module stays cheap and side-effect free
+routes = Blueprint("backend", __name__)
+socketio = SocketIO()
+app = None
+CORS_ORIGINS = ["http://localhost:3000", "http://localhost:3001"]
+
+# Track connected clients by their origin port ("3000" users, "3001" operators) and each
+# request's published events; in Redis when SHARED_STATE_URL is set so all workers agree
+client_registry, case_store = create_shared_state(
+    os.getenv("SHARED_STATE_URL", os.getenv("SOCKETIO_MESSAGE_QUEUE")),
+    case_ttl=int(os.getenv("CASE_TTL_SECONDS", "3600"))
+)
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://localhost:3001"]}})
-socketio = SocketIO(app, cors_allowed_origins=["http://localhost:3000", "http://localhost:3001"], cors_credentials=False)
-app.config["SECRET_KEY"] = "secret!"
-
-# Track connected clients by their origin port
-connected_clients = {
-    "3000": set(),  # User clients
-    "3001": set()   # Operator clients
-}
+# Operators share one room, so a broadcast is one emit with the payload encoded once.
+# OPERATOR_CASE_UPDATE_MS > 0 merges each request's events into coalesced case_update messages
+operator_fanout = OperatorFanout(socketio, coalesce_window=float(os.getenv("OPERATOR_CASE_UPDATE_MS", "0")) / 1000)
 
 def broadcast_to_operators(event_name, data, exclude_sid=None):
     """Broadcast event to all operator clients (3001)"""
-    for operator_sid in connected_clients["3001"]:
-        if operator_sid != exclude_sid:
-            emit(event_name, data, to=operator_sid)
-
-# Initialize Cerebras client
-cerebras_client = OpenAI(
-    api_key=os.getenv("CEREBRAS_API_KEY"),
-    base_url=os.getenv("CEREBRAS_BASE_URL")
-)
+    operator_fanout.publish(event_name, data, exclude_sid)
+
+# Cerebras client (OpenAI-compatible). The openai package takes most of a second to import, so
+# it is imported on first use, which the warm-up makes happen before the worker reports ready
+cerebras_client = None
+cerebras_client_lock = threading.Lock()
+
+def llm_client():
+    global cerebras_client
+    if cerebras_client is None:
+        with cerebras_client_lock:
+            if cerebras_client is None:
+                from openai import OpenAI
+                cerebras_client = OpenAI(
+                    api_key=os.getenv("CEREBRAS_API_KEY"),
+                    base_url=os.getenv("CEREBRAS_BASE_URL")
+                )
+    return cerebras_client
 
 # Deepgram API configuration
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
-DEEPGRAM_URL_STT = "https://api.deepgram.com/v1/listen"
-DEEPGRAM_URL_TTS = "https://api.deepgram.com/v1/speak"
+DEEPGRAM_URL_STT = os.getenv("DEEPGRAM_URL_STT", "https://api.deepgram.com/v1/listen")
+DEEPGRAM_URL_TTS = os.getenv("DEEPGRAM_URL_TTS", "https://api.deepgram.com/v1/speak")
+TTS_MODEL = "aura-asteria-en"
+TTS_ENCODING = "mp3"
+
+# Shared keep-alive session for the Deepgram REST calls: per-stage deadlines, jittered
+# retries on 5xx/429, optional hedged second request past the observed p95
+deepgram_http = HTTPTransport(
+    headers={"Authorization": f"Token {DEEPGRAM_API_KEY}"},
+    pool_size=int(os.getenv("DEEPGRAM_POOL_SIZE", "10")),
+    retries=int(os.getenv("DEEPGRAM_RETRIES", "2")),
+    hedge=os.getenv("DEEPGRAM_HEDGE", "false").lower() in ("1", "true", "yes")
+)
+STT_DEADLINE = float(os.getenv("DEEPGRAM_STT_DEADLINE", "20"))
+TTS_DEADLINE = float(os.getenv("DEEPGRAM_TTS_DEADLINE", "10"))
+
+# Streaming STT for audio_chunk ingestion ("deepgram" live websocket or offline "replay")
+stt_backend = create_stt_backend(os.getenv("STT_BACKEND", "deepgram"), DEEPGRAM_API_KEY)
+STT_CHUNK_BUFFER = int(os.getenv("STT_CHUNK_BUFFER", "64"))
+# An utterance without a chunk for this long is finished with what was heard and frees its call slot
+STT_STREAM_IDLE_TIMEOUT = float(os.getenv("STT_STREAM_IDLE_TIMEOUT", "10"))
+
+# Open audio_chunk streams by sid
+audio_streams = {}
+audio_streams_lock = threading.Lock()
+
+# Stream LLM tokens (response_delta) and per-sentence TTS (audio_chunk) instead of one final audio_url
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+# Reply audio: "url" only sends audio_url for the client to fetch; "binary" also streams the clip
+# to the socket as audio_binary attachments while Deepgram is still sending it
+AUDIO_TRANSPORT = os.getenv("AUDIO_TRANSPORT", "url")
+
+# Bystander calls also get a dispatch recommendation for the operator room: hospitals are ranked
+# and get_operator_response runs next to get_response on the same extracted case (two LLM
+# requests per bystander call), so operators have it when the caller has their advice
+DISPATCH_RECOMMENDATIONS = os.getenv("DISPATCH_RECOMMENDATIONS", "false").lower() in ("1", "true", "yes")
+
+# Medical knowledge base: loaded on first use, reloaded in the background when
+# the JSON or symptom_keywords.json changes (KB_RELOAD_INTERVAL seconds, 0 disables)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+knowledge_base = KnowledgeBase(
+    os.getenv("KNOWLEDGE_BASE_PATH", os.path.join(BASE_DIR, "medical_knowledge_base_v2.json")),
+    os.getenv("SYMPTOM_KEYWORDS_PATH", os.path.join(BASE_DIR, "symptom_keywords.json")),
+    # Hashed TF-IDF vectors for paraphrase matching, memory-mapped and only rebuilt when the KB changes
+    os.getenv("SEMANTIC_INDEX_DIR", os.path.join(BASE_DIR, "kb_index")),
+    poll_interval=float(os.getenv("KB_RELOAD_INTERVAL", "2"))
+)
+SEMANTIC_TOP_K = int(os.getenv("SEMANTIC_TOP_K", "3"))
+SEMANTIC_MIN_SCORE = float(os.getenv("SEMANTIC_MIN_SCORE", "0.12"))
+
+# Synthesized speech, content-addressed in static/audio with an LRU size/age budget
+tts_cache = TTSCache(
+    os.path.join(BASE_DIR, "static", "audio"),
+    max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024),
+    max_age=float(os.getenv("TTS_CACHE_MAX_AGE_DAYS", "30")) * 86400
+)
+
+# Pooled SQLite access: hospital inventory and patient records
+resource_store = ResourceStore()
+patient_store = PatientStore()
+
+# Hospital inventory held in memory and kept current from the SQLite changelog
+# (INVENTORY_POLL_INTERVAL seconds, 0 disables); operators get hospital_resources_delta
+# with only the hospitals that changed
+inventory_view = InventoryView(
+    resource_store,
+    poll_interval=float(os.getenv("INVENTORY_POLL_INTERVAL", "1")),
+    on_delta=lambda delta: broadcast_to_operators("hospital_resources_delta", delta)
+)
 
-# Load medical knowledge base
-with open("medical_knowledge_base_v2.json", "r", encoding="utf-8") as f:
-    medical_kb = json.load(f)
+# Transcribed names that miss the exact match ("Jon Smith", "约翰", a last name alone) go to an
+# in-memory trigram/phonetic index of patients.db, built in the background (readiness does not
+# wait for it; exact matches work meanwhile) and kept current
+# from its changelog (PATIENT_INDEX_POLL_INTERVAL seconds, 0 builds it on first use and never
+# refreshes). A candidate is used when it scores PATIENT_MATCH_MIN_SCORE and clearly beats the next
+patient_names = PatientNameIndex(
+    patient_store,
+    os.getenv("NAME_ALIASES_PATH", os.path.join(BASE_DIR, "name_aliases.json")),
+    poll_interval=float(os.getenv("PATIENT_INDEX_POLL_INTERVAL", "2"))
+)
+PATIENT_MATCH_MIN_SCORE = float(os.getenv("PATIENT_MATCH_MIN_SCORE", "0.75"))
+
+# Hospitals near the caller that stock what the case needs, from columnar arrays rebuilt
+# only when the inventory changes; caller coordinates come from the caller_location event
+hospital_directory = HospitalDirectory(inventory_view)
+HOSPITAL_TOP_K = int(os.getenv("HOSPITAL_TOP_K", "5"))
+# A bystander's location is also kept per case_id in the shared case store, so an operator on
+# another worker can follow the case. Sockets are sticky to one worker, so the per-sid maps stay local
+caller_locations = {}  # sid -> (lat, lon) the client reported for itself
+followed_cases = {}  # operator sid -> case_id of the bystander case its recordings are about (follow_case)
+
+# Bounded worker pools for the STT / LLM / TTS stages with priority lanes (critical KB match >
+# operator > bystander > tts_text). Calls beyond MAX_ACTIVE_CALLS get a `busy` event instead
+call_scheduler = Scheduler(
+    [
+        StagePool("stt", int(os.getenv("STT_WORKERS", "8")), socketio.start_background_task, autostart=False),
+        StagePool("llm", int(os.getenv("LLM_WORKERS", "8")), socketio.start_background_task, expected_service=2.0,
+                  autostart=False),
+        StagePool("tts", int(os.getenv("TTS_WORKERS", "8")), socketio.start_background_task, autostart=False),
+    ],
+    max_calls=int(os.getenv("MAX_ACTIVE_CALLS", "64")),
+    per_sid=int(os.getenv("MAX_CALLS_PER_CLIENT", "2"))
+)
 
-@app.get("/healthz")
-def healthz():
-    return {"Yes": True}
+# Operator prompts: hospital blocks cached per inventory version, ranked hospitals cut to a token budget
+prompt_builder = PromptBuilder(token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "2000")))
+
+# Telemetry: per-stage spans by req_id and latency histograms on GET /metrics, JSON log lines
+# on the call path (LOG_LEVEL), and a sampling profiler that PROFILER_ENABLED lets you switch on
+configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+metrics = Registry()
+tracer = Tracer(metrics, on_finish=lifecycle.call_finished)
+empty_transcripts = metrics.counter("empty_transcripts_total", "Calls whose audio had no recognizable speech", ["kind"])
+metrics.gauge("connected_clients", "Connected Socket.IO clients", ["role"], collect=lambda: {
+    ("user",): client_registry.count("3000"), ("operator",): client_registry.count("3001")})
+metrics.gauge("calls_active", "Admitted calls in progress per priority lane", ["lane"], collect=lambda: {
+    (lane,): active for lane, active in zip(LANES, call_scheduler.active)})
+metrics.counter("calls_shed_total", "Calls turned away with a busy event", ["lane"], collect=lambda: {
+    (lane,): shed for lane, shed in call_scheduler.rejected.items()})
+metrics.gauge("stage_queue_depth", "Jobs waiting for a stage worker", ["stage"], collect=lambda: {
+    (name,): sum(pool.queued) for name, pool in call_scheduler.pools.items()})
+metrics.gauge("stage_busy_workers", "Stage workers running a job", ["stage"], collect=lambda: {
+    (name,): pool.busy for name, pool in call_scheduler.pools.items()})
+metrics.counter("tts_cache_lookups_total", "TTS cache lookups by result", ["result"], collect=lambda: {
+    ("hit",): tts_cache.hits, ("miss",): tts_cache.misses, ("coalesced",): tts_cache.coalesced})
+metrics.gauge("process_ready_seconds", "Seconds from process start until the warm-up finished", collect=lambda: {
+    (): lifecycle.ready_after} if lifecycle.ready else {})
+metrics.gauge("process_first_call_seconds", "Seconds from process start until the first call was served", collect=lambda: {
+    (): lifecycle.first_call_after} if lifecycle.first_call_after is not None else {})
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+profiler = SamplingProfiler(interval=float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000)
+
+# One open case per socket: fields merged across utterances, the patient record and KB matches
+# reused by follow-ups, which send the LLM a case summary plus only what is new.
+# A case ends on disconnect, end_case, or CASE_SESSION_TTL seconds of silence
+case_sessions = CaseSessionStore(ttl=float(os.getenv("CASE_SESSION_TTL", "600")))
+patient_matches = metrics.counter("patient_lookups_total", "Patient lookups by how the name matched", ["match"])
+case_reuse = metrics.counter("case_session_reuse_total", "Follow-up utterances served from the case session", ["kind"])
+
+# Append-only case journal in SQLite (CASE_JOURNAL_PATH, default case_journal.db in DB_DIR) behind
+# GET /history and the history event. Calls only queue their events; a background writer inserts
+# them every CASE_JOURNAL_FLUSH_MS, dropping new ones once CASE_JOURNAL_MAX_QUEUE are waiting
+case_journal = CaseJournal(
+    flush_interval=float(os.getenv("CASE_JOURNAL_FLUSH_MS", "200")) / 1000,
+    max_queue=int(os.getenv("CASE_JOURNAL_MAX_QUEUE", "100000"))
+)
+HISTORY_PAGE_MAX = 100
+# The journal and GET /cases hold PHI (transcripts, medical history, allergies), so they are only
+# served to operators holding OPERATOR_TOKEN: "Authorization: Bearer <token>" over HTTP, the
+# Socket.IO auth {token} for the history event. Unset, nobody can read them
+OPERATOR_TOKEN = os.getenv("OPERATOR_TOKEN", "")
+authorized_operators = set()  # sids that connected with OPERATOR_TOKEN
+metrics.counter("case_journal_records_total", "Case journal records by what became of them", ["result"], collect=lambda: {
+    ("written",): case_journal.written, ("dropped",): case_journal.dropped})
+metrics.gauge("case_journal_queue_depth", "Case journal records waiting for the writer", collect=lambda: {
+    (): case_journal.stats()["queued"]})
+
+
+def operator_token_valid(token):
+    return bool(OPERATOR_TOKEN) and isinstance(token, str) and hmac.compare_digest(token, OPERATOR_TOKEN)
 
-@app.route("/audio/<filename>")
+
+def require_operator():
+    """401 unless the request carries OPERATOR_TOKEN as a bearer token"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not operator_token_valid(token.strip()):
+        abort(401)
+
+
+@routes.get("/healthz")
+def healthz():
+    """
+    Readiness: 503 until the warm-up has finished and every database pool is full, then 200;
+    the body has the start-up timings and the pools
+    """
+    pools = {name: pool.stats() for name, pool in database_pools().items()}
+    ready = lifecycle.ready and all(stats["open"] >= stats["size"] for stats in pools.values())
+    return {**lifecycle.stats(), "db_pools": pools}, 200 if ready else 503
+
+@routes.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@routes.get("/traces/<req_id>")
+def trace_spans(req_id):
+    """Stage timings of one recent call handled by this process; operators only"""
+    require_operator()
+    trace = tracer.trace(req_id)
+    if trace is None:
+        abort(404)
+    return trace
+
+@routes.post("/profiler/<action>")
+def profiler_control(action):
+    """start (optional ?interval_ms=) or stop the sampling profiler; PROFILER_ENABLED and operators only"""
+    require_operator()
+    if not PROFILER_ENABLED or action not in ("start", "stop"):
+        abort(404)
+    if action == "start":
+        interval_ms = request.args.get("interval_ms", type=float)
+        profiler.start(interval_ms / 1000 if interval_ms else None)
+    else:
+        profiler.stop()
+    log_event("profiler_" + action, **profiler.status())
+    return profiler.status()
+
+@routes.get("/profiler")
+def profiler_report():
+    """Collapsed stacks sampled so far (flamegraph.pl / speedscope input); ?limit= keeps the top N; operators only"""
+    require_operator()
+    if not PROFILER_ENABLED:
+        abort(404)
+    return Response(profiler.collapsed(request.args.get("limit", type=int)), mimetype="text/plain")
+
+@routes.get("/cases/<req_id>")
+def case_events(req_id):
+    """Every event published for one request, from whichever worker handled it; operators only"""
+    require_operator()
+    return {"req_id": req_id, "events": case_store.events(req_id)}
+
+@routes.get("/tts/cache")
+def tts_cache_stats():
+    require_operator()
+    return tts_cache.stats()
+
+@routes.get("/deepgram/stats")
+def deepgram_stats():
+    require_operator()
+    return deepgram_http.stats()
+
+@routes.get("/scheduler/stats")
+def scheduler_stats():
+    return call_scheduler.stats()
+
+@routes.get("/inventory/stats")
+def inventory_stats():
+    return inventory_view.stats()
+
+@routes.get("/patients/index/stats")
+def patient_index_stats():
+    return patient_names.stats()
+
+@routes.get("/sessions/stats")
+def session_stats():
+    return case_sessions.stats()
+
+@routes.get("/prompts/stats")
+def prompt_stats():
+    return prompt_builder.stats()
+
+@routes.get("/history")
+def call_history():
+    """Journaled calls, newest first: ?limit= (max 100), ?before= the previous page's `next`, ?patient=, ?case_id=; operators only"""
+    require_operator()
+    return history_page(request.args.get("before", type=int), request.args.get("limit", 20, type=int),
+                        request.args.get("patient"), request.args.get("case_id"))
+
+@routes.get("/history/stats")
+def history_stats():
+    return case_journal.stats()
+
+@routes.route("/audio/<filename>")
 def serve_audio(filename):
-    return send_from_directory("static/audio", filename)
+    """
+    Synthesized clips with Range and conditional requests. Names are content hashes, so the
+    name plus size is a stable ETag even though cache hits refresh the file's mtime
+    """
+    try:
+        size = os.path.getsize(tts_cache.path(filename))
+    except OSError:
+        size = 0
+    etag = f"{os.path.splitext(filename)[0]}-{size}"
+    return send_from_directory(tts_cache.directory, filename, conditional=True, etag=etag, max_age=86400)
 
 def search_patient_database(name, age=None):
     """
-    Search patient database for complete medical history and allergies
+    Search patient database for complete medical history and allergies: the exact name (and
+    age) first, then the fuzzy name index. A fuzzy match carries its match_score
     """
     try:
-        conn = sqlite3.connect('patients.db')
-        cursor = conn.cursor()
-
-        if age:
-            cursor.execute(
-                "SELECT name, age, medical_history, allergies FROM patients WHERE name = ? AND age = ?",
-                (name, age)
-            )
-        else:
-            cursor.execute(
-                "SELECT name, age, medical_history, allergies FROM patients WHERE name = ?",
-                (name,)
-            )
-
-        result = cursor.fetchone()
-        conn.close()
-
-        if result:
-            return {
-                "name": result[0],
-                "age": result[1],
-                "medical_history": result[2],
-                "allergies": result[3]
-            }
-        return None
+        db_patient = patient_store.find(name, age)
+        if db_patient:
+            patient_matches.inc(match="exact")
+            return db_patient
+        candidate = patient_names.best(name, age, PATIENT_MATCH_MIN_SCORE)
+        db_patient = patient_store.get(candidate["id"]) if candidate else None
+        if db_patient:
+            db_patient["match_score"] = candidate["score"]
+        patient_matches.inc(match="fuzzy" if db_patient else "none")
+        return db_patient
     except Exception as e:
-        print(f"Database search error: {str(e)}")
+        log_event("patient_db_failed", logging.ERROR, error=str(e))
         return None
 
-def query_hospitals_with_resources(severity="Critical"):
+def query_hospitals_with_resources(severity="Critical", location=None, k=HOSPITAL_TOP_K):
     """
-    Query all hospitals with their blood plasma and medication availability
-    Returns hospitals suitable for the patient's condition severity
+    The k hospitals best suited to a case of this severity: nearest to location ((lat, lon),
+    when known) among those stocking the blood types and medications it needs, ranked by
+    distance and stock. Returns (hospitals, inventory_version)
     """
     try:
-        # Query hospitals
-        hosp_conn = sqlite3.connect('hospitals.db')
-        hosp_cursor = hosp_conn.cursor()
-        hosp_cursor.execute("SELECT id, name, address, latitude, longitude FROM hospitals")
-        hospitals = hosp_cursor.fetchall()
-        hosp_conn.close()
-
-        hospital_data = []
-        for hosp in hospitals:
-            hosp_id, name, address, lat, lon = hosp
-
-            # Query blood plasma for this hospital
-            blood_conn = sqlite3.connect('blood_plasma.db')
-            blood_cursor = blood_conn.cursor()
-            blood_cursor.execute(
-                "SELECT blood_type, volume, stock_quantity, expiration_date FROM blood_plasma WHERE hospital_id = ? AND stock_quantity > 0",
-                (hosp_id,)
-            )
-            blood_data = blood_cursor.fetchall()
-            blood_conn.close()
-
-            # Query medications for this hospital
-            med_conn = sqlite3.connect('medications.db')
-            med_cursor = med_conn.cursor()
-            med_cursor.execute(
-                "SELECT name, type, dosage, stock_quantity FROM medications WHERE hospital_id = ? AND stock_quantity > 0",
-                (hosp_id,)
-            )
-            med_data = med_cursor.fetchall()
-            med_conn.close()
-
-            hospital_data.append({
-                "id": hosp_id,
-                "name": name,
-                "address": address,
-                "coordinates": {"lat": lat, "lon": lon},
-                "blood_plasma": [
-                    {"type": b[0], "volume": b[1], "stock": b[2], "expiration": b[3]}
-                    for b in blood_data
-                ],
-                "medications": [
-                    {"name": m[0], "type": m[1], "dosage": m[2], "stock": m[3]}
-                    for m in med_data
-                ]
-            })
-
-        return hospital_data
+        index = hospital_directory.current()
+        return index.nearest(location, severity, k), index.version
     except Exception as e:
-        print(f"Hospital query error: {str(e)}")
-        return []
-
-def extract_patient_info(transcript):
-    """
-    使用正则表达式提取患者信息 (支持中英文)
-    """
-    info = {
-        "name": None,
-        "age": None,
-        "injury": None,
-        "pain_location": None,
-        "pain_level": None,
-        "allergies": None,
-        "symptoms": []
-    }
-
-    # 提取姓名: 我叫XXX / My name is XXX / I am XXX / 患者名叫XXX
-    name_patterns = [
-        r'患者名叫([A-Za-z\u4e00-\u9fa5\s]+?)(?:[,，。\.]|$)',
-        r'我叫([A-Za-z\u4e00-\u9fa5]+)',
-        r'(?:my name is|I am|I\'m)\s+([A-Za-z\s]+?)(?:[,\.]|$)',
-    ]
-    for pattern in name_patterns:
-        name_match = re.search(pattern, transcript, re.IGNORECASE)
-        if name_match:
-            info["name"] = name_match.group(1).strip()
-            break
-
-    # 提取年龄: XX岁 / XX years old / I am XX
-    age_patterns = [
-        r'(\d+)岁',
-        r'(\d+)\s+years?\s+old',
-        r'I am (\d+)',
-    ]
-    for pattern in age_patterns:
-        age_match = re.search(pattern, transcript, re.IGNORECASE)
-        if age_match:
-            info["age"] = int(age_match.group(1))
-            break
-
-    # 提取受伤原因/症状: 中文
-    injury_patterns_cn = [
-        r'发生了?(车祸|交通事故)',
-        r'从(.+?)摔下来',
-        r'被(.+?)(撞|打|咬)',
-        r'(摔|跌|撞)(?:倒|伤)',
-        r'因为(.+?)(晕倒|昏倒|昏迷)',
-        r'(高血压|低血压|糖尿病|心脏病)'
-    ]
-    for pattern in injury_patterns_cn:
-        injury_match = re.search(pattern, transcript)
-        if injury_match:
-            info["injury"] = injury_match.group(0)
-            break
-
-    # 提取受伤原因/症状: 英文
-    if not info["injury"]:
-        injury_patterns_en = [
-            r'(car accident|traffic accident|motor vehicle accident)',
-            r'(fell|fainted|collapsed|injured|hit|cut|burned|broke)',
-            r'because of\s+(.+?)(?:\.|,|$)',
-            r'(high blood pressure|low blood pressure|diabetes|heart attack|stroke)',
-        ]
-        for pattern in injury_patterns_en:
-            injury_match = re.search(pattern, transcript, re.IGNORECASE)
-            if injury_match:
-                info["injury"] = injury_match.group(0)
-                break
-
-    # 提取疼痛部位: 中文
-    pain_patterns_cn = [
-        r'([\u4e00-\u9fa5]+?)(很|特别|非常)?(痛|疼)',
-        r'(头|脚|手|腿|腰|背|胸|腹|肚子|脖子|颈|膝盖|脚踝|脚腕|手腕|肩膀|关节).*?(痛|疼)'
-    ]
-    for pattern in pain_patterns_cn:
-        pain_match = re.search(pattern, transcript)
-        if pain_match:
-            info["pain_location"] = pain_match.group(1)
-            break
-
-    # 提取疼痛部位: 英文
-    if not info["pain_location"]:
-        pain_patterns_en = [
-            r'(head|chest|stomach|abdomen|back|neck|shoulder|arm|leg|knee|ankle|wrist|foot|hand)\s+(?:pain|hurt|ache)',
-            r'pain in (?:my|the)\s+([a-z]+)',
-        ]
-        for pattern in pain_patterns_en:
-            pain_match = re.search(pattern, transcript, re.IGNORECASE)
-            if pain_match:
-                info["pain_location"] = pain_match.group(1)
-                break
-
-    # 提取疼痛等级: 疼痛等级是X / pain level X
-    pain_level_patterns = [
-        r'疼痛等级.*?(\d+)',
-        r'pain level.*?(\d+)',
-    ]
-    for pattern in pain_level_patterns:
-        pain_level_match = re.search(pattern, transcript, re.IGNORECASE)
-        if pain_level_match:
-            info["pain_level"] = int(pain_level_match.group(1))
-            break
-
-    # 提取过敏信息: 对XXX过敏 / allergic to XXX
-    allergy_patterns = [
-        r'对(.+?)过敏',
-        r'allergic to\s+([a-z\s]+)',
-    ]
-    for pattern in allergy_patterns:
-        allergy_match = re.search(pattern, transcript, re.IGNORECASE)
-        if allergy_match:
-            info["allergies"] = allergy_match.group(1).strip()
-            break
-
-    # 提取症状关键词
-    symptom_keywords = [
-        r'(晕倒|昏倒|昏迷|fainted|collapsed|unconscious)',
-        r'(高血压|low blood pressure|high blood pressure|hypertension)',
-        r'(呼吸困难|difficulty breathing|shortness of breath)',
-        r'(出血|bleeding)',
-        r'(骨折|broken bone|fracture)',
-    ]
-    for pattern in symptom_keywords:
-        if re.search(pattern, transcript, re.IGNORECASE):
-            info["symptoms"].append(re.search(pattern, transcript, re.IGNORECASE).group(0))
-
-    return info
+        log_event("hospital_query_failed", logging.ERROR, error=str(e))
+        return [], None
 
-def search_medical_knowledge(patient_info):
+def search_medical_knowledge(patient_info, transcript=None):
     """
     在医疗知识库中搜索相关病症 (支持中英文)
+    Keyword hits first, then semantic matches on the transcript that the keywords missed.
+    Returns (results, kb_version); one call always reads a single knowledge base version
     """
-    results = []
     search_text = ""
 
     # 收集所有可能的症状信息
@@ -288,250 +411,685 @@ def search_medical_knowledge(patient_info):
     if patient_info.get("symptoms"):
         search_text += " " + " ".join(patient_info["symptoms"])
 
-    search_text = search_text.lower()
-
-    # 症状关键词映射（中英文到知识库症状）
-    symptom_mapping = {
-        # 车祸相关
-        "车祸": "car accident",
-        "交通事故": "car accident",
-        "car accident": "car accident",
-        "traffic accident": "car accident",
-        "motor vehicle accident": "car accident",
-
-        # 中文映射
-        "脚踝": "sprained ankle",
-        "脚腕": "sprained ankle",
-        "ankle": "sprained ankle",
-
-        "晕倒": "unconsciousness",
-        "昏倒": "unconsciousness",
-        "昏迷": "unconsciousness",
-        "fainted": "unconsciousness",
-        "collapsed": "unconsciousness",
-        "unconscious": "unconsciousness",
-
-        "高血压": "unconsciousness",  # 高血压可能导致昏迷
-        "hypertension": "unconsciousness",
-        "high blood pressure": "unconsciousness",
-
-        "胸": "chest pain",
-        "chest": "chest pain",
-
-        "呼吸困难": "difficulty breathing",
-        "difficulty breathing": "difficulty breathing",
-        "shortness of breath": "difficulty breathing",
-
-        "出血": "severe bleeding",
-        "bleeding": "severe bleeding",
-
-        "腹": "severe abdominal pain",
-        "stomach": "severe abdominal pain",
-        "abdomen": "severe abdominal pain",
-
-        "发烧": "high fever",
-        "fever": "high fever",
-
-        "骨折": "broken bone",
-        "broken": "broken bone",
-        "fracture": "broken bone",
-
-        "过敏": "allergic reaction",
-        "allergic": "allergic reaction",
-        "allergy": "allergic reaction"
+    try:
+        snapshot = knowledge_base.current()
+    except Exception as e:
+        log_event("knowledge_base_failed", logging.ERROR, error=str(e))
+        return [], None
+    # 关键词自动机 + 语义检索: paraphrases such as "can't catch my breath" never reach the keywords
+    results = snapshot.search(search_text, transcript or search_text, SEMANTIC_TOP_K, SEMANTIC_MIN_SCORE)
+    return results, snapshot.version
+
+@socketio.on("audio_data")
+def handle_audio(data):
+    """
+    Admit the call and hand the recording to a background pipeline so the Socket.IO handler returns immediately
+    """
+    sid = request.sid
+    origin = request.headers.get('Origin', 'http://localhost:3000')
+    req_id = str(uuid.uuid4())
+    is_operator = '3001' in origin
+    tracer.start(req_id, "operator" if is_operator else "user")
+    call = admit_call(sid, req_id, OPERATOR if is_operator else NORMAL)
+    if call:
+        socketio.start_background_task(process_audio, sid, req_id, is_operator, data, call)
+
+
+def admit_call(sid, req_id, priority):
+    """Admit a new call with the scheduler, or shed it with a `busy` event; returns the Call or None"""
+    try:
+        return call_scheduler.admit(sid, priority)
+    except Overloaded as e:
+        log_event("call_shed", logging.WARNING, req_id=req_id, reason=e.reason, estimated_wait=round(e.estimated_wait, 1))
+        socketio.emit("busy", {"req_id": req_id, "reason": e.reason, "estimated_wait": round(e.estimated_wait, 1)}, to=sid)
+        tracer.finish(req_id, "shed")
+        return None
+
+
+def spawn(fn, *args, **kwargs):
+    """Start a pipeline stage in the background; call .result() to join it"""
+    return BackgroundResult(socketio, fn, *args, **kwargs)
+
+
+def record_event(event_name, data):
+    if event_name not in STREAMED_EVENTS:
+        try:
+            case_store.record(data["req_id"], event_name, data)
+        except Exception as e:
+            log_event("case_store_failed", logging.ERROR, req_id=data.get("req_id"), error=str(e))
+    case_journal.append(event_name, data)
+
+
+def history_page(before=None, limit=20, patient=None, case_id=None):
+    return case_journal.history(before, max(1, min(limit or 20, HISTORY_PAGE_MAX)), patient, case_id)
+
+
+def publish(sid, event_name, data, broadcast):
+    """Emit a pipeline event to the caller, and mirror it to operators for user-originated calls"""
+    socketio.emit(event_name, data, to=sid)
+    record_event(event_name, data)
+    if broadcast:
+        broadcast_to_operators(event_name, data, exclude_sid=sid)
+
+
+def publish_to_operators(event_name, data):
+    """A pipeline event for the operator room only: the dispatch track of a bystander call"""
+    record_event(event_name, data)
+    broadcast_to_operators(event_name, data)
+
+
+def ranks_hospitals(is_operator):
+    """Whether a call needs the hospital stages: operator calls, and bystander calls with DISPATCH_RECOMMENDATIONS"""
+    return is_operator or DISPATCH_RECOMMENDATIONS
+
+
+def transcribe_audio(data):
+    """
+    Transcribe a complete recording with Deepgram. Returns the transcript, or None on API error
+    """
+    # Use Deepgram REST API for transcription
+    headers = {
+        "Content-Type": "audio/webm"
     }
 
-    # 查找匹配的症状
-    matched_symptoms = set()
-    for keyword, symptom_en in symptom_mapping.items():
-        if keyword.lower() in search_text:
-            matched_symptoms.add(symptom_en)
+    params = {
+        "model": "nova-2",
+        "smart_format": "true"
+    }
 
-    # 从知识库中查找匹配的条目
-    for symptom in matched_symptoms:
-        for entry in medical_kb:
-            if symptom.lower() == entry["symptom"].lower():
-                if entry not in results:  # 避免重复
-                    results.append(entry)
+    # Transcribe audio using Deepgram REST API
+    response = deepgram_http.post(
+        "stt",
+        DEEPGRAM_URL_STT,
+        STT_DEADLINE,
+        headers=headers,
+        params=params,
+        data=data
+    )
 
-    return results
+    if response.status_code != 200:
+        log_event("stt_failed", logging.ERROR, status=response.status_code, body=response.text[:500])
+        return None
 
-@socketio.on("audio_data")
-def handle_audio(data):
-    try:
-        sid = request.sid
-        req_id = str(uuid.uuid4())
-        print(type(data))
+    result = response.json()
+    return result["results"]["channels"][0]["alternatives"][0]["transcript"]
 
-        # Use Deepgram REST API for transcription
-        headers = {
-            "Authorization": f"Token {DEEPGRAM_API_KEY}",
-            "Content-Type": "audio/webm"
-        }
 
-        params = {
-            "model": "nova-2",
-            "smart_format": "true"
-        }
+def find_patient(name, age=None, prefetched=None):
+    """search_patient_database, reusing a lookup already started from a partial transcript"""
+    stage = (prefetched or {}).get((name, age))
+    if stage is not None:
+        return stage.result()
+    return search_patient_database(name, age)
 
-        # Transcribe audio using Deepgram REST API
-        response = requests.post(
-            DEEPGRAM_URL_STT,
-            headers=headers,
-            params=params,
-            data=data
-        )
 
-        if response.status_code == 200:
-            result = response.json()
-            transcript = result["results"]["channels"][0]["alternatives"][0]["transcript"]
-            print(f"Text: {transcript!r}")
-
-            if not transcript or not transcript.strip():
-                emit("no_transcription", {
-                    "req_id": req_id,
-                    # optional server message if you want:
-                    "message": "No speech was detected in the recording."
-                }, to=sid)
-                return
-            else:
-                # Detect client origin
-                origin = request.headers.get('Origin', 'http://localhost:3000')
-                is_user = '3001' not in origin
-
-                emit("transcription", {"text": transcript, "req_id": req_id}, to=sid)
-
-                # Broadcast to operators if this is from user (3000)
-                if is_user:
-                    broadcast_to_operators("transcription", {"text": transcript, "req_id": req_id})
-
-            # 提取患者信息
-            patient_info = extract_patient_info(transcript)
-            print(f"提取的患者信息: {patient_info}")
-
-            # 搜索患者数据库
-            db_patient = None
-            if patient_info["name"]:
-                db_patient = search_patient_database(patient_info["name"], patient_info.get("age"))
-                if db_patient:
-                    print(f"数据库找到患者: {db_patient['name']}")
-                    emit("database_patient_found", {**db_patient, "req_id": req_id}, to=sid)
-                    if is_user:
-                        broadcast_to_operators("database_patient_found", {**db_patient, "req_id": req_id})
-                    # 如果数据库中有更完整的信息，更新patient_info
-                    if not patient_info["age"] and db_patient["age"]:
-                        patient_info["age"] = db_patient["age"]
-                    if not patient_info["allergies"] and db_patient["allergies"]:
-                        patient_info["allergies"] = db_patient["allergies"]
+def lookup_patient(sid, req_id, is_user, patient_info, prefetched=None, session=None):
+    """
+    Patient DB stage: find the record, publish it and fill gaps in patient_info in place.
+    The case session keeps the record, so follow-ups naming the same patient skip the database
+    """
+    name = patient_info["name"]
+    key = (name, patient_info.get("age"))
+    cached, db_patient = session.cached_patient(key) if session else (False, None)
+    if cached:
+        case_reuse.inc(kind="patient")
+    else:
+        # 搜索患者数据库; 如果没有提取到姓名，使用默认患者 John Smith
+        with tracer.span(req_id, "patient_db"):
+            if name:
+                db_patient = find_patient(name, patient_info.get("age"), prefetched)
             else:
-                # 如果没有提取到姓名，使用默认患者 John Smith
-                print("未提取到患者姓名，使用默认患者: John Smith")
                 db_patient = search_patient_database("John Smith")
-                if db_patient:
-                    print(f"数据库找到默认患者: {db_patient['name']}")
-                    emit("database_patient_found", {**db_patient, "req_id": req_id}, to=sid)
-                    if is_user:
-                        broadcast_to_operators("database_patient_found", {**db_patient, "req_id": req_id})
-                    # 使用默认患者信息
-                    patient_info["name"] = db_patient["name"]
-                    patient_info["age"] = db_patient["age"]
-                    patient_info["allergies"] = db_patient["allergies"]
-
-            emit("patient_info", {**patient_info, "req_id": req_id}, to=sid)
-            if is_user:
-                broadcast_to_operators("patient_info", {**patient_info, "req_id": req_id})
-
-            # 搜索医疗知识库
-            knowledge_results = search_medical_knowledge(patient_info)
-            print(f"知识库搜索结果: {knowledge_results}")
-            if knowledge_results:
-                emit("knowledge_base_results", {"results": knowledge_results, "req_id": req_id}, to=sid)
-                if is_user:
-                    broadcast_to_operators("knowledge_base_results", {"results": knowledge_results, "req_id": req_id})
-
-            # Build enhanced prompt
-            enhanced_prompt = f"Patient Information: {transcript}\n\n"
-            if patient_info["name"]:
-                enhanced_prompt += f"Name: {patient_info['name']}\n"
-            if patient_info["age"]:
-                enhanced_prompt += f"Age: {patient_info['age']} years old\n"
-            if patient_info["injury"]:
-                enhanced_prompt += f"Injury/Condition: {patient_info['injury']}\n"
-            if patient_info["pain_location"]:
-                enhanced_prompt += f"Pain Location: {patient_info['pain_location']}\n"
-            if patient_info["pain_level"]:
-                enhanced_prompt += f"Pain Level: {patient_info['pain_level']}/10\n"
-            if patient_info["allergies"]:
-                enhanced_prompt += f"Allergies: {patient_info['allergies']}\n"
-
-            # 添加数据库中的完整病史信息
-            if db_patient:
-                enhanced_prompt += f"\nPatient Medical History from Database:\n"
-                enhanced_prompt += f"- Complete Medical History: {db_patient['medical_history']}\n"
-                enhanced_prompt += f"- Known Allergies: {db_patient['allergies']}\n"
-
-            if knowledge_results:
-                enhanced_prompt += f"\nMedical Knowledge Base Match Results:\n"
-                for result in knowledge_results:
-                    enhanced_prompt += f"- Symptom: {result['symptom']}\n"
-                    enhanced_prompt += f"  Severity: {result['severity']}\n"
-                    enhanced_prompt += f"  Possible Conditions: {', '.join(result['conditions'])}\n"
-                    enhanced_prompt += f"  Recommended Treatment: {result['treatment']}\n"
-
-            enhanced_prompt += "\nPlease provide professional medical advice based on the above information."
-
-            # Detect client origin from request headers
-            origin = request.headers.get('Origin', 'http://localhost:3000')
-            is_operator = '3001' in origin
-
-            if is_operator:
-                # Operator frontend (3001): Query hospital resources and get detailed recommendation
-                print("Operator client detected (port 3001)")
-
-                # Query hospitals with blood and medication availability
-                severity = knowledge_results[0]['severity'] if knowledge_results else "Moderate"
-                hospital_data = query_hospitals_with_resources(severity)
-                emit("hospital_resources", {"hospitals": hospital_data, "req_id": req_id}, to=sid)
-
-                # Build operator-specific prompt with hospital data
-                operator_prompt = enhanced_prompt + "\n\nAvailable Hospital Resources:\n"
-                for hosp in hospital_data:
-                    operator_prompt += f"\n{hosp['name']} ({hosp['address']}):\n"
-                    operator_prompt += f"  Blood Plasma: {len(hosp['blood_plasma'])} types available\n"
-                    for plasma in hosp['blood_plasma'][:3]:  # Show first 3
-                        operator_prompt += f"    - {plasma['type']}: {plasma['stock']} units\n"
-                    operator_prompt += f"  Medications: {len(hosp['medications'])} available\n"
-                    for med in hosp['medications'][:3]:  # Show first 3
-                        operator_prompt += f"    - {med['name']} ({med['type']}): {med['stock']} units\n"
-
-                operator_prompt += "\nBased on the patient's condition, medical history, and available resources, recommend the best hospital and any resource preparations needed."
-
-                # Get operator-specific response
-                llm_response = get_operator_response(operator_prompt, hospital_data)
-                emit("operator_recommendation", {"text": llm_response, "req_id": req_id}, to=sid)
-            else:
-                # User frontend (3000): Standard response
-                print("User client detected (port 3000)")
-                llm_response = get_response(enhanced_prompt)
-                emit("response", {"text": llm_response, "req_id": req_id}, to=sid)
-                # Broadcast response to operators
-                broadcast_to_operators("response", {"text": llm_response, "req_id": req_id})
+        log_event("patient_lookup", req_id=req_id, found=db_patient is not None, default_patient=not name,
+                  match_score=(db_patient or {}).get("match_score"))
+        if session:
+            session.remember_patient(key, db_patient)
+        if db_patient:
+            publish(sid, "database_patient_found", {**db_patient, "req_id": req_id}, is_user)
+
+    if db_patient and name:
+        # 如果数据库中有更完整的信息，更新patient_info
+        if not patient_info["age"] and db_patient["age"]:
+            patient_info["age"] = db_patient["age"]
+        if not patient_info["allergies"] and db_patient["allergies"]:
+            patient_info["allergies"] = db_patient["allergies"]
+    elif db_patient:
+        # 使用默认患者信息
+        patient_info["name"] = db_patient["name"]
+        patient_info["age"] = db_patient["age"]
+        patient_info["allergies"] = db_patient["allergies"]
+
+    publish(sid, "patient_info", {**patient_info, "req_id": req_id}, is_user)
+    return db_patient
+
+
+def lookup_knowledge(sid, req_id, is_user, patient_info, transcript, session=None):
+    """
+    Knowledge base stage on this utterance alone; returns the matches new to the case (all of
+    them without a session). Matches the case already had are not published again
+    """
+    # 搜索医疗知识库
+    with tracer.span(req_id, "knowledge"):
+        knowledge_results, kb_version = search_medical_knowledge(patient_info, transcript)
+    log_event("knowledge_matched", req_id=req_id, kb_version=kb_version,
+              symptoms=[r["symptom"] for r in knowledge_results])
+    if session:
+        new_results = session.add_knowledge(knowledge_results)
+        if len(new_results) < len(knowledge_results):
+            case_reuse.inc(len(knowledge_results) - len(new_results), kind="knowledge")
+        knowledge_results = new_results
+    if knowledge_results:
+        publish(sid, "knowledge_base_results", {"results": knowledge_results, "kb_version": kb_version, "req_id": req_id}, is_user)
+    return knowledge_results
+
+
+def lookup_hospitals(sid, req_id):
+    """Hospital index stage (operator calls only): picks up inventory changes while STT runs"""
+    try:
+        with tracer.span(req_id, "hospital_index"):
+            hospital_directory.current()
+    except Exception as e:
+        log_event("hospital_index_failed", logging.ERROR, req_id=req_id, error=str(e))
 
-            # Generate audio using Deepgram TTS
-            audio_filename = datetime.now().strftime("%Y%m%d_%H%M%S") + ".mp3"
-            audio_url = synthesize_audio(llm_response, audio_filename)
-            emit("audio_url", {"url": audio_url, "req_id": req_id}, to=sid)
-            # Broadcast audio URL to operators if from user
-            if not is_operator:
-                broadcast_to_operators("audio_url", {"url": audio_url, "req_id": req_id})
+
+def call_location(sid):
+    """
+    Where to rank hospitals from for sid's call: the location of the bystander case an operator
+    follows, else the one the client reported for itself
+    """
+    case_id = followed_cases.get(sid)
+    if case_id is not None:
+        try:
+            location = case_store.location(case_id)
+        except Exception as e:
+            log_event("case_location_failed", logging.ERROR, case_id=case_id, error=str(e))
+            location = None
+        if location is not None:
+            return location
+    return caller_locations.get(sid)
+
+
+def rank_hospitals(sid, req_id, severity, dispatch=False):
+    """
+    Hospital resources for the call once its severity is known, sent to the operator who placed
+    it or, on a bystander call's dispatch track, to the operator room. Returns (hospital_data, inventory_version)
+    """
+    # Query hospitals with blood and medication availability
+    with tracer.span(req_id, "hospitals"):
+        hospital_data, inventory_version = query_hospitals_with_resources(severity, call_location(sid))
+    data = {"hospitals": hospital_data, "severity": severity, "req_id": req_id}
+    if dispatch:
+        publish_to_operators("hospital_resources", {**data, "dispatch": True})
+    else:
+        publish(sid, "hospital_resources", data, False)
+    return hospital_data, inventory_version
+
+
+def recommend_dispatch(req_id, prompt, hospital_data):
+    """Dispatch track of a bystander call: the operator recommendation, published to the operator room"""
+    with tracer.span(req_id, "dispatch_llm"):
+        recommendation = get_operator_response(prompt, hospital_data)
+    publish_to_operators("operator_recommendation", {"text": recommendation, "req_id": req_id, "dispatch": True})
+    log_event("dispatch_recommended", req_id=req_id, chars=len(recommendation))
+    return recommendation
+
+
+def build_enhanced_prompt(transcript, patient_info, db_patient, knowledge_results, context=None):
+    """
+    `context` (CaseSession.context) makes this a follow-up: the case summary, the new utterance,
+    the merged fields, the medical history shortened once it has been sent in full, and only
+    the knowledge base matches new to the case
+    """
+    # Build enhanced prompt
+    if context:
+        lines = context["summary"] + ["", f"New from the caller: {transcript}", ""]
+    else:
+        lines = [f"Patient Information: {transcript}", ""]
+    if patient_info["name"]:
+        lines.append(f"Name: {patient_info['name']}")
+    if patient_info["age"]:
+        lines.append(f"Age: {patient_info['age']} years old")
+    if patient_info["injury"]:
+        lines.append(f"Injury/Condition: {patient_info['injury']}")
+    if patient_info["pain_location"]:
+        lines.append(f"Pain Location: {patient_info['pain_location']}")
+    if patient_info["pain_level"]:
+        lines.append(f"Pain Level: {patient_info['pain_level']}/10")
+    if patient_info["allergies"]:
+        lines.append(f"Allergies: {patient_info['allergies']}")
+
+    # 添加数据库中的完整病史信息 (follow-ups: a summary once the full text was sent)
+    if db_patient and context and context["history_sent"]:
+        lines.append("\nPatient Medical History from Database (summary):")
+        lines.append(f"- Medical History: {shorten(db_patient['medical_history'], HISTORY_SUMMARY_CHARS)}")
+        if db_patient["allergies"] != patient_info["allergies"]:  # otherwise already listed in full above
+            lines.append(f"- Known Allergies: {db_patient['allergies']}")
+    elif db_patient:
+        lines.append("\nPatient Medical History from Database:")
+        lines.append(f"- Complete Medical History: {db_patient['medical_history']}")
+        lines.append(f"- Known Allergies: {db_patient['allergies']}")
+
+    if knowledge_results:
+        lines.append("\nNew Medical Knowledge Base Match Results:" if context else "\nMedical Knowledge Base Match Results:")
+        for result in knowledge_results:
+            lines.append(f"- Symptom: {result['symptom']}")
+            lines.append(f"  Severity: {result['severity']}")
+            lines.append(f"  Possible Conditions: {', '.join(result['conditions'])}")
+            lines.append(f"  Recommended Treatment: {result['treatment']}")
+
+    lines.append("\nPlease provide professional medical advice based on the above information.")
+    return "\n".join(lines)
+
+
+class SpeechStream:
+    """
+    Streaming response for one request: forwards LLM deltas as response_delta, starts TTS for
+    each sentence as soon as it is complete, and emits the clips as audio_chunk events in order.
+    The clips joined into one file are the reply's audio_url, for clients that play whole replies
+    """
+
+    def __init__(self, sid, req_id, broadcast, call):
+        self.sid = sid
+        self.req_id = req_id
+        self.broadcast = broadcast
+        self.call = call
+        self.splitter = SentenceSplitter()
+        self.sequencer = ChunkSequencer(self._release)
+        self.tts_stages = []
+        self.clips = []  # audio URLs in seq order, as released
+
+    def feed(self, delta):
+        publish(self.sid, "response_delta", {"text": delta, "req_id": self.req_id}, self.broadcast)
+        for sentence in self.splitter.feed(delta):
+            self._speak(sentence)
+
+    def finish(self, text):
+        """
+        Synthesize the trailing text, wait until every chunk has been emitted, and return the
+        audio URL of the whole reply `text` (None when no audio could be made)
+        """
+        tail = self.splitter.flush()
+        if tail:
+            self._speak(tail)
+        for stage in self.tts_stages:
+            stage.result()
+        publish(self.sid, "audio_chunks_complete", {"count": len(self.clips), "req_id": self.req_id}, self.broadcast)
+        if self.clips and len(self.clips) == len(self.tts_stages):
+            # MP3 frames concatenate: no second TTS request for the whole reply
+            try:
+                name = tts_cache.get_or_create(text, TTS_MODEL, TTS_ENCODING, lambda _: self._joined())
+                if name:
+                    return f"audio/{name}"
+            except Exception as e:
+                log_event("tts_join_failed", logging.WARNING, req_id=self.req_id, error=str(e))
+        with tracer.span(self.req_id, "tts"):
+            return synthesize_audio(text)
+
+    def _joined(self):
+        for url in self.clips:
+            with open(tts_cache.path(os.path.basename(url)), "rb") as f:
+                yield from iter(lambda: f.read(CHUNK_BYTES), b"")
+
+    def _speak(self, sentence):
+        seq = len(self.tts_stages)
+        self.tts_stages.append(self.call.submit("tts", self._synthesize, seq, sentence))
+
+    def _synthesize(self, seq, sentence):
+        audio_url = None
+        try:
+            with tracer.span(self.req_id, "tts"):
+                audio_url = synthesize_audio(sentence)
+        finally:
+            self.sequencer.complete(seq, (audio_url, sentence) if audio_url else None)
+
+    def _release(self, seq, chunk):
+        audio_url, sentence = chunk
+        self.clips.append(audio_url)
+        publish(self.sid, "audio_chunk", {"url": audio_url, "text": sentence, "seq": seq, "req_id": self.req_id}, self.broadcast)
+
+
+class AudioSender:
+    """
+    One TTS clip streamed to the caller as audio_binary events, each chunk a binary attachment,
+    ending with {"final": true, "complete": <whether the clip arrived whole>}
+    """
+
+    def __init__(self, sid, req_id, broadcast):
+        self.sid = sid
+        self.req_id = req_id
+        self.broadcast = broadcast
+        self.seq = 0
+
+    def __call__(self, chunk):
+        publish(self.sid, "audio_binary", {"data": chunk, "seq": self.seq, "req_id": self.req_id}, self.broadcast)
+        self.seq += 1
+
+    def close(self, complete):
+        publish(self.sid, "audio_binary", {"data": b"", "seq": self.seq, "final": True, "complete": complete,
+                                           "req_id": self.req_id}, self.broadcast)
+
+
+def process_audio(sid, req_id, is_operator, data, call):
+    """
+    Call pipeline for a complete recording. Only STT -> LLM -> TTS is serial; the patient DB,
+    knowledge base and hospital stages run alongside it and publish their events as soon as they finish.
+    """
+    outcome = "error"
+    try:
+        log_event("call_started", req_id=req_id, kind="operator" if is_operator else "user", audio_bytes=len(data))
+
+        # Hospital inventory doesn't depend on the transcript, so it overlaps with STT
+        hospitals_stage = spawn(lookup_hospitals, sid, req_id) if ranks_hospitals(is_operator) else None
+
+        with tracer.span(req_id, "stt"):
+            transcript = call.run("stt", transcribe_audio, data)
+        if transcript is None:
+            return
+
+        outcome = process_transcript(sid, req_id, is_operator, transcript, call, hospitals_stage)
+
+    except Exception as e:
+        log_event("call_failed", logging.ERROR, req_id=req_id, error=str(e))
+    finally:
+        call.release()
+        tracer.finish(req_id, outcome)
+
+
+def process_transcript(sid, req_id, is_operator, transcript, call, hospitals_stage=None, prefetched=None):
+    """
+    Everything after STT; the LLM and TTS stages run on the scheduler's pools at the call's
+    priority. `prefetched` maps (name, age) to patient lookups that were already started from
+    partial transcripts. Returns the call's outcome for the trace: "ok", "no_speech" or "error"
+    """
+    try:
+        is_user = not is_operator
+        # Bystander call with a dispatch track: the operator recommendation is generated alongside
+        dispatch = is_user and DISPATCH_RECOMMENDATIONS
+        if ranks_hospitals(is_operator) and hospitals_stage is None:
+            hospitals_stage = spawn(lookup_hospitals, sid, req_id)
+
+        log_event("transcribed", req_id=req_id, chars=len(transcript))
+        log_event("transcript", logging.DEBUG, req_id=req_id, text=transcript)
+        if not transcript.strip():
+            empty_transcripts.inc(kind="operator" if is_operator else "user")
+            socketio.emit("no_transcription", {
+                "req_id": req_id,
+                # optional server message if you want:
+                "message": "No speech was detected in the recording."
+            }, to=sid)
+            return "no_speech"
+
+        session = case_sessions.get(sid)
+        case_journal.begin(req_id, "operator" if is_operator else "user", session.case_id)
+        # Broadcast to operators if this is from user (3000), with the case an operator can follow
+        transcription = {"text": transcript, "req_id": req_id}
+        if is_user:
+            transcription["case_id"] = session.case_id
+            if session.turns == 0 and sid in caller_locations:
+                share_case_location(session.case_id, caller_locations[sid])
+        publish(sid, "transcription", transcription, is_user)
+
+        # 提取患者信息, merged with what earlier utterances of this case said
+        with tracer.span(req_id, "extraction"):
+            utterance_info = extract_patient_info(transcript)
+        patient_info, turn = session.merge(utterance_info)
+        log_event("patient_info_extracted", logging.DEBUG, req_id=req_id, case_id=session.case_id, turn=turn, **patient_info)
+
+        # The KB search only reads this utterance's injury/pain/symptoms, so it runs on its own
+        # copy while the patient stage fills in name/age/allergies of the merged case
+        knowledge_stage = spawn(lookup_knowledge, sid, req_id, is_user, utterance_info, transcript, session)
+        db_patient = lookup_patient(sid, req_id, is_user, patient_info, prefetched, session)
+        new_knowledge = knowledge_stage.result()
+        case_knowledge = session.all_knowledge()
+        if any(result["severity"] == "Critical" for result in case_knowledge):
+            call.escalate(CRITICAL)
+        if ranks_hospitals(is_operator):
+            hospitals_stage.result()
+            severity = case_severity(case_knowledge)
+            hospital_data, inventory_version = rank_hospitals(sid, req_id, severity, dispatch)
+
+        build_started = time.perf_counter()
+        with tracer.span(req_id, "prompt"):
+            context = session.context(new_knowledge)
+            enhanced_prompt = build_enhanced_prompt(transcript, patient_info, db_patient, new_knowledge, context)
+            prompt, prompt_details = enhanced_prompt, {}
+            if ranks_hospitals(is_operator):
+                # Already ranked by distance and the stock this severity needs; cut to PROMPT_TOKEN_BUDGET
+                distances = {h["id"]: h["distance_km"] for h in hospital_data if h["distance_km"] is not None}
+                operator_prompt, operator_details = prompt_builder.operator_prompt(
+                    enhanced_prompt, hospital_data, inventory_version, severity, distances, ranked=True
+                )
+                if is_operator:
+                    prompt, prompt_details = operator_prompt, operator_details
+        build_seconds = time.perf_counter() - build_started
+        prompt_builder.report(req_id, prompt, build_seconds, turn=turn, **prompt_details)
+        if dispatch:
+            prompt_builder.report(req_id, operator_prompt, build_seconds, turn=turn, track="dispatch", **operator_details)
+
+        # Streaming mode: tokens go out as response_delta and each finished sentence is
+        # synthesized right away instead of waiting for the whole answer
+        speech = SpeechStream(sid, req_id, is_user, call) if STREAM_RESPONSES else None
+        on_delta = speech.feed if speech else None
+
+        if is_operator:
+            # Operator frontend (3001): Query hospital resources and get detailed recommendation
+            with tracer.span(req_id, "llm"):
+                llm_response = call.run("llm", get_operator_response, prompt, hospital_data, on_delta=on_delta)
+            publish(sid, "operator_recommendation", {"text": llm_response, "req_id": req_id}, False)
         else:
-            print(f"Deepgram STT error: {response.status_code} - {response.text}")
+            # User frontend (3000): Standard response. The caller's advice is queued first, the
+            # dispatch recommendation right behind it, so both run at once when workers are free
+            with tracer.span(req_id, "llm"):
+                response_job = call.submit("llm", get_response, prompt, on_delta=on_delta)
+                if dispatch:
+                    dispatch_job = call.submit("llm", recommend_dispatch, req_id, operator_prompt, hospital_data)
+                llm_response = response_job.result()
+            # Broadcast response to operators
+            publish(sid, "response", {"text": llm_response, "req_id": req_id}, is_user)
+        log_event("llm_responded", req_id=req_id, chars=len(llm_response))
+        log_event("llm_response", logging.DEBUG, req_id=req_id, text=llm_response)
+        session.record_turn(transcript, llm_response, history_sent=db_patient is not None)
+
+        if speech:
+            audio_url = speech.finish(llm_response)
+        else:
+            # Generate audio using Deepgram TTS
+            sender = AudioSender(sid, req_id, is_user) if AUDIO_TRANSPORT == "binary" else None
+            with tracer.span(req_id, "tts"):
+                audio_url = call.run("tts", synthesize_audio, llm_response, on_chunk=sender)
+            if sender:
+                sender.close(audio_url is not None)
+        # Broadcast audio URL to operators if from user
+        publish(sid, "audio_url", {"url": audio_url, "req_id": req_id}, is_user)
+        outcome = "ok" if audio_url else "error"
+
+        if dispatch:
+            # The call holds its admission until the dispatch track is done too
+            try:
+                dispatch_job.result()
+            except Exception as e:
+                log_event("dispatch_failed", logging.ERROR, req_id=req_id, error=str(e))
+        return outcome
+
+    except Exception as e:
+        log_event("call_failed", logging.ERROR, req_id=req_id, error=str(e))
+        return "error"
+
+
+class AudioStream:
+    """
+    One utterance arriving as audio_chunk events. Chunks are reordered and queued; a background
+    task opens the streaming STT session (a websocket connect for deepgram, never on the Socket.IO
+    handler) and feeds it the queue. Every partial transcript is published and run through
+    extraction, so the patient lookup starts as soon as a name is heard instead of after the
+    caller stops talking. An utterance whose final chunk does not arrive within
+    STT_STREAM_IDLE_TIMEOUT seconds of the last one is finished with what was heard, freeing its slot.
+    """
+
+    def __init__(self, sid, origin):
+        self.sid = sid
+        self.req_id = str(uuid.uuid4())
+        self.is_operator = '3001' in origin
+        self.buffer = AudioChunkBuffer(STT_CHUNK_BUFFER)
+        self.chunks = queue.Queue()  # in-order audio for the session; None ends the utterance
+        self.final_seq = None
+        self.prefetched = {}
+        self.last_partial = ""
+        self.session = None
+        self.hospitals_stage = None
+        self.aborted = False
+        self._lock = threading.Lock()
+        tracer.start(self.req_id, "operator" if self.is_operator else "user")
+        # Admitted once per utterance; a shed stream swallows its chunks until the final one
+        self.call = admit_call(sid, self.req_id, OPERATOR if self.is_operator else NORMAL)
+        if self.call is not None:
+            socketio.start_background_task(self.run)
+
+    def push(self, seq, data, final=False):
+        """Queue whatever is now in order; returns True once the final chunk has been queued"""
+        with self._lock:
+            if self.call is None:
+                return final
+            if final:
+                self.final_seq = seq
+
+            dropped = self.buffer.dropped
+            for chunk in self.buffer.push(seq, data):
+                if chunk:
+                    self.chunks.put(chunk)
+            if self.buffer.dropped != dropped:
+                log_event("audio_chunks_dropped", logging.WARNING, req_id=self.req_id, count=self.buffer.dropped - dropped)
+
+            done = self.final_seq is not None and self.buffer.next_seq > self.final_seq
+            if done:
+                self.chunks.put(None)
+            return done
+
+    def on_partial(self, text):
+        if text == self.last_partial:
+            return
+        self.last_partial = text
+        publish(self.sid, "transcription_partial", {"text": text, "req_id": self.req_id}, not self.is_operator)
+
+        partial_info = extract_patient_info(text)
+        key = (partial_info["name"], partial_info["age"])
+        if partial_info["name"] and key not in self.prefetched:
+            self.prefetched[key] = spawn(search_patient_database, *key)
+
+    def run(self):
+        """Background task: the STT session from open to final transcript, then the rest of the call"""
+        outcome = "error"
+        try:
+            if ranks_hospitals(self.is_operator):
+                self.hospitals_stage = spawn(lookup_hospitals, self.sid, self.req_id)
+            self.session = stt_backend.open(self.on_partial)
+            while True:
+                try:
+                    chunk = self.chunks.get(timeout=STT_STREAM_IDLE_TIMEOUT)
+                except queue.Empty:
+                    log_event("audio_stream_idle", logging.WARNING, req_id=self.req_id, timeout=STT_STREAM_IDLE_TIMEOUT)
+                    self.detach()
+                    break
+                if chunk is None:
+                    break
+                self.session.send(chunk)
+            if self.aborted:
+                outcome = "aborted"
+                self.session.close()
+                return
+            # Only the tail of STT is on the critical path: the audio was transcribed while it arrived
+            with tracer.span(self.req_id, "stt"):
+                transcript = self.session.finish()
+            outcome = process_transcript(self.sid, self.req_id, self.is_operator, transcript, self.call,
+                                         self.hospitals_stage, self.prefetched)
+        except Exception as e:
+            log_event("call_failed", logging.ERROR, req_id=self.req_id, error=str(e))
+            if self.session:
+                self.session.close()
+        finally:
+            self.detach()
+            self.call.release()
+            tracer.finish(self.req_id, outcome)
+
+    def detach(self):
+        """Later chunks of this sid start a new utterance"""
+        with audio_streams_lock:
+            if audio_streams.get(self.sid) is self:
+                del audio_streams[self.sid]
+
+    def abort(self):
+        """The caller went away: the background task drops the utterance instead of finishing it"""
+        self.aborted = True
+        self.chunks.put(None)
+
+
+@socketio.on("audio_chunk")
+def handle_audio_chunk(payload):
+    """
+    Chunked audio ingestion.
+    Expects: {"seq": 0, "data": <bytes>, "final": false}; seq restarts at 0 for each utterance
+    and the last chunk carries "final": true (its data may be empty).
+    Emits "transcription_partial" while the caller is still talking, then the usual pipeline events.
+    """
+    sid = request.sid
+    try:
+        with audio_streams_lock:
+            stream = audio_streams.get(sid)
+            if stream is None:
+                origin = request.headers.get('Origin', 'http://localhost:3000')
+                stream = audio_streams[sid] = AudioStream(sid, origin)
 
+        if stream.push(int(payload["seq"]), payload.get("data"), bool(payload.get("final"))):
+            stream.detach()
     except Exception as e:
-        print("An error occurred: ", str(e))
+        log_event("audio_chunk_failed", logging.ERROR, sid=sid, error=str(e))
+        with audio_streams_lock:
+            stream = audio_streams.pop(sid, None)
+        if stream:
+            stream.abort()
+
+
+def complete_chat(system_prompt, prompt, max_tokens, on_delta=None):
+    """
+    Run a Cerebras chat completion. With on_delta set the completion is streamed and
+    every text delta is passed to on_delta as it arrives; the full text is returned either way
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": system_prompt,
+        },
+        {"role": "user", "content": prompt},
+    ]
 
+    if on_delta is None:
+        completion = llm_client().chat.completions.create(
+            model="llama-4-scout-17b-16e-instruct",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=max_tokens
+        )
+        return completion.choices[0].message.content
 
-def get_response(prompt):
+    stream = llm_client().chat.completions.create(
+        model="llama-4-scout-17b-16e-instruct",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    return "".join(parts)
+
+
+def get_response(prompt, on_delta=None):
     """
     Generate medical advice using Cerebras API
     """
@@ -545,28 +1103,13 @@ HARD OUTPUT RULES (must be followed exactly):
 3) Base advice strictly on the provided patient data and knowledge base matches.
 4) Never recommend medications that appear in the patient's allergies.
 5) In the final sentence, include an urgency label like: Urgency: Critical/Moderate/Stable. (Skip this entirely if rule 1 applied.)
+6) A message that starts with "Earlier in this call" is a follow-up: do not repeat advice already given, address what is new.
 """
 
-    completion = cerebras_client.chat.completions.create(
-        model="llama-4-scout-17b-16e-instruct",
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.7,
-        max_tokens=500
-    )
-
-    response = completion.choices[0].message.content
-    print(f"\nLLM Response: {response}\n")
-
-    return response
+    return complete_chat(system_prompt, prompt, max_tokens=500, on_delta=on_delta)
 
 
-def get_operator_response(prompt, hospital_data):
+def get_operator_response(prompt, hospital_data, on_delta=None):
     """
     Generate operator-specific recommendations including hospital selection
     """
@@ -583,32 +1126,17 @@ Requirements:
 - Consider medication availability, especially avoiding allergens
 - For Critical cases, recommend the nearest hospital with trauma capabilities
 - Be concise but thorough in your recommendation
-- Respond in the same language as the patient's input (Chinese or English)"""
-
-    completion = cerebras_client.chat.completions.create(
-        model="llama-4-scout-17b-16e-instruct",
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.7,
-        max_tokens=800
-    )
-
-    response = completion.choices[0].message.content
-    print(f"\nOperator LLM Response: {response}\n")
+- Respond in the same language as the patient's input (Chinese or English)
+- A message that starts with "Earlier in this call" is a follow-up on the same patient: update the recommendation with what is new"""
 
-    return response
+    return complete_chat(system_prompt, prompt, max_tokens=800, on_delta=on_delta)
 
 
-def synthesize_audio(text, audio_filename):
+def fetch_tts_audio(text):
+    """One Deepgram TTS request; returns an iterator over the audio as it arrives, or None"""
     try:
         # Configure Deepgram TTS using REST API
         headers = {
-            "Authorization": f"Token {DEEPGRAM_API_KEY}",
             "Content-Type": "application/json"
         }
 
@@ -617,38 +1145,48 @@ def synthesize_audio(text, audio_filename):
         }
 
         params = {
-            "model": "aura-asteria-en",
-            "encoding": "mp3"
+            "model": TTS_MODEL,
+            "encoding": TTS_ENCODING
         }
 
         # Generate speech using Deepgram REST API
-        response = requests.post(
+        response = deepgram_http.post(
+            "tts",
             DEEPGRAM_URL_TTS,
+            TTS_DEADLINE,
             headers=headers,
             params=params,
-            json=payload
+            json=payload,
+            stream=True
         )
 
         if response.status_code == 200:
-            # Save to static/audio directory
-            audio_url = os.path.join("static", "audio", audio_filename)
-
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(audio_url), exist_ok=True)
-
-            # Save the audio content
-            with open(audio_url, "wb") as audio_file:
-                audio_file.write(response.content)
-
-            print(f"Audio saved to: {audio_url}")
-            return audio_url
+            return iter_body(response, CHUNK_BYTES)
         else:
-            print(f"Deepgram TTS error: {response.status_code} - {response.text}")
+            log_event("tts_failed", logging.ERROR, status=response.status_code, body=response.text[:500])
+            response.close()
             return None
 
     except Exception as e:
-        print(f"Error in TTS: {str(e)}")
+        log_event("tts_failed", logging.ERROR, error=str(e))
+        return None
+
+
+def synthesize_audio(text, on_chunk=None):
+    """
+    Audio URL for text, served from the TTS cache when the same text was spoken before.
+    on_chunk(chunk) additionally receives the audio as it is written
+    """
+    try:
+        audio_filename = tts_cache.get_or_create(text, TTS_MODEL, TTS_ENCODING, fetch_tts_audio, on_chunk)
+    except Exception as e:
+        log_event("tts_failed", logging.ERROR, error=str(e))
+        return None
+    if not audio_filename:
         return None
+    log_event("tts_ready", logging.DEBUG, file=audio_filename)
+    # Served by serve_audio, which answers Range and If-None-Match requests
+    return f"audio/{audio_filename}"
 
 
 @socketio.on("tts_text")
@@ -659,6 +1197,8 @@ def handle_tts_text(payload):
     Emits:
       - "audio_url": {"url": "...", "req_id": "..."} on success
       - "tts_error": {"message": "...", "req_id": "..."} on failure
+      - "busy": {"req_id": "...", "reason": "...", "estimated_wait": seconds} when shed
+    Runs in the background lane of the TTS pool, behind every emergency call.
     """
     try:
         sid = request.sid
@@ -669,46 +1209,234 @@ def handle_tts_text(payload):
             emit("tts_error", {"req_id": req_id, "message": "No text provided for TTS."}, to=sid)
             return
 
+        tracer.start(req_id, "tts_text")
+        call = admit_call(sid, req_id, BACKGROUND)
+        if call:
+            call.submit("tts", speak_text, call, req_id, text)
+    except Exception as e:
+        emit("tts_error", {"req_id": (payload or {}).get("req_id"), "message": str(e)}, to=request.sid)
+
+
+def speak_text(call, req_id, text):
+    """tts_text job on a TTS worker"""
+    audio_url = None
+    try:
         # Use the same TTS voice/model as in synthesize_audio (aura-asteria-en)
-        audio_filename = datetime.now().strftime("%Y%m%d_%H%M%S") + ".mp3"
-        audio_url = synthesize_audio(text, audio_filename)
+        sender = AudioSender(call.sid, req_id, False) if AUDIO_TRANSPORT == "binary" else None
+        with tracer.span(req_id, "tts"):
+            audio_url = synthesize_audio(text, on_chunk=sender)
+        if sender:
+            sender.close(audio_url is not None)
 
         if audio_url:
-            emit("audio_url", {"url": audio_url, "req_id": req_id}, to=sid)
+            socketio.emit("audio_url", {"url": audio_url, "req_id": req_id}, to=call.sid)
         else:
-            emit("tts_error", {"req_id": req_id, "message": "TTS synthesis failed."}, to=sid)
+            socketio.emit("tts_error", {"req_id": req_id, "message": "TTS synthesis failed."}, to=call.sid)
+    finally:
+        call.release()
+        tracer.finish(req_id, "ok" if audio_url else "error")
+
+
+@socketio.on("caller_location")
+def handle_caller_location(payload):
+    """
+    Where the caller is, for nearest-hospital ranking of its own calls.
+    Expects: {"lat": 40.7648, "lon": -73.9536}; bystander locations are forwarded to operators
+    with their case_id. Invalid input is answered with caller_location_error
+    """
+    sid = request.sid
+    try:
+        lat, lon = float(payload["lat"]), float(payload["lon"])
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("coordinates out of range")
+    except (TypeError, KeyError, ValueError) as e:
+        log_event("caller_location_invalid", logging.WARNING, sid=sid, payload=repr(payload)[:200], error=str(e))
+        emit("caller_location_error", {"message": "Expected {lat, lon} in degrees."})
+        return
+
+    caller_locations[sid] = (lat, lon)
+    origin = request.headers.get('Origin', 'http://localhost:3000')
+    if '3001' not in origin:
+        case_id = case_sessions.get(sid).case_id
+        share_case_location(case_id, (lat, lon))
+        broadcast_to_operators("caller_location", {"lat": lat, "lon": lon, "case_id": case_id}, exclude_sid=sid)
+
+
+def share_case_location(case_id, location):
+    """Make a bystander case's location visible to operators following it from any worker"""
+    try:
+        case_store.set_location(case_id, *location)
     except Exception as e:
-        emit("tts_error", {"req_id": (payload or {}).get("req_id"), "message": str(e)}, to=request.sid)
+        log_event("case_location_failed", logging.ERROR, case_id=case_id, error=str(e))
+
+
+@socketio.on("follow_case")
+def handle_follow_case(payload=None):
+    """
+    An operator console (3001) ties its next recordings to a bystander's case, so hospitals are
+    ranked around that bystander. Expects: {"case_id": "..."}; a missing case_id stops following
+    """
+    if '3001' not in request.headers.get('Origin', 'http://localhost:3000'):
+        return
+    case_id = (payload or {}).get("case_id")
+    if case_id:
+        followed_cases[request.sid] = str(case_id)
+    else:
+        followed_cases.pop(request.sid, None)
+
+
+@socketio.on("end_case")
+def handle_end_case(payload=None):
+    """The caller's next recording starts a new case instead of following up on this one"""
+    case_sessions.end(request.sid)
+    followed_cases.pop(request.sid, None)
+
+
+@socketio.on("history")
+def handle_history(payload=None):
+    """A page of journaled calls for an operator console that connected with OPERATOR_TOKEN; same options as GET /history"""
+    if request.sid not in authorized_operators:
+        log_event("history_denied", logging.WARNING, sid=request.sid)
+        emit("history", {"calls": [], "next": None, "error": "unauthorized"})
+        return
+    payload = payload or {}
+    try:
+        emit("history", history_page(payload.get("before"), payload.get("limit", 20),
+                                     payload.get("patient"), payload.get("case_id")))
+    except (TypeError, ValueError) as e:
+        emit("history", {"calls": [], "next": None, "error": str(e)})
 
 
 @socketio.on("connect")
-def test_connect():
+def test_connect(auth=None):
+    """Register the client by role; the totals are the connected_clients gauge on /metrics"""
     sid = request.sid
     origin = request.headers.get('Origin', 'http://localhost:3000')
 
     if '3001' in origin:
-        connected_clients["3001"].add(sid)
-        print(f"Operator client connected: {sid}")
+        client_registry.add("3001", sid)
+        join_room(OPERATORS_ROOM)
+        if operator_token_valid((auth or {}).get("token") if isinstance(auth, dict) else None):
+            authorized_operators.add(sid)
+        log_event("client_connected", role="operator", sid=sid, authorized=sid in authorized_operators)
     else:
-        connected_clients["3000"].add(sid)
-        print(f"User client connected: {sid}")
-
-    print(f"Total clients - Users: {len(connected_clients['3000'])}, Operators: {len(connected_clients['3001'])}")
+        client_registry.add("3000", sid)
+        log_event("client_connected", role="user", sid=sid)
 
 
 @socketio.on("disconnect")
 def test_disconnect():
     sid = request.sid
 
-    if sid in connected_clients["3000"]:
-        connected_clients["3000"].remove(sid)
-        print(f"User client disconnected: {sid}")
-    elif sid in connected_clients["3001"]:
-        connected_clients["3001"].remove(sid)
-        print(f"Operator client disconnected: {sid}")
+    with audio_streams_lock:
+        stream = audio_streams.pop(sid, None)
+    if stream:
+        stream.abort()
+
+    caller_locations.pop(sid, None)
+    followed_cases.pop(sid, None)
+    authorized_operators.discard(sid)
+    case_sessions.end(sid)
+    role = client_registry.remove(sid)
+    log_event("client_disconnected", role={"3000": "user", "3001": "operator"}.get(role), sid=sid)
+
+
+def database_pools():
+    return {"resources": resource_store.pool, "patients": patient_store.pool, "case_journal": case_journal.pool}
+
 
-    print(f"Total clients - Users: {len(connected_clients['3000'])}, Operators: {len(connected_clients['3001'])}")
+def warm_databases():
+    """Fill every shared checkout pool to its size; raises while one cannot be filled"""
+    for name, pool in database_pools().items():
+        opened = pool.warm()
+        if opened < pool.size:
+            raise RuntimeError(f"{name} pool has {opened} of {pool.size} connections")
+    return True
+
+
+def warm_knowledge_base():
+    snapshot = knowledge_base.current()
+    snapshot.search("chest pain bleeding", "i can't catch my breath", SEMANTIC_TOP_K, SEMANTIC_MIN_SCORE)
+
+
+def warm_deepgram():
+    """Keep-alive connections to the Deepgram host(s), handshakes done"""
+    hosts = {}
+    for url in (DEEPGRAM_URL_STT, DEEPGRAM_URL_TTS):
+        hosts.setdefault(urlsplit(url)[:2], url)
+    opened = {url: deepgram_http.warm(url, WARMUP_CONNECTIONS, WARMUP_TIMEOUT) for url in hosts.values()}
+    log_event("deepgram_warmed", connections=opened)
+
+
+def warm_llm():
+    """Import openai, build the client and open its connection to Cerebras"""
+    import openai
+    try:
+        llm_client().with_options(timeout=WARMUP_TIMEOUT, max_retries=0).models.list()
+    except openai.APIStatusError:
+        pass  # an error status still came over a connection that is now open
+    except openai.APIError as e:
+        log_event("llm_warmup_failed", logging.WARNING, error=str(e))
+
+
+def warm_up():
+    """
+    Load what the first call would otherwise load, start the watchers that keep it current,
+    then report ready. The upstream handshakes overlap with the local loading. The database pools
+    are local and cheap to fill, so they are filled even without WARMUP_ENABLED, and retried
+    until they are: a worker whose databases cannot be opened never reports ready
+    """
+    upstreams = []
+    if WARMUP_ENABLED:
+        upstreams = [spawn(lifecycle.phase, "deepgram", warm_deepgram), spawn(lifecycle.phase, "llm", warm_llm)]
+    while not lifecycle.phase("databases", warm_databases):
+        socketio.sleep(1)
+    if WARMUP_ENABLED:
+        lifecycle.phase("knowledge_base", warm_knowledge_base)
+        lifecycle.phase("extraction", extract_patient_info, "My name is John Doe, I am 70 years old and my chest hurts")
+        lifecycle.phase("inventory", hospital_directory.current)
+        for stage in upstreams:
+            stage.result()
+    for watcher in (knowledge_base, inventory_view):
+        if watcher.poll_interval > 0:
+            socketio.start_background_task(watcher.watch, socketio.sleep)
+    lifecycle.mark_ready()
+
+
+def create_app():
+    """
+    The Flask app with the routes and Socket.IO handlers bound (gunicorn "app:create_app()").
+    Bootstraps missing databases from the init_*.sql scripts, then warms up in the background
+    while already accepting connections. A process serves one app: later calls return it
+    """
+    global app
+    if app is not None:
+        return app
+
+    lifecycle.begin()
+    created = lifecycle.phase("bootstrap_databases", bootstrap_databases, BASE_DIR)
+    if created:
+        log_event("databases_created", paths=created)
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "secret!"
+    CORS(app, resources={r"/*": {"origins": CORS_ORIGINS}})
+    app.register_blueprint(routes)
+    # Multi-worker deployments share emits (operator room broadcasts included) through a message
+    # queue, e.g. SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0; unset for a single process
+    socketio.init_app(app, cors_allowed_origins=CORS_ORIGINS, cors_credentials=False,
+                      message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"))
+
+    call_scheduler.start()
+    if patient_names.poll_interval > 0:
+        socketio.start_background_task(patient_names.watch, socketio.sleep)
+    socketio.start_background_task(case_journal.watch, socketio.sleep)
+    atexit.register(case_journal.flush)
+    socketio.start_background_task(warm_up)
+    return app
 
 
 if __name__ == "__main__":
-    socketio.run(app, host="127.0.0.1", port=5000, debug=True, allow_unsafe_werkzeug=True)
+    # The reloader and interactive debugger only on request: FLASK_DEBUG=true
+    debug = os.getenv("FLASK_DEBUG", "false").lower() in ("1", "true", "yes")
+    socketio.run(create_app(), host="127.0.0.1", port=5000, debug=debug, allow_unsafe_werkzeug=True)
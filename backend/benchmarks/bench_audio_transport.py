@@ -0,0 +1,130 @@
+"""
+Peak Python memory per call vs audio length (tracemalloc), against a fake Deepgram in a
+separate process so its buffers are not counted:
+
+    tts      reply clip: response.content then write (old) vs iter_content streamed to disk
+             and a socket sink at once (AUDIO_TRANSPORT=binary)
+    tts x8   the streamed path with 8 calls at once, peak per call
+    stt      recording: one audio_data payload vs audio_chunk events (16 KB, slightly out of
+             order) through AudioChunkBuffer to the live STT session
+
+    python -m benchmarks.bench_audio_transport [--sizes-mb 1,4,16]
+"""
+import argparse
+import multiprocessing
+import random
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_transport import HTTPTransport, iter_body
+from stt import AudioChunkBuffer
+from tts_cache import CHUNK_BYTES, TTSCache
+
+
+class FakeSpeak(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    clip = b""
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 16)))
+        size = int(self.path.rsplit("=", 1)[1])
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        view = memoryview(self.clip)
+        for start in range(0, size, 1 << 16):
+            self.wfile.write(view[start:min(size, start + (1 << 16))])
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, max_bytes):
+    FakeSpeak.clip = random.Random(0).randbytes(max_bytes)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSpeak)
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+
+def peak(fn, calls=1):
+    """Peak traced bytes while `calls` copies of fn run concurrently, per call"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    threads = [threading.Thread(target=fn, args=(i,)) for i in range(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", default="1,4,16")
+    args = parser.parse_args()
+    sizes = [int(float(x) * 1024 * 1024) for x in args.sizes_mb.split(",")]
+
+    port = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=serve, args=(port, max(sizes)), daemon=True)
+    server.start()
+    while not port.value:
+        pass
+    url = f"http://127.0.0.1:{port.value}/speak?bytes="
+    transport = HTTPTransport(pool_size=16)
+
+    def sink(chunk):
+        pass  # stands in for the audio_binary emit / the live STT websocket send
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TTSCache(tmp, max_bytes=1 << 40)
+
+        def buffered(size):
+            def call(i):
+                response = transport.post("tts", url + str(size), 30, json={"text": "x"})
+                cache._store(f"b{size}-{i}.mp3", response.content)
+            return call
+
+        def streamed(size):
+            def call(i):
+                response = transport.post("tts", url + str(size), 30, json={"text": "x"}, stream=True)
+                cache._store(f"s{size}-{i}.mp3", iter_body(response, CHUNK_BYTES), sink)
+            return call
+
+        def whole_recording(size):
+            def call(i):
+                data = bytes(size)  # the audio_data payload as python-socketio hands it over
+                transport.post("stt", url + "0", 30, data=data)
+            return call
+
+        def chunked_recording(size):
+            def call(i):
+                buffer = AudioChunkBuffer(64)
+                rng = random.Random(i)
+                order = list(range((size + CHUNK_BYTES - 1) // CHUNK_BYTES))
+                for start in range(0, len(order), 4):  # reordered in flight, a few at a time
+                    window = order[start:start + 4]
+                    rng.shuffle(window)
+                    for seq in window:
+                        for chunk in buffer.push(seq, bytes(CHUNK_BYTES)):
+                            sink(chunk)
+            return call
+
+        buffered(1024)(0)  # warm the connection pool
+        print(f"{'audio MB':>8} {'tts old KB':>11} {'tts stream KB':>14} {'tts x8 KB/call':>15}"
+              f" {'stt whole KB':>13} {'stt chunks KB':>14}")
+        for size in sizes:
+            row = [peak(buffered(size)), peak(streamed(size)), peak(streamed(size), calls=8),
+                   peak(whole_recording(size)), peak(chunked_recording(size))]
+            print(f"{size / 1024 / 1024:>8.0f} " + " ".join(f"{v / 1024:>{w}.0f}" for v, w in zip(row, (11, 14, 15, 13, 14))))
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Case journal (case_journal.py): what journaling costs the call path, whether the background
+writer keeps up with hundreds of calls per second, and history page latency.
+
+    python -m benchmarks.bench_case_journal [--rates 100,300,600] [--seconds 5] [--history-calls 200000]
+
+  append      per-event cost on the publishing thread: CaseJournal.append (queue only) vs an
+              INSERT + COMMIT per event on a pooled WAL connection, from --threads threads
+  sustained   calls arriving at each rate for --seconds, every call publishing the events of
+              an operator call (transcript, patient, KB matches, hospitals, reply, audio URL);
+              the writer flushes every 200 ms as in production. "call p99" is the
+              time one call spends journaling its eight records (begin + seven events)
+  history     a page of 20 calls from a journal of --history-calls calls: first page, a deep
+              page by keyset cursor vs LIMIT/OFFSET, and filtered by patient
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from case_journal import CaseJournal, encode
+
+NAMES = ["John Doe", "Emily Chen", "David Smith", "Agnes Miller", "Jose Garcia", "Sarah Brown", "李伟", "王芳"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def call_events(rng, req_id):
+    """The events one operator call publishes, with payloads of realistic size"""
+    name = rng.choice(NAMES)
+    hospitals = [{"id": f"h{i}", "name": f"General Hospital {i}", "distance_km": round(rng.uniform(1, 30), 1),
+                  "meets_needs": True, "blood": {t: rng.randint(0, 40) for t in ("A+", "A-", "B+", "O+", "O-", "AB+")},
+                  "medications": {m: rng.randint(0, 99) for m in ("epinephrine", "morphine", "alteplase", "naloxone")}}
+                 for i in range(5)]
+    kb = [{"condition": f"condition {i}", "severity": "Critical", "score": 0.8, "first_aid": "x" * 300} for i in range(3)]
+    return [
+        ("transcription", {"text": f"My name is {name}, I am 70 and my chest hurts badly since this morning", "req_id": req_id}),
+        ("database_patient_found", {"name": name, "age": 70, "medical_history": "hypertension", "allergies": "none", "req_id": req_id}),
+        ("patient_info", {"name": name, "age": 70, "injury": None, "pain": "chest", "symptoms": ["chest pain"], "req_id": req_id}),
+        ("knowledge_base_results", {"results": kb, "req_id": req_id}),
+        ("hospital_resources", {"hospitals": hospitals, "severity": "Critical", "req_id": req_id}),
+        ("response_delta", {"text": "Send", "req_id": req_id}),
+        ("operator_recommendation", {"text": "Send the patient to General Hospital 2. " * 8, "req_id": req_id}),
+        ("audio_url", {"url": f"audio/{uuid.uuid4().hex}.mp3", "req_id": req_id}),
+    ]
+
+
+class SyncJournal:
+    """The obvious alternative: one INSERT and COMMIT per event on the publishing thread"""
+
+    def __init__(self, journal):
+        self.pool = journal.pool
+
+    def append(self, event_name, data):
+        with self.pool.connection() as conn, conn:
+            conn.execute("INSERT INTO call_events (call_id, seq, ts, event, data) VALUES "
+                         "((SELECT id FROM calls WHERE req_id = ?), ?, ?, ?, ?)",
+                         (data["req_id"], time.perf_counter_ns(), int(time.time() * 1000), event_name, encode(data)))
+
+
+def bench_append(tmp, threads, per_thread):
+    rows = []
+    for label in ("CaseJournal.append", "INSERT + COMMIT"):
+        journal = CaseJournal(os.path.join(tmp, f"append_{len(rows)}.db"), max_queue=10 ** 9)
+        journal.pool.warm()
+        sink = journal if label == "CaseJournal.append" else SyncJournal(journal)
+        timings = [[] for _ in range(threads)]
+
+        def producer(i):
+            rng = random.Random(i)
+            out = timings[i]
+            while len(out) < per_thread:
+                req_id = str(uuid.uuid4())
+                with journal.pool.connection() as conn, conn:
+                    conn.execute("INSERT INTO calls (req_id, started) VALUES (?, 0)", (req_id,))
+                for event, data in call_events(rng, req_id):
+                    t0 = time.perf_counter()
+                    sink.append(event, data)
+                    out.append((time.perf_counter() - t0) * 1e6)
+
+        workers = [threading.Thread(target=producer, args=(i,)) for i in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        flat = [t for ts in timings for t in ts]
+        rows.append((label, statistics.mean(flat), percentile(flat, 50), percentile(flat, 99), max(flat)))
+        journal.close()
+    print(f"\nappend: cost on the publishing thread, {threads} threads x {per_thread} events")
+    print(f"{'':>20} {'mean us':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>9}")
+    for label, mean, p50, p99, worst in rows:
+        print(f"{label:>20} {mean:>8.1f} {p50:>8.1f} {p99:>8.1f} {worst:>9.0f}")
+
+
+def bench_sustained(tmp, rate, seconds, threads):
+    path = os.path.join(tmp, f"sustained_{rate}.db")
+    journal = CaseJournal(path)
+    journal.pool.warm()
+    stop = threading.Event()
+    flushes = []
+
+    def writer():
+        while not stop.is_set():
+            time.sleep(journal.flush_interval)
+            t0 = time.perf_counter()
+            journal.flush()
+            flushes.append((time.perf_counter() - t0) * 1000)
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    appends = [[] for _ in range(threads)]
+
+    def producer(i):
+        # Each thread places its share of the calls, evenly spaced
+        rng = random.Random(i)
+        interval = threads / rate
+        due = time.perf_counter() + i * interval / threads
+        end = time.perf_counter() + seconds
+        while due < end:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            req_id = str(uuid.uuid4())
+            events = call_events(rng, req_id)
+            t0 = time.perf_counter()
+            journal.begin(req_id, "operator", "case-" + req_id[:8])
+            for event, data in events:
+                journal.append(event, data)
+            appends[i].append((time.perf_counter() - t0) * 1e6)
+            due += interval
+
+    started = time.perf_counter()
+    producers = [threading.Thread(target=producer, args=(i,)) for i in range(threads)]
+    for p in producers:
+        p.start()
+    for p in producers:
+        p.join()
+    produced_s = time.perf_counter() - started
+    stop.set()
+    writer_thread.join()
+    journal.flush()
+    stats = journal.stats()
+    calls = sum(len(a) for a in appends)
+    per_call = [t for a in appends for t in a]
+    size = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+    journal.close()
+    return {
+        "rate": rate, "calls": calls, "records_s": stats["written"] / produced_s,
+        "call_p99_us": percentile(per_call, 99), "max_queued": stats["max_queued"],
+        "batches": stats["batches"], "dropped": stats["dropped"], "flush_p99_ms": percentile(flushes, 99),
+        "kb_per_call": size / 1024 / max(calls, 1)
+    }
+
+
+def bench_history(tmp, calls, rng):
+    path = os.path.join(tmp, "history.db")
+    journal = CaseJournal(path, batch_size=20000, max_queue=10 ** 9)
+    started = time.perf_counter()
+    for _ in range(calls):
+        req_id = str(uuid.uuid4())
+        journal.begin(req_id, rng.choice(("user", "operator")), "case-" + req_id[:8])
+        for event, data in call_events(rng, req_id):
+            journal.append(event, data)
+        if len(journal._pending) > 100000:
+            journal.flush()
+    journal.flush()
+    print(f"\nhistory: {calls} journaled calls written in {time.perf_counter() - started:.1f}s, "
+          f"{os.path.getsize(path) / 1024 / 1024:.0f} MB")
+
+    def timed(fn, runs=50):
+        samples = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    conn = journal.pool.dedicated()
+    newest = conn.execute("SELECT max(id) FROM calls").fetchone()[0]
+    deep = newest - calls * 9 // 10  # 90% of the way back
+    offset = calls * 9 // 10
+    rows = [
+        ("first page", timed(lambda: journal.history(limit=20))),
+        ("deep page, keyset cursor", timed(lambda: journal.history(before=deep, limit=20))),
+        ("deep page, LIMIT/OFFSET", timed(lambda: conn.execute(
+            "SELECT id, req_id, started, case_id, kind, patient FROM calls ORDER BY id DESC LIMIT 20 OFFSET ?",
+            (offset,)).fetchall(), runs=10)),
+        ("patient filter, first page", timed(lambda: journal.history(limit=20, patient="Agnes Miller"))),
+        ("patient filter, deep page", timed(lambda: journal.history(before=deep, limit=20, patient="Agnes Miller"))),
+    ]
+    page = journal.history(limit=20)
+    events = sum(len(c["events"]) for c in page["calls"])
+    print(f"{'':>28} {'median ms':>10}   (a page: {len(page['calls'])} calls, {events} events)")
+    for label, ms in rows:
+        print(f"{label:>28} {ms:>10.2f}")
+    print("(the OFFSET row only reads the calls, without their events)")
+    journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", default="100,300,600", help="calls per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--threads", type=int, default=16, help="publishing threads")
+    parser.add_argument("--append-events", type=int, default=2000, help="per thread in the append comparison")
+    parser.add_argument("--history-calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_append(tmp, args.threads, args.append_events)
+
+        print(f"\nsustained: {args.seconds:.0f}s of calls at each rate, 8 events per call (response_delta is not journaled)")
+        print(f"{'calls/s':>8} {'calls':>7} {'records/s':>10} {'call p99 us':>12} {'max queued':>11} "
+              f"{'batches':>8} {'dropped':>8} {'flush p99 ms':>13} {'KB/call':>8}")
+        for rate in (int(r) for r in args.rates.split(",")):
+            r = bench_sustained(tmp, rate, args.seconds, args.threads)
+            print(f"{r['rate']:>8} {r['calls']:>7} {r['records_s']:>10.0f} {r['call_p99_us']:>12.0f} "
+                  f"{r['max_queued']:>11} {r['batches']:>8} {r['dropped']:>8} {r['flush_p99_ms']:>13.1f} {r['kb_per_call']:>8.1f}")
+
+        bench_history(tmp, args.history_calls, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+End-to-end multi-worker check: N backend processes (serve.py) sharing a Redis message
+queue, users and operators connected round-robin across them, Deepgram and the LLM
+replaced by a local fake upstream. Verifies that every operator sees every user call no
+matter which process handled it, and reports calls/s.
+
+    python -m benchmarks.bench_cluster --workers 1,2,4 [--users 8] [--calls 10]
+        [--redis redis://localhost:6379/0 | --fake-redis]
+
+--fake-redis runs an in-process fakeredis server instead of a real Redis (pip install fakeredis).
+Needs gunicorn, redis and python-socketio's client (websocket-client). Throughput only scales
+with workers on a machine with as many free cores.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import socketio
+
+from benchmarks import fake_upstream
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_fake_redis(port):
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def wait_for_port(port, timeout=60):
+    import socket
+    give_up = time.time() + timeout
+    while time.time() < give_up:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+def connect(port, origin, received):
+    # websocket-client adds an Origin of its own, which the backend's CORS check rejects
+    client = socketio.Client(websocket_extra_options={"suppress_origin": True})
+
+    @client.on("*")
+    def on_any(event, data=None):
+        received.append((event, data))
+
+    client.connect(f"http://127.0.0.1:{port}", headers={"Origin": origin})
+    return client
+
+
+def run_cluster(n_workers, args, redis_url, upstream_port):
+    base_port = args.port
+    env = dict(
+        os.environ,
+        **fake_upstream.backend_env(upstream_port),
+        SOCKETIO_MESSAGE_QUEUE=redis_url,
+        KB_RELOAD_INTERVAL="0",
+        GUNICORN_THREADS="50"
+    )
+    cluster = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(n_workers), "--port", str(base_port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        for i in range(n_workers):
+            wait_for_port(base_port + i)
+
+        operator_events = []
+        operators = [connect(base_port + (i % n_workers), "http://localhost:3001", operator_events)
+                     for i in range(args.operators)]
+        users = []
+        for i in range(args.users):
+            events = []
+            users.append((connect(base_port + (i % n_workers), "http://localhost:3000", events), events))
+        time.sleep(0.5)
+
+        def user_calls(client, events):
+            for _ in range(args.calls):
+                done = sum(1 for e, _ in events if e == "audio_url")
+                client.emit("audio_data", b"\0" * 4096)
+                while sum(1 for e, _ in events if e == "audio_url") == done:
+                    time.sleep(0.005)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=user_calls, args=user) for user in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5)  # let the last broadcasts land
+
+        total_calls = args.users * args.calls
+        delivered = sum(1 for e, _ in operator_events if e == "audio_url")
+        for client in operators + [u for u, _ in users]:
+            client.disconnect()
+        return total_calls / elapsed, delivered, total_calls * args.operators
+    finally:
+        cluster.terminate()
+        cluster.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--operators", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--redis", default=os.getenv("SOCKETIO_MESSAGE_QUEUE"))
+    parser.add_argument("--fake-redis", action="store_true")
+    args = parser.parse_args()
+
+    redis_url = start_fake_redis(6399) if args.fake_redis else args.redis
+    if not redis_url:
+        sys.exit("pass --redis redis://... or --fake-redis")
+
+    upstream_port, _ = fake_upstream.start(in_process=True)
+
+    print(f"{args.users} users x {args.calls} calls, {args.operators} operators (cores: {os.cpu_count()})")
+    for n in [int(x) for x in args.workers.split(",")]:
+        rate, delivered, expected = run_cluster(n, args, redis_url, upstream_port)
+        print(f"  {n} worker(s): {rate:6.1f} calls/s, operators received {delivered}/{expected} audio_url broadcasts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Cold start of one backend process (gunicorn, as deployed): how long after it is started it
+accepts connections, reports ready on /healthz and has served its first call, against fake
+Deepgram and Cerebras services (fake_upstream) whose new connections take --connect-ms, the
+TCP and TLS handshakes with a remote host. Each case runs with the warm-up on and off:
+
+    deploy    fresh scratch copy of backend/ without databases (bootstrapped from the
+              init_*.sql scripts) or the persisted semantic KB index
+    restart   the same directory again after the previous process was killed with SIGKILL
+              (median of --runs)
+    crash     only the gunicorn worker is killed and its master forks a replacement, which
+              finds the app modules already imported (gunicorn.conf.py); times from the kill
+
+    python -m benchmarks.bench_cold_start [--connect-ms 150] [--runs 3]
+
+The first call is placed as soon as /healthz answers 200, as a load balancer would send it.
+"served" is the time from starting the process to that call's audio_url, "first call" the
+call's own latency and "next call" the latency of the call after it, for comparison.
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks import fake_upstream
+from benchmarks.bench_cluster import BACKEND_DIR
+from benchmarks.bench_e2e import Caller, load_corpus
+
+DEPLOY_IGNORE = shutil.ignore_patterns("benchmarks", "__pycache__", "audio", "data", "*.db", "*.db-wal", "*.db-shm", "kb_index")
+
+
+def wait_until(check, timeout, interval=0.01):
+    give_up = time.perf_counter() + timeout
+    while time.perf_counter() < give_up:
+        try:
+            if check():
+                return time.perf_counter()
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(interval)
+    raise RuntimeError("backend did not come up")
+
+
+def audio_url_at(caller, req_id):
+    return next(t for t, event, rid in caller.events if rid == req_id and event == "audio_url")
+
+
+def worker_pid(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        children = f.read().split()
+    if not children:
+        raise RuntimeError("gunicorn has no worker")
+    return int(children[0])
+
+
+def serve_first_calls(base_url, audio, timeout, since):
+    """Wait for /healthz, then place two calls; timings in seconds after `since`"""
+    listening = wait_until(lambda: requests.get(base_url + "/healthz", timeout=1) is not None, 60)
+    ready = wait_until(lambda: requests.get(base_url + "/healthz", timeout=1).status_code == 200, 60)
+    caller = Caller(base_url, "user")
+    try:
+        for _ in range(2):
+            caller.place_call(audio, timeout)
+    finally:
+        caller.close()
+    (first_start, first_id), (next_start, next_id) = caller.calls
+    if not (first_id and next_id):
+        raise RuntimeError("a call timed out")
+    first_done = audio_url_at(caller, first_id)
+    return {
+        "listening_s": listening - since,
+        "ready_s": ready - since,
+        "served_s": first_done - since,
+        "first_call_ms": (first_done - first_start) * 1000,
+        "next_call_ms": (audio_url_at(caller, next_id) - next_start) * 1000,
+        "phases": requests.get(base_url + "/healthz", timeout=5).json()["phases"]
+    }
+
+
+def cold_start(backend_dir, env, port, audio, timeout, crash=False):
+    """
+    Start the backend and serve its first calls; with `crash`, then kill its worker and serve
+    the replacement's first calls too. Returns (start timings, crash timings or None)
+    """
+    base_url = f"http://127.0.0.1:{port}"
+    with open(os.path.join(backend_dir, "..", "backend.log"), "ab") as log:
+        started = time.perf_counter()
+        # Own process group, so SIGKILL takes the gunicorn worker down with its master
+        process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+                                   cwd=backend_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+    try:
+        start = serve_first_calls(base_url, audio, timeout, started)
+        if not crash:
+            return start, None
+        os.kill(worker_pid(process.pid), signal.SIGKILL)
+        return start, serve_first_calls(base_url, audio, timeout, time.perf_counter())
+    finally:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connect-ms", type=float, default=150, help="handshake time of a new upstream connection")
+    parser.add_argument("--stt-ms", type=float, default=300)
+    parser.add_argument("--llm-ms", type=float, default=500)
+    parser.add_argument("--tts-ms", type=float, default=200)
+    parser.add_argument("--runs", type=int, default=3, help="restarts per warm-up setting")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--port", type=int, default=5211)
+    args = parser.parse_args()
+
+    audio, transcript = load_corpus(None, 64)[0]
+    profile = fake_upstream.Profile(stt_ms=args.stt_ms, tts_ms=args.tts_ms, llm_ms=args.llm_ms,
+                                    transcripts=[transcript], unique_answers=True, connect_ms=args.connect_ms,
+                                    audio_transcripts={hashlib.sha1(audio).hexdigest(): transcript})
+    upstream_port, stop_upstream = fake_upstream.start(profile)
+    env = dict(os.environ, **fake_upstream.backend_env(upstream_port), HOST="127.0.0.1", PORT=str(args.port),
+               LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    for key in ("SOCKETIO_MESSAGE_QUEUE", "SHARED_STATE_URL", "DB_DIR", "PATIENTS_DB_PATH", "HOSPITALS_DB_PATH",
+                "BLOOD_PLASMA_DB_PATH", "MEDICATIONS_DB_PATH", "SEMANTIC_INDEX_DIR"):
+        env.pop(key, None)
+
+    rows = []
+    deploy_phases = None
+    try:
+        for warmup in ("true", "false"):
+            scratch = tempfile.mkdtemp(prefix="bench_cold_start_")
+            backend_dir = os.path.join(scratch, "backend")
+            shutil.copytree(BACKEND_DIR, backend_dir, ignore=DEPLOY_IGNORE)
+            run_env = dict(env, WARMUP_ENABLED=warmup)
+            try:
+                deploy, _ = cold_start(backend_dir, run_env, args.port, audio, args.timeout)
+                rows.append(("deploy", warmup, deploy))
+                if warmup == "true":
+                    deploy_phases = deploy["phases"]
+                runs = [cold_start(backend_dir, run_env, args.port, audio, args.timeout, crash=True)
+                        for _ in range(args.runs)]
+                for case, results in (("restart", [r[0] for r in runs]), ("crash", [r[1] for r in runs])):
+                    rows.append((case, warmup, {key: statistics.median(r[key] for r in results)
+                                                for key in results[0] if key != "phases"}))
+            except Exception:
+                with open(os.path.join(scratch, "backend.log"), "rb") as f:
+                    sys.stderr.write(f.read()[-4000:].decode(errors="replace"))
+                raise
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+    finally:
+        stop_upstream()
+
+    print(f"upstream stt/llm/tts {args.stt_ms:.0f}/{args.llm_ms:.0f}/{args.tts_ms:.0f} ms, "
+          f"new connections {args.connect_ms:.0f} ms; times from process start (crash: from the worker's death)")
+    print(f"{'case':<8} {'warm-up':>7} {'listening s':>12} {'ready s':>8} {'served s':>9} {'first call ms':>14} {'next call ms':>13}")
+    for case, warmup, r in rows:
+        print(f"{case:<8} {'on' if warmup == 'true' else 'off':>7} {r['listening_s']:>12.2f} {r['ready_s']:>8.2f} "
+              f"{r['served_s']:>9.2f} {r['first_call_ms']:>14.0f} {r['next_call_ms']:>13.0f}")
+    if deploy_phases:
+        print("deploy start-up phases (ms): " + ", ".join(
+            f"{p['phase']} {p['ms']}" + (" (failed)" if p["error"] else "") for p in deploy_phases))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Offline end-to-end load test: the real backend (gunicorn, one process, run from a scratch copy
+of backend/) against fake Deepgram and Cerebras services (fake_upstream) with configurable
+latency, jitter and error rate. N user and M operator Socket.IO clients each place calls one
+after another, replaying recorded audio, and the run reports
+
+    throughput        completed calls/s, plus shed (busy), no-speech and timed-out calls
+    latency           p50/p95/p99 from audio_data to each pipeline event, per client role
+                      (transcription, patient_info, response / operator_recommendation,
+                      audio_url); "broadcast" is when operators got each user call's response,
+                      audio_url and, with DISPATCH_RECOMMENDATIONS, dispatch recommendation
+    server stages     mean seconds per stage from the backend's /metrics
+    memory            backend RSS idle, peak during the run and after it
+
+    python -m benchmarks.bench_e2e [--users 8] [--operators 2] [--calls 10]
+        [--stt-ms 300 --llm-ms 500 --tts-ms 200 --jitter-ms 100 --error-rate 0.02]
+        [--audio recordings/] [--save run.json] [--baseline run.json --tolerance 0.2]
+
+--audio takes a directory of recordings, each with its transcript next to it (call1.webm +
+call1.txt); the fake STT answers each recording with its own transcript. Without it the
+transcripts of extraction_corpus.json are replayed behind --audio-kb of placeholder audio.
+Backend settings (STREAM_RESPONSES, AUDIO_TRANSPORT, STT_WORKERS, ...) are passed through
+from the environment. With --baseline the run exits 1 when throughput drops or a p95 grows
+by more than --tolerance, so a change can be checked against the run saved before it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import socketio
+
+from benchmarks import fake_upstream
+from benchmarks.bench_cluster import BACKEND_DIR, wait_for_port
+
+EVENTS = ("transcription", "patient_info", "response", "operator_recommendation", "audio_url", "audio_chunk")
+# Last event of a call; audio_chunks_complete with STREAM_RESPONSES, busy when shed
+TERMINAL = ("audio_url", "audio_chunks_complete", "busy", "no_transcription")
+# Only ever sent to the caller, never broadcast: tells an operator's own calls from user broadcasts
+OPERATOR_OWN = ("hospital_resources", "operator_recommendation", "busy", "no_transcription")
+# User call events timed on the operators' side; dispatch-tagged events are renamed "dispatch_<event>"
+BROADCAST = ("response", "audio_url", "dispatch_operator_recommendation")
+COPY_IGNORE = shutil.ignore_patterns("benchmarks", "__pycache__", "audio", "data", "*.db-wal", "*.db-shm")
+
+
+def load_corpus(audio_dir, audio_kb):
+    """[(audio bytes, transcript)]"""
+    if audio_dir:
+        corpus = []
+        for name in sorted(os.listdir(audio_dir)):
+            stem, ext = os.path.splitext(name)
+            transcript_path = os.path.join(audio_dir, stem + ".txt")
+            if ext == ".txt" or not os.path.exists(transcript_path):
+                continue
+            with open(os.path.join(audio_dir, name), "rb") as f, open(transcript_path, encoding="utf-8") as t:
+                corpus.append((f.read(), t.read().strip()))
+        if not corpus:
+            sys.exit(f"no recordings with a .txt transcript in {audio_dir}")
+        return corpus
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_corpus.json"), encoding="utf-8") as f:
+        transcripts = [case["transcript"] for case in json.load(f)]
+    rng = random.Random(0)
+    return [(f"fake-audio-{i}:".encode() + rng.randbytes(audio_kb * 1024), transcript)
+            for i, transcript in enumerate(transcripts)]
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def tree_rss(pid):
+    """Resident KB of a process and its descendants (Linux /proc), None elsewhere"""
+    if not os.path.exists("/proc/self/status"):
+        return None
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [p for p, pp in parents.items() if pp == parent and p not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    total = 0
+    for p in tree:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+        except OSError:
+            continue
+    return total
+
+
+class Caller:
+    """One Socket.IO client placing calls one at a time and timestamping every event it receives"""
+
+    def __init__(self, url, role):
+        self.role = role
+        self.events = []  # (perf_counter, event, req_id)
+        self.calls = []  # (started, req_id or None when timed out)
+        self._seen = set()  # req_ids of this client's earlier calls
+        self._cond = threading.Condition()
+        # websocket-client adds an Origin of its own, which the backend's CORS check rejects
+        self.client = socketio.Client(websocket_extra_options={"suppress_origin": True})
+        self.client.on("*", self._on_event)
+        self.client.connect(url, headers={"Origin": "http://localhost:3001" if role == "operator" else "http://localhost:3000"})
+
+    def _on_event(self, event, data=None):
+        now = time.perf_counter()
+        # OPERATOR_CASE_UPDATE_MS merges a call's events; unpack them like the frontend does
+        batch = data["events"] if event == "case_update" else [(event, data)]
+        with self._cond:
+            for name, payload in batch:
+                req_id = payload.get("req_id") if isinstance(payload, dict) else None
+                if isinstance(payload, dict) and payload.get("dispatch"):
+                    name = "dispatch_" + name  # a user call's dispatch track, not this operator's own call
+                self.events.append((now, name, req_id))
+            self._cond.notify_all()
+
+    def _own_call(self, since):
+        """req_id of the call in progress once its terminal event arrived, else None"""
+        own = None
+        for t, event, req_id in self.events[since:]:
+            if req_id is None or req_id in self._seen:
+                continue
+            if self.role == "user" or event in OPERATOR_OWN:
+                own = req_id
+            if req_id == own and event in TERMINAL:
+                return own
+        return None
+
+    def place_call(self, audio, timeout):
+        with self._cond:
+            since = len(self.events)
+        started = time.perf_counter()
+        self.client.emit("audio_data", audio)
+        with self._cond:
+            own = None
+            while own is None:
+                remaining = started + timeout - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                own = self._own_call(since)
+        if own:
+            self._seen.add(own)
+        self.calls.append((started, own))
+
+    def close(self):
+        self.client.disconnect()
+
+
+def summarize(callers, elapsed):
+    latency = {}
+    outcomes = {"completed": 0, "busy": 0, "no_transcription": 0, "timed_out": 0}
+    user_started = {}
+    for caller in callers:
+        by_req = {}
+        for t, event, req_id in caller.events:
+            by_req.setdefault(req_id, {}).setdefault(event, t)
+        for started, req_id in caller.calls:
+            if req_id is None:
+                outcomes["timed_out"] += 1
+                continue
+            events = by_req[req_id]
+            if "busy" in events:
+                outcomes["busy"] += 1
+                continue
+            if "no_transcription" in events:
+                outcomes["no_transcription"] += 1
+                continue
+            outcomes["completed"] += 1
+            if caller.role == "user":
+                user_started[req_id] = started
+            for event in EVENTS:
+                if event in events:
+                    latency.setdefault(f"{caller.role} {event}", []).append(events[event] - started)
+    # Operators receiving each user call's reply and dispatch recommendation
+    for caller in callers:
+        if caller.role == "operator":
+            for t, event, req_id in caller.events:
+                if event in BROADCAST and req_id in user_started:
+                    latency.setdefault("broadcast " + event, []).append(t - user_started[req_id])
+
+    summary = {"elapsed_s": round(elapsed, 3), "calls_per_s": round(outcomes["completed"] / elapsed, 3),
+               "outcomes": outcomes, "latency_ms": {}}
+    for key, samples in sorted(latency.items()):
+        summary["latency_ms"][key] = {"n": len(samples), **{
+            name: round(percentile(samples, q) * 1000, 1) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}}
+    return summary
+
+
+def stage_means(base_url):
+    """Mean seconds per pipeline stage from the backend's call_stage_seconds histogram"""
+    sums, counts = {}, {}
+    for line in requests.get(base_url + "/metrics", timeout=10).text.splitlines():
+        for suffix, into in (("_sum", sums), ("_count", counts)):
+            if line.startswith("call_stage_seconds" + suffix + "{"):
+                stage = line.split('stage="', 1)[1].split('"', 1)[0]
+                into[stage] = float(line.rsplit(" ", 1)[1])
+    return {stage: round(sums[stage] / counts[stage] * 1000, 1) for stage in counts if counts[stage]}
+
+
+def compare(summary, baseline, tolerance):
+    """Regressions of this run against a saved one"""
+    regressions = []
+    if summary["calls_per_s"] < baseline["calls_per_s"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['calls_per_s']} -> {summary['calls_per_s']} calls/s")
+    for key, old in baseline["latency_ms"].items():
+        new = summary["latency_ms"].get(key)
+        if new is None:
+            regressions.append(f"{key}: no longer measured")
+        elif new["p95"] > old["p95"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {old['p95']} -> {new['p95']} ms")
+    for outcome in ("timed_out", "no_transcription"):
+        if summary["outcomes"][outcome] > baseline["outcomes"][outcome]:
+            regressions.append(f"{outcome}: {baseline['outcomes'][outcome]} -> {summary['outcomes'][outcome]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--operators", type=int, default=2)
+    parser.add_argument("--calls", type=int, default=10, help="calls per client")
+    parser.add_argument("--stt-ms", type=float, default=300)
+    parser.add_argument("--llm-ms", type=float, default=500)
+    parser.add_argument("--tts-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=100, help="mean of the exponential tail added to each upstream call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered 503")
+    parser.add_argument("--token-ms", type=float, default=20, help="between streamed LLM deltas (STREAM_RESPONSES)")
+    parser.add_argument("--audio", help="directory of recordings with .txt transcripts")
+    parser.add_argument("--audio-kb", type=int, default=64, help="placeholder recording size without --audio")
+    parser.add_argument("--cached-answers", action="store_true", help="same reply every call (TTS cache hits)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a call counts as timed out")
+    parser.add_argument("--port", type=int, default=5201)
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.audio, args.audio_kb)
+    profile = fake_upstream.Profile(
+        stt_ms=args.stt_ms, tts_ms=args.tts_ms, llm_ms=args.llm_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, token_ms=args.token_ms, transcripts=[t for _, t in corpus],
+        audio_transcripts={hashlib.sha1(audio).hexdigest(): t for audio, t in corpus},
+        unique_answers=not args.cached_answers)
+    upstream_port, stop_upstream = fake_upstream.start(profile)
+
+    scratch = tempfile.mkdtemp(prefix="bench_e2e_")
+    backend_dir = os.path.join(scratch, "backend")
+    shutil.copytree(BACKEND_DIR, backend_dir, ignore=COPY_IGNORE)
+    env = dict(os.environ, **fake_upstream.backend_env(upstream_port), HOST="127.0.0.1", PORT=str(args.port),
+               KB_RELOAD_INTERVAL="0", LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    env.pop("SOCKETIO_MESSAGE_QUEUE", None)
+    env.pop("SHARED_STATE_URL", None)
+    log = open(os.path.join(scratch, "backend.log"), "wb")
+    backend = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+                               cwd=backend_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{args.port}"
+    callers = []
+    try:
+        wait_for_port(args.port)
+        callers = [Caller(base_url, "operator") for _ in range(args.operators)]
+        callers += [Caller(base_url, "user") for _ in range(args.users)]
+        # Warm-up call: loads the knowledge base, inventory and hospital index
+        callers[-1].place_call(corpus[0][0], args.timeout)
+        for caller in callers:
+            caller.calls.clear()
+        idle_rss = tree_rss(backend.pid)
+
+        peak_rss = [idle_rss or 0]
+        done = threading.Event()
+
+        def sample_memory():
+            while not done.wait(0.2):
+                peak_rss[0] = max(peak_rss[0], tree_rss(backend.pid) or 0)
+
+        def run(caller, offset):
+            for i in range(args.calls):
+                caller.place_call(corpus[(offset + i) % len(corpus)][0], args.timeout)
+
+        threading.Thread(target=sample_memory, daemon=True).start()
+        threads = [threading.Thread(target=run, args=(caller, i * args.calls)) for i, caller in enumerate(callers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5)  # last broadcasts
+        done.set()
+
+        summary = summarize(callers, elapsed)
+        summary["stage_ms"] = stage_means(base_url)
+        summary["memory_kb"] = {"idle": idle_rss, "peak": peak_rss[0] or None, "after": tree_rss(backend.pid)}
+        summary["config"] = {key: value for key, value in vars(args).items() if key not in ("save", "baseline")}
+    except Exception:
+        log.flush()
+        with open(log.name, "rb") as f:
+            sys.stderr.write(f.read()[-4000:].decode(errors="replace"))
+        raise
+    finally:
+        for caller in callers:
+            caller.close()
+        backend.terminate()
+        backend.wait()
+        log.close()
+        stop_upstream()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    outcomes = summary["outcomes"]
+    print(f"{args.users} users + {args.operators} operators x {args.calls} calls; upstream stt/llm/tts "
+          f"{args.stt_ms:.0f}/{args.llm_ms:.0f}/{args.tts_ms:.0f} ms, jitter {args.jitter_ms:.0f} ms, errors {args.error_rate:.0%}")
+    print(f"throughput {summary['calls_per_s']} calls/s over {summary['elapsed_s']} s; completed {outcomes['completed']},"
+          f" busy {outcomes['busy']}, no speech {outcomes['no_transcription']}, timed out {outcomes['timed_out']}")
+    print(f"{'event':<44} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for key, row in summary["latency_ms"].items():
+        print(f"{key:<44} {row['n']:>5} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}")
+    print("server stage means (ms): " + ", ".join(f"{stage} {ms}" for stage, ms in summary["stage_ms"].items()))
+    memory = summary["memory_kb"]
+    if memory["idle"] is not None:
+        print(f"backend RSS: idle {memory['idle'] / 1024:.0f} MB, peak {memory['peak'] / 1024:.0f} MB,"
+              f" after {memory['after'] / 1024:.0f} MB")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        if regressions:
+            print(f"REGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Check the compiled extractor against the golden corpus and time it against the original
+per-pattern implementation, including the streaming case where extraction reruns on
+every partial transcript.
+
+    python -m benchmarks.bench_extraction [--words 400] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+from extraction import extract_patient_info
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_corpus.json")
+
+
+def legacy_extract_patient_info(transcript):
+    """The original app.extract_patient_info, kept verbatim as the reference"""
+    info = {
+        "name": None,
+        "age": None,
+        "injury": None,
+        "pain_location": None,
+        "pain_level": None,
+        "allergies": None,
+        "symptoms": []
+    }
+
+    name_patterns = [
+        r'患者名叫([A-Za-z\u4e00-\u9fa5\s]+?)(?:[,，。\.]|$)',
+        r'我叫([A-Za-z\u4e00-\u9fa5]+)',
+        r'(?:my name is|I am|I\'m)\s+([A-Za-z\s]+?)(?:[,\.]|$)',
+    ]
+    for pattern in name_patterns:
+        name_match = re.search(pattern, transcript, re.IGNORECASE)
+        if name_match:
+            info["name"] = name_match.group(1).strip()
+            break
+
+    age_patterns = [
+        r'(\d+)岁',
+        r'(\d+)\s+years?\s+old',
+        r'I am (\d+)',
+    ]
+    for pattern in age_patterns:
+        age_match = re.search(pattern, transcript, re.IGNORECASE)
+        if age_match:
+            info["age"] = int(age_match.group(1))
+            break
+
+    injury_patterns_cn = [
+        r'发生了?(车祸|交通事故)',
+        r'从(.+?)摔下来',
+        r'被(.+?)(撞|打|咬)',
+        r'(摔|跌|撞)(?:倒|伤)',
+        r'因为(.+?)(晕倒|昏倒|昏迷)',
+        r'(高血压|低血压|糖尿病|心脏病)'
+    ]
+    for pattern in injury_patterns_cn:
+        injury_match = re.search(pattern, transcript)
+        if injury_match:
+            info["injury"] = injury_match.group(0)
+            break
+
+    if not info["injury"]:
+        injury_patterns_en = [
+            r'(car accident|traffic accident|motor vehicle accident)',
+            r'(fell|fainted|collapsed|injured|hit|cut|burned|broke)',
+            r'because of\s+(.+?)(?:\.|,|$)',
+            r'(high blood pressure|low blood pressure|diabetes|heart attack|stroke)',
+        ]
+        for pattern in injury_patterns_en:
+            injury_match = re.search(pattern, transcript, re.IGNORECASE)
+            if injury_match:
+                info["injury"] = injury_match.group(0)
+                break
+
+    pain_patterns_cn = [
+        r'([\u4e00-\u9fa5]+?)(很|特别|非常)?(痛|疼)',
+        r'(头|脚|手|腿|腰|背|胸|腹|肚子|脖子|颈|膝盖|脚踝|脚腕|手腕|肩膀|关节).*?(痛|疼)'
+    ]
+    for pattern in pain_patterns_cn:
+        pain_match = re.search(pattern, transcript)
+        if pain_match:
+            info["pain_location"] = pain_match.group(1)
+            break
+
+    if not info["pain_location"]:
+        pain_patterns_en = [
+            r'(head|chest|stomach|abdomen|back|neck|shoulder|arm|leg|knee|ankle|wrist|foot|hand)\s+(?:pain|hurt|ache)',
+            r'pain in (?:my|the)\s+([a-z]+)',
+        ]
+        for pattern in pain_patterns_en:
+            pain_match = re.search(pattern, transcript, re.IGNORECASE)
+            if pain_match:
+                info["pain_location"] = pain_match.group(1)
+                break
+
+    pain_level_patterns = [
+        r'疼痛等级.*?(\d+)',
+        r'pain level.*?(\d+)',
+    ]
+    for pattern in pain_level_patterns:
+        pain_level_match = re.search(pattern, transcript, re.IGNORECASE)
+        if pain_level_match:
+            info["pain_level"] = int(pain_level_match.group(1))
+            break
+
+    allergy_patterns = [
+        r'对(.+?)过敏',
+        r'allergic to\s+([a-z\s]+)',
+    ]
+    for pattern in allergy_patterns:
+        allergy_match = re.search(pattern, transcript, re.IGNORECASE)
+        if allergy_match:
+            info["allergies"] = allergy_match.group(1).strip()
+            break
+
+    symptom_keywords = [
+        r'(晕倒|昏倒|昏迷|fainted|collapsed|unconscious)',
+        r'(高血压|low blood pressure|high blood pressure|hypertension)',
+        r'(呼吸困难|difficulty breathing|shortness of breath)',
+        r'(出血|bleeding)',
+        r'(骨折|broken bone|fracture)',
+    ]
+    for pattern in symptom_keywords:
+        if re.search(pattern, transcript, re.IGNORECASE):
+            info["symptoms"].append(re.search(pattern, transcript, re.IGNORECASE).group(0))
+
+    return info
+
+
+def check_corpus(corpus):
+    failures = 0
+    for case in corpus:
+        for name, fn in (("compiled", extract_patient_info), ("legacy", legacy_extract_patient_info)):
+            got = fn(case["transcript"])
+            if got != case["expected"]:
+                failures += 1
+                print(f"MISMATCH ({name}) {case['transcript']!r}\n  expected {case['expected']}\n  got      {got}")
+    return failures
+
+
+def streaming_partials(corpus, n_words, rng):
+    """A long call transcript grown word by word, as streaming STT would deliver it"""
+    words = []
+    while len(words) < n_words:
+        words.extend(rng.choice(corpus)["transcript"].split())
+    return [" ".join(words[:i]) for i in range(1, n_words + 1)]
+
+
+def timed(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=400, help="length of the simulated streaming call")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    failures = check_corpus(corpus)
+    print(f"golden corpus: {len(corpus)} transcripts, {failures} mismatches")
+    if failures:
+        raise SystemExit(1)
+
+    transcripts = [case["transcript"] for case in corpus]
+    partials = streaming_partials(corpus, args.words, random.Random(0))
+    print(f"{'workload':<32} {'legacy ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for label, texts in (
+        (f"corpus x50 ({len(transcripts) * 50} calls)", transcripts * 50),
+        (f"{len(partials)} streaming partials", partials),
+    ):
+        legacy_s = timed(legacy_extract_patient_info, texts, args.repeat)
+        compiled_s = timed(extract_patient_info, texts, args.repeat)
+        print(f"{label:<32} {legacy_s * 1000:>10.1f} {compiled_s * 1000:>12.1f} {legacy_s / compiled_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
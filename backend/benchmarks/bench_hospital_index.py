@@ -0,0 +1,97 @@
+"""
+Nearest suitable hospitals vs facility count: a per-hospital Python loop (haversine, stock
+check, sort) against HospitalIndex.nearest, checking both return the same hospitals.
+
+    python -m benchmarks.bench_hospital_index [--sizes 100,1000,10000] [--queries 500] [--k 5]
+"""
+import argparse
+import math
+import random
+import time
+
+from hospital_index import EARTH_RADIUS_KM, SEVERITY_NEEDS, HospitalIndex, stock_score
+
+BLOOD_TYPES = ["O-", "O+", "A-", "A+", "B-", "B+", "AB+", "Fresh Frozen Plasma (FFP)", "Cryoprecipitate"]
+MEDICATIONS = [("Morphine", "Painkiller"), ("Tranexamic Acid", "Hemostatic"), ("Epinephrine", "Vasopressor"),
+               ("Ketamine", "Anesthetic"), ("Cefazolin", "Antibiotic"), ("Propofol", "Sedative")]
+SEVERITIES = ["Critical", "Moderate", "Stable"]
+
+
+def hospitals(n, rng):
+    """Facilities scattered over New York State"""
+    return [{
+        "id": f"hosp{i}",
+        "name": f"Hospital {i}",
+        "address": f"{i} Main St",
+        "coordinates": {"lat": rng.uniform(40.5, 45.0), "lon": rng.uniform(-79.7, -71.9)},
+        "blood_plasma": [{"type": t, "volume": 500, "stock": rng.randint(1, 30), "expiration": ""}
+                         for t in rng.sample(BLOOD_TYPES, rng.randint(1, 3))],
+        "medications": [{"name": name, "type": mtype, "dosage": "", "stock": rng.randint(1, 80)}
+                        for name, mtype in rng.sample(MEDICATIONS, rng.randint(1, 3))],
+    } for i in range(n)]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def loop_nearest(data, location, severity, k):
+    """Straightforward version: score every hospital in Python, then sort"""
+    needs = SEVERITY_NEEDS[severity]
+    candidates = []
+    for hosp in data:
+        blood = {p["type"] for p in hosp["blood_plasma"]}
+        meds = {m["type"] for m in hosp["medications"]}
+        meets = ((not needs["blood_types"] or blood & needs["blood_types"])
+                 and (not needs["medication_types"] or meds & needs["medication_types"]))
+        distance = haversine(location[0], location[1], hosp["coordinates"]["lat"], hosp["coordinates"]["lon"])
+        candidates.append((not meets, distance, hosp))
+    candidates.sort(key=lambda c: (c[0], c[1]))
+    chosen = candidates[:k]
+    chosen.sort(key=lambda c: (c[0], -stock_score(sum(p["stock"] for p in c[2]["blood_plasma"]),
+                                                   sum(m["stock"] for m in c[2]["medications"]), severity, c[1])))
+    return [c[2]["id"] for c in chosen]
+
+
+def percentile_us(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    print(f"{'hospitals':>9} {'build ms':>9} {'loop p50 us':>12} {'index p50 us':>13} {'index p99 us':>13}  same top-k")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        data = hospitals(n, rng)
+        start = time.perf_counter()
+        index = HospitalIndex(data, "bench")
+        build_ms = (time.perf_counter() - start) * 1000
+
+        queries = [((rng.uniform(40.6, 44.9), rng.uniform(-79.6, -72.0)), rng.choice(SEVERITIES))
+                   for _ in range(args.queries)]
+        loop_times, index_times, expected, got = [], [], [], []
+        for location, severity in queries:
+            start = time.perf_counter()
+            expected.append(loop_nearest(data, location, severity, args.k))
+            loop_times.append(time.perf_counter() - start)
+        for location, severity in queries:
+            start = time.perf_counter()
+            hits = index.nearest(location, severity, args.k)
+            index_times.append(time.perf_counter() - start)
+            got.append([h["id"] for h in hits])
+        same = sum(a == b for a, b in zip(expected, got))
+
+        print(f"{n:>9} {build_ms:>9.1f} {percentile_us(loop_times, .5):>12.0f} {percentile_us(index_times, .5):>13.0f}"
+              f" {percentile_us(index_times, .99):>13.0f}  {same}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+HTTPTransport against a local fake Deepgram server: connection reuse, retries on 503,
+deadlines on a hung upstream, and hedging against a slow tail.
+
+    python -m benchmarks.bench_http_transport [--requests 1000]
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from http_transport import HTTPTransport
+
+
+class FakeDeepgram(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    behavior = {"fail_every": 0, "slow_fraction": 0.0, "slow_s": 0.0, "hang_s": 0.0, "base_s": 0.005}
+    clients = set()
+    count = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        b = self.behavior
+        with self.lock:
+            FakeDeepgram.count += 1
+            n = FakeDeepgram.count
+            FakeDeepgram.clients.add(self.client_address)
+
+        if b["hang_s"]:
+            time.sleep(b["hang_s"])
+        if b["fail_every"] and n % b["fail_every"] != 0:
+            return self._reply(503, b'{"err": "overloaded"}')
+        delay = b["base_s"] + (b["slow_s"] if random.random() < b["slow_fraction"] else 0)
+        time.sleep(delay)
+        self._reply(200, b'{"results": {"channels": [{"alternatives": [{"transcript": "ok"}]}]}}')
+
+    def _reply(self, status, body):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (deadline test)
+
+    def log_message(self, *args):
+        pass
+
+
+def configure(**behavior):
+    FakeDeepgram.behavior = {"fail_every": 0, "slow_fraction": 0.0, "slow_s": 0.0, "hang_s": 0.0, "base_s": 0.005, **behavior}
+    FakeDeepgram.clients = set()
+    FakeDeepgram.count = 0
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run(fn, n):
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+    n = args.requests
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDeepgram)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/listen"
+    body = b"\0" * 4096
+
+    # 1. Connection reuse
+    configure()
+    legacy = run(lambda: requests.post(url, data=body), n)
+    legacy_conns = len(FakeDeepgram.clients)
+    configure()
+    transport = HTTPTransport(pool_size=4)
+    pooled = run(lambda: transport.post("stt", url, 5, data=body), n)
+    print(f"connection reuse ({n} sequential calls)")
+    print(f"  requests.post:  {legacy_conns:4d} connections, p50 {percentile(legacy, .5) * 1000:.1f} ms")
+    print(f"  HTTPTransport:  {len(FakeDeepgram.clients):4d} connections, p50 {percentile(pooled, .5) * 1000:.1f} ms")
+
+    # 2. Retries: two of every three upstream calls fail with 503
+    configure(fail_every=3)
+    transport = HTTPTransport(retries=2, backoff=0.01)
+    ok = sum(transport.post("stt", url, 5, data=body).status_code == 200 for _ in range(n // 4))
+    print(f"retries: {ok}/{n // 4} succeeded with 2/3 of upstream calls failing; {transport.stats()['stages']['stt']}")
+
+    # 3. Deadline: upstream hangs for 3 s, stage deadline 0.5 s
+    configure(hang_s=3)
+    transport = HTTPTransport(retries=2)
+    start = time.perf_counter()
+    try:
+        transport.post("stt", url, 0.5, data=body)
+        print("deadline: NOT enforced")
+    except requests.exceptions.Timeout as e:
+        print(f"deadline: gave up after {time.perf_counter() - start:.2f} s ({type(e).__name__})")
+
+    # 4. Hedging: 2% of calls take an extra 300 ms, a tail beyond the p95 the hedge waits for
+    for hedge in (False, True):
+        configure(slow_fraction=0.02, slow_s=0.3, base_s=0.01)
+        transport = HTTPTransport(hedge=hedge, hedge_min_samples=20)
+        random.seed(1)
+        latencies = run(lambda: transport.post("stt", url, 5, data=body), n)[20:]  # after the p95 warm-up
+        stage = transport.stats()["stages"]["stt"]
+        print(f"hedge={str(hedge):<5} p50 {percentile(latencies, .5) * 1000:6.1f} ms  p99 {percentile(latencies, .99) * 1000:6.1f} ms"
+              f"  >100 ms: {sum(l > 0.1 for l in latencies):3d}  hedges {stage['hedges']}, hedge wins {stage['hedge_wins']}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
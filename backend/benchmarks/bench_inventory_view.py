@@ -0,0 +1,76 @@
+"""
+Hospital inventory per request: a full re-read of the three databases against
+InventoryView lookups, plus what one stock update costs the view (poll + delta) and
+how many bytes operators receive for it, compared with resending the whole list.
+The view is checked against a full read after every update.
+
+    python -m benchmarks.bench_inventory_view [--sizes 5 500 5000] [--updates 50]
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.bench_resource_store import canonical, seed
+from inventory_view import InventoryView
+from resource_store import ResourceStore
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 500, 5000])
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'hospitals':>10} {'full read ms':>13} {'view read us':>13} {'idle poll us':>13}"
+          f" {'update poll ms':>15} {'full bytes':>11} {'delta bytes':>12}")
+    for n in args.sizes:
+        rng = random.Random(args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = seed(tmp, n, rng)
+            store = ResourceStore(paths["hospitals"], paths["blood_plasma"], paths["medications"])
+            deltas = []
+            view = InventoryView(store, poll_interval=0, on_delta=deltas.append)
+
+            full_s, full_data = timed(store.hospitals_with_resources, args.repeat)
+            view.snapshot()
+            view_s, _ = timed(view.snapshot, args.repeat * 100)
+            idle_s, _ = timed(view.poll, args.repeat * 100)
+
+            writer = sqlite3.connect(paths["blood_plasma"])
+            plasma_ids = [row[0] for row in writer.execute("SELECT id FROM blood_plasma")]
+            poll_times = []
+            for _ in range(args.updates):
+                with writer:
+                    writer.execute("UPDATE blood_plasma SET stock_quantity = ? WHERE id = ?",
+                                   (rng.randint(0, 30), rng.choice(plasma_ids)))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    view.poll()
+                    poll_times.append(time.perf_counter() - start)
+            writer.close()
+            assert canonical(view.hospitals()) == canonical(store.hospitals_with_resources()), "view out of date"
+            assert view.full_reloads == 0, "changelog fell back to a full reload"
+            store.close()
+
+        full_bytes = len(json.dumps(full_data))
+        delta_bytes = sum(len(json.dumps(d)) for d in deltas) / max(len(deltas), 1)
+        print(f"{n:>10} {full_s * 1000:>13.2f} {view_s * 1e6:>13.2f} {idle_s * 1e6:>13.1f}"
+              f" {sum(poll_times) / len(poll_times) * 1000:>15.3f} {full_bytes:>11} {delta_bytes:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+search_medical_knowledge: the original per-call keyword loop vs the prebuilt KnowledgeIndex.
+
+Checks both agree on the real knowledge base (extraction corpus transcripts), then times
+them on a synthetic knowledge base.
+
+    python -m benchmarks.bench_knowledge_index [--entries 10000] [--queries 2000]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from extraction import extract_patient_info
+from knowledge_index import KnowledgeIndex, load_keyword_map
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CJK = "头胸腹背腿手脚颈痛疼晕倒昏迷出血骨折过敏发烧呼吸困难心脏高血压糖尿病烧伤割伤"
+
+
+def legacy_search(search_text, symptom_mapping, medical_kb):
+    """The original search_medical_knowledge body, with the mapping and KB passed in"""
+    results = []
+    search_text = search_text.lower()
+    matched_symptoms = set()
+    for keyword, symptom_en in symptom_mapping.items():
+        if keyword.lower() in search_text:
+            matched_symptoms.add(symptom_en)
+    for symptom in matched_symptoms:
+        for entry in medical_kb:
+            if symptom.lower() == entry["symptom"].lower():
+                if entry not in results:
+                    results.append(entry)
+    return results
+
+
+def search_text_for(patient_info):
+    search_text = ""
+    if patient_info.get("pain_location"):
+        search_text += " " + patient_info["pain_location"]
+    if patient_info.get("injury"):
+        search_text += " " + patient_info["injury"]
+    if patient_info.get("symptoms"):
+        search_text += " " + " ".join(patient_info["symptoms"])
+    return search_text
+
+
+def check_real_kb():
+    with open(os.path.join(BACKEND_DIR, "medical_knowledge_base_v2.json"), encoding="utf-8") as f:
+        medical_kb = json.load(f)
+    with open(os.path.join(BACKEND_DIR, "benchmarks", "extraction_corpus.json"), encoding="utf-8") as f:
+        corpus = json.load(f)
+    keyword_map = load_keyword_map(os.path.join(BACKEND_DIR, "symptom_keywords.json"))
+    index = KnowledgeIndex(medical_kb, keyword_map)
+
+    mismatches = 0
+    for case in corpus:
+        text = search_text_for(extract_patient_info(case["transcript"]))
+        legacy = {e["symptom"] for e in legacy_search(text, keyword_map, medical_kb)}
+        indexed = {e["symptom"] for e in index.search(text)}
+        # The index also matches KB symptom names directly; everything the old mapping found must still be found
+        if not legacy <= indexed:
+            mismatches += 1
+            print(f"MISSING for {case['transcript']!r}: {legacy - indexed}")
+    return len(corpus), mismatches
+
+
+def synthetic_kb(n_entries, rng):
+    def word():
+        return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9)))
+
+    def cjk_word():
+        return "".join(rng.choice(CJK) for _ in range(rng.randint(3, 4)))
+
+    medical_kb, mapping = [], {}
+    for i in range(n_entries):
+        symptom = f"{word()} {word()} {i}"
+        medical_kb.append({"symptom": symptom, "severity": "Moderate", "conditions": [word()], "treatment": word()})
+        mapping[symptom] = symptom
+        mapping[f"{word()}{i}"] = symptom
+        mapping[f"{cjk_word()}{i}"] = symptom
+    return medical_kb, mapping
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for text in queries:
+        fn(text)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    checked, mismatches = check_real_kb()
+    print(f"real KB: {checked} corpus transcripts, {mismatches} mismatches")
+    if mismatches:
+        raise SystemExit(1)
+
+    rng = random.Random(0)
+    medical_kb, mapping = synthetic_kb(args.entries, rng)
+    keywords = list(mapping)
+
+    start = time.perf_counter()
+    index = KnowledgeIndex(medical_kb, mapping)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = [" ".join(rng.choice(keywords) for _ in range(rng.randint(1, 3))) + " pain" for _ in range(args.queries)]
+    for text in queries[:50]:
+        legacy = {e["symptom"] for e in legacy_search(text, mapping, medical_kb)}
+        assert legacy == {e["symptom"] for e in index.search(text)}, text
+
+    legacy_queries = queries[:max(1, args.queries // 20)]  # the old path is slow; sample it
+    legacy_us = timed(lambda text: legacy_search(text, mapping, medical_kb), legacy_queries)
+    index_us = timed(index.search, queries)
+
+    print(f"synthetic KB: {args.entries} entries, {len(mapping)} keywords (index built in {build_ms:.0f} ms)")
+    print(f"  legacy keyword loop: {legacy_us:10.1f} us/query")
+    print(f"  KnowledgeIndex:      {index_us:10.1f} us/query ({legacy_us / index_us:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
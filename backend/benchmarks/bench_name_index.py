@@ -0,0 +1,219 @@
+"""
+Fuzzy patient-name index on a synthetic registry (Zipf-distributed English first and last
+names, a share of Chinese names): how often a transcribed variant of a patient's name finds
+that patient, query latency per kind of variant, against an indexed exact SQL match and a
+LIKE scan, plus build time, memory and the cost of picking up changed rows.
+
+    python -m benchmarks.bench_name_index [--patients 1000000] [--queries 2000]
+
+A query counts as found when a patient with the target's name and age is ranked first
+(top 1) or among the first five (top 5); common names recur, so several patients can qualify.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from name_index import PatientNameIndex
+from patient_store import PatientStore
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST = ["John", "Emily", "David", "Sarah", "Michael", "Agnes", "Jose", "Kayle", "Anna", "Mary",
+         "James", "Robert", "Linda", "Jennifer", "William", "Elizabeth", "Thomas", "Susan", "Daniel",
+         "Karen", "Richard", "Lisa", "Charles", "Maria", "George", "Peter", "Catherine", "Paul",
+         "Stephen", "Rachel", "Brian", "Megan", "Kevin", "Laura", "Jason", "Nicole", "Eric", "Olivia"]
+LAST = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+        "Martinez", "Wilson", "Anderson", "Taylor", "Thomas", "Moore", "Jackson", "Martin", "Thompson",
+        "White", "Harris", "Clark", "Lewis", "Robinson", "Walker", "Young", "Allen", "Wright", "Scott"]
+SYLLABLES = ["ka", "ver", "son", "mar", "tel", "lin", "dor", "ber", "gan", "ros", "wick", "ham",
+             "ley", "ford", "ton", "ric", "hal", "sto", "nel", "bro"]
+CN_SURNAMES = ["李", "王", "张", "刘", "陈", "杨", "黄", "赵", "吴", "周", "徐", "孙", "马", "朱", "胡", "郭"]
+CN_GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华"
+# 英文名的中文音译, for the transliterated queries
+CN_FIRST = {"John": "约翰", "Emily": "艾米丽", "David": "大卫", "Sarah": "莎拉", "Michael": "迈克尔",
+            "Jose": "何塞", "Mary": "玛丽", "James": "詹姆斯", "Robert": "罗伯特", "Linda": "琳达"}
+CN_LAST = {"Smith": "史密斯", "Johnson": "约翰逊", "Brown": "布朗", "Garcia": "加西亚", "Miller": "米勒",
+           "Davis": "戴维斯", "Wilson": "威尔逊", "Anderson": "安德森", "Taylor": "泰勒", "Jones": "琼斯"}
+SOUNDALIKES = {"John": "Jon", "Smith": "Smyth", "Catherine": "Kathryn", "Michael": "Micheal", "Sarah": "Sara",
+               "Stephen": "Steven", "Brian": "Bryan", "Megan": "Meghan", "Thompson": "Thomson",
+               "Jackson": "Jaxon", "Allen": "Alan", "Kayle": "Kyle", "Nicole": "Nichole", "Scott": "Skot"}
+
+
+def zipf_weights(n, s=1.0):
+    return [1 / (rank + 1) ** s for rank in range(n)]
+
+
+def synthetic_names(rng, n):
+    rare_last = sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+                        for _ in range(40000)})
+    last_names = LAST + rare_last
+    firsts = rng.choices(FIRST, zipf_weights(len(FIRST), 0.7), k=n)
+    lasts = rng.choices(last_names, zipf_weights(len(last_names), 0.9), k=n)
+    names = []
+    for first, last in zip(firsts, lasts):
+        if rng.random() < 0.15:
+            names.append(rng.choice(CN_SURNAMES) + "".join(rng.choice(CN_GIVEN) for _ in range(rng.randint(1, 2))))
+        else:
+            names.append(f"{first} {last}")
+    return names
+
+
+def seed(path, n, rng):
+    with open(os.path.join(BACKEND_DIR, "init_patients.sql"), encoding="utf-8") as f:
+        schema = f.read().split("-- Insert")[0]
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    people = [(f"p{i}", name, rng.randint(1, 99) if rng.random() > 0.05 else None)
+              for i, name in enumerate(synthetic_names(rng, n))]
+    conn.executemany("INSERT INTO patients (id, name, age, medical_history, allergies) VALUES (?, ?, ?, 'history', 'none')",
+                     people)
+    conn.commit()
+    conn.close()
+    return people
+
+
+def typo(rng, word):
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(("swap", "drop", "replace"))
+    if kind == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice("aeiourstnl") + word[i + 1:]
+
+
+def variant(rng, kind, name):
+    """What STT might make of `name`; None when the kind does not apply to it"""
+    parts = name.split()
+    if kind == "exact":
+        return name
+    if len(parts) != 2:
+        return None
+    first, last = parts
+    if kind == "typo":
+        return f"{first} {typo(rng, last)}" if rng.random() < 0.5 else f"{typo(rng, first)} {last}"
+    if kind == "soundalike":
+        if first not in SOUNDALIKES and last not in SOUNDALIKES:
+            return None
+        return f"{SOUNDALIKES.get(first, first)} {SOUNDALIKES.get(last, last)}"
+    if kind == "partial":
+        return last
+    if kind == "chinese":
+        if first not in CN_FIRST or last not in CN_LAST:
+            return None
+        return CN_FIRST[first] + "·" + CN_LAST[last]
+    return None
+
+
+def build_queries(rng, people, per_kind):
+    queries = {kind: [] for kind in ("exact", "typo", "soundalike", "partial", "chinese")}
+    attempts = 0
+    while any(len(q) < per_kind for q in queries.values()) and attempts < per_kind * 500:
+        attempts += 1
+        patient = rng.choice(people)
+        for kind, q in queries.items():
+            if len(q) < per_kind:
+                text = variant(rng, kind, patient[1])
+                if text:
+                    q.append((text, patient))
+    return queries
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=2000, help="per kind of name variant")
+    parser.add_argument("--updates", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "patients.db")
+        start = time.perf_counter()
+        people = seed(path, args.patients, rng)
+        print(f"seeded {args.patients} patients in {time.perf_counter() - start:.1f}s")
+        store = PatientStore(path)
+        index = PatientNameIndex(store, os.path.join(BACKEND_DIR, "name_aliases.json"), poll_interval=0)
+
+        before = rss_mb()
+        start = time.perf_counter()
+        index.poll()
+        build_s = time.perf_counter() - start
+        stats = index.stats()
+        print(f"index build: {build_s:.2f}s, {stats['tokens']} distinct tokens, +{rss_mb() - before:.0f} MB RSS")
+
+        queries = build_queries(rng, people, args.queries)
+        print(f"\n{'variant':>11} {'queries':>8} {'top 1':>7} {'top 5':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+        all_us = []
+        for kind, items in queries.items():
+            top1 = top5 = 0
+            timings = []
+            for text, (_, name, age) in items:
+                t0 = time.perf_counter()
+                results = index.search(text, age, limit=5)
+                timings.append((time.perf_counter() - t0) * 1e6)
+                hits = [r["name"] == name and r["age"] == age for r in results]
+                top1 += bool(hits[:1] and hits[0])
+                top5 += any(hits)
+            all_us += timings
+            print(f"{kind:>11} {len(items):>8} {top1 / max(len(items), 1):>7.1%} {top5 / max(len(items), 1):>7.1%} "
+                  f"{percentile(timings, 50):>8.0f} {percentile(timings, 99):>8.0f} {max(timings):>8.0f}")
+        print(f"{'all':>11} {len(all_us):>8} {'':>7} {'':>7} {percentile(all_us, 50):>8.0f} "
+              f"{percentile(all_us, 99):>8.0f} {max(all_us):>8.0f}  (mean {statistics.mean(all_us):.0f} us)")
+
+        # 对照: indexed exact match (misses every variant) and a LIKE scan on the last token
+        conn = store.pool.dedicated()
+        sample = [text for items in queries.values() for text, _ in items[:50]]
+        t0 = time.perf_counter()
+        for text in sample:
+            conn.execute("SELECT id FROM patients WHERE name = ?", (text,)).fetchall()
+        exact_us = (time.perf_counter() - t0) / len(sample) * 1e6
+        like_sample = sample[:20]
+        t0 = time.perf_counter()
+        for text in like_sample:
+            conn.execute("SELECT id FROM patients WHERE name LIKE ?", (f"%{text.split()[-1]}%",)).fetchall()
+        like_us = (time.perf_counter() - t0) / len(like_sample) * 1e6
+        print(f"\nSQL exact name = ?: {exact_us:8.0f} us/query (finds exact names only)")
+        print(f"SQL LIKE '%last%':  {like_us:8.0f} us/query (full table scan)")
+
+        writer = sqlite3.connect(path)
+        changed = rng.sample(people, args.updates)
+        writer.executemany("UPDATE patients SET name = ? WHERE id = ?", [(f"Renamed Person{i}", p[0]) for i, p in enumerate(changed)])
+        writer.execute("DELETE FROM patients WHERE id = ?", (people[0][0],))
+        writer.commit()
+        writer.close()
+        t0 = time.perf_counter()
+        applied = index.poll()
+        poll_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        index.poll()
+        idle_us = (time.perf_counter() - t0) * 1e6
+        found = index.search("Renamed Person7", limit=1)
+        gone = [r for r in index.search(people[0][1], people[0][2], limit=50) if r["id"] == people[0][0]]
+        print(f"\n{args.updates} renamed + 1 deleted: poll applied {applied} changes in {poll_ms:.1f} ms "
+              f"(idle poll {idle_us:.0f} us); renamed found: {bool(found) and found[0]['name'] == 'Renamed Person7'}, "
+              f"deleted gone: {not gone}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Operator broadcast cost vs operator count: the old per-sid emit loop against one room emit,
+and the six per-request events against one coalesced case_update.
+
+Runs a real python-socketio Server with N connected operator sessions; only the final
+socket write is stubbed out (it counts bytes), so packet building and JSON encoding are
+measured as they happen in production.
+
+    python -m benchmarks.bench_operator_fanout [--operators 1,10,50,200] [--requests 200]
+"""
+import argparse
+import time
+
+import socketio
+
+from operator_fanout import OPERATORS_ROOM, OperatorFanout
+
+PATIENT = {"name": "Jose", "age": 36, "injury": "fell", "pain_location": "ankle", "pain_level": 7,
+           "allergies": "penicillin", "symptoms": ["fracture"]}
+KB = [{"symptom": "sprained ankle", "severity": "Stable", "conditions": ["sprain", "ligament tear"],
+       "treatment": "RICE (Rest, Ice, Compression, Elevation), brace"}]
+RESPONSE = "Keep him still and elevate the ankle. Apply ice wrapped in cloth. Urgency: Moderate. " * 4
+
+
+def request_events(req_id):
+    """The six operator broadcasts of one user call"""
+    return [
+        ("transcription", {"text": "My name is Jose, I fell and my ankle hurts, pain level 7", "req_id": req_id}),
+        ("database_patient_found", {**PATIENT, "medical_history": "Ankle sprain 2023" * 10, "req_id": req_id}),
+        ("patient_info", {**PATIENT, "req_id": req_id}),
+        ("knowledge_base_results", {"results": KB, "kb_version": "2124b7972b4c", "req_id": req_id}),
+        ("response", {"text": RESPONSE, "req_id": req_id}),
+        ("audio_url", {"url": "static/audio/4eb836f53c59cff079880a158af3584b.mp3", "req_id": req_id}),
+    ]
+
+
+class Wire:
+    """Stands in for the engine.io sockets: counts what would be written"""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+
+    def send(self, eio_sid, pkt):
+        self.packets += 1
+        self.bytes += len(pkt.encode())
+
+
+def operator_server(n_operators):
+    server = socketio.Server(async_mode="threading")
+    wire = Wire()
+    server._send_eio_packet = wire.send
+    sids = []
+    for i in range(n_operators):
+        sid = server.manager.connect(f"eio-{i}", "/")
+        server.manager.enter_room(sid, "/", OPERATORS_ROOM)
+        sids.append(sid)
+    return server, wire, sids
+
+
+class SocketIOShim:
+    """Minimal stand-in for the Flask-SocketIO wrapper OperatorFanout expects"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def emit(self, event, data, to=None, skip_sid=None):
+        self.server.emit(event, data, to=to, skip_sid=skip_sid)
+
+    def start_background_task(self, fn, *args):
+        pass  # flushed explicitly below
+
+    def sleep(self, seconds):
+        pass
+
+
+def per_sid_loop(server, sids, events):
+    for event, data in events:
+        for sid in sids:
+            server.emit(event, data, to=sid)
+
+
+def room_emit(fanout, events):
+    for event, data in events:
+        fanout.publish(event, data)
+
+
+def coalesced(fanout, events):
+    for event, data in events:
+        fanout.publish(event, data)
+    fanout.flush(events[0][1]["req_id"])
+
+
+def timed(fn, n_requests):
+    start = time.perf_counter()
+    for i in range(n_requests):
+        fn(request_events(f"req-{i}"))
+    return (time.perf_counter() - start) / n_requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operators", default="1,10,50,200")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'operators':>9} {'per-sid loop':>14} {'room emit':>12} {'case_update':>12}   (us per request, 6 events)")
+    for n in [int(x) for x in args.operators.split(",")]:
+        server, wire, sids = operator_server(n)
+        loop_us = timed(lambda events: per_sid_loop(server, sids, events), args.requests)
+        loop_packets = wire.packets
+
+        server, wire, sids = operator_server(n)
+        room_us = timed(lambda events: room_emit(OperatorFanout(SocketIOShim(server)), events), args.requests)
+        room_packets = wire.packets
+
+        server, wire, sids = operator_server(n)
+        coalesced_us = timed(lambda events: coalesced(OperatorFanout(SocketIOShim(server), coalesce_window=0.05), events),
+                             args.requests)
+        case_packets = wire.packets
+
+        assert loop_packets == room_packets, "room emit must reach every operator"
+        print(f"{n:>9} {loop_us:>14.0f} {room_us:>12.0f} {coalesced_us:>12.0f}"
+              f"   ({loop_packets // args.requests} / {room_packets // args.requests} / {case_packets // args.requests} packets)")
+
+
+if __name__ == "__main__":
+    main()
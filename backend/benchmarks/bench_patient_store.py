@@ -0,0 +1,91 @@
+"""
+Patient lookup latency: connect-per-call (the old search_patient_database) vs PatientStore.
+
+    python -m benchmarks.bench_patient_store [--patients 10000] [--lookups 20000] [--threads 8]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from patient_store import PatientStore
+
+FIRST = ["John", "Emily", "David", "Sarah", "Mike", "Agnes", "Jose", "Kayle", "Anna", "Wei"]
+LAST = ["Smith", "Lee", "Johnson", "Doe", "Brown", "Wang", "Garcia", "Chen", "Miller", "Davis"]
+
+
+def seed(path, n, rng):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(backend_dir, "init_patients.sql"), encoding="utf-8") as f:
+        schema = f.read().split("-- Insert")[0]
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    rows = [
+        (f"uuid{i}", f"{rng.choice(FIRST)} {rng.choice(LAST)} {i}", rng.randint(1, 99), "history", "allergies")
+        for i in range(n)
+    ]
+    conn.executemany("INSERT INTO patients VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return [(r[1], r[2]) for r in rows]
+
+
+def legacy_find(path, name, age=None):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    if age:
+        cursor.execute("SELECT name, age, medical_history, allergies FROM patients WHERE name = ? AND age = ?", (name, age))
+    else:
+        cursor.execute("SELECT name, age, medical_history, allergies FROM patients WHERE name = ?", (name,))
+    result = cursor.fetchone()
+    conn.close()
+    return result
+
+
+def run(find, queries, n_threads):
+    """Split the queries over n_threads and return mean microseconds per lookup"""
+    chunks = [queries[i::n_threads] for i in range(n_threads)]
+
+    def worker(chunk):
+        for name, age in chunk:
+            find(name, age)
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "patients.db")
+        people = seed(path, args.patients, rng)
+        queries = [rng.choice(people) for _ in range(args.lookups)]
+
+        store = PatientStore(path)
+        store.find(*queries[0])
+
+        legacy_us = run(lambda name, age: legacy_find(path, name, age), queries, args.threads)
+        store_us = run(store.find, queries, args.threads)
+        store.close()
+
+    print(f"{args.lookups} lookups over {args.patients} patients, {args.threads} threads")
+    print(f"  connect per call: {legacy_us:8.1f} us/lookup")
+    print(f"  PatientStore:     {store_us:8.1f} us/lookup ({legacy_us / store_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Operator prompt assembly vs hospital count: the old string += build of every hospital
+against PromptBuilder cold (new inventory version) and warm (cached hospital blocks),
+with the prompt size each one hands to the LLM.
+
+    python -m benchmarks.bench_prompt_builder [--sizes 5,50,500,5000] [--repeat 50] [--budget 2000]
+"""
+import argparse
+import random
+import time
+
+from prompt_builder import PromptBuilder, estimate_tokens
+
+BLOOD_TYPES = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
+MEDICATIONS = [("Morphine", "Painkiller"), ("Tranexamic Acid", "Hemostatic"), ("Epinephrine", "Vasopressor"),
+               ("Ketamine", "Anesthetic"), ("Cefazolin", "Antibiotic")]
+ENHANCED_PROMPT = """Patient Information: My name is Jose. I am 36 years old. I fell and my ankle pain is 7.
+
+Name: Jose
+Age: 36 years old
+Injury/Condition: fell
+Pain Location: ankle
+Pain Level: 7/10
+
+Medical Knowledge Base Match Results:
+- Symptom: sprained ankle
+  Severity: Stable
+  Possible Conditions: sprain, ligament tear
+  Recommended Treatment: RICE (Rest, Ice, Compression, Elevation), brace
+
+Please provide professional medical advice based on the above information."""
+
+
+def hospitals(n, rng):
+    return [{
+        "id": f"hosp{i}",
+        "name": f"Hospital {i}",
+        "address": f"{i} Main St, New York, NY",
+        "coordinates": {"lat": 40.7 + rng.random() / 10, "lon": -74.0 + rng.random() / 10},
+        "blood_plasma": [{"type": rng.choice(BLOOD_TYPES), "volume": 500, "stock": rng.randint(1, 30), "expiration": ""}
+                         for _ in range(rng.randint(2, 4))],
+        "medications": [{"name": name, "type": mtype, "dosage": "", "stock": rng.randint(1, 80)}
+                        for name, mtype in rng.sample(MEDICATIONS, rng.randint(2, 4))],
+    } for i in range(n)]
+
+
+def legacy_operator_prompt(enhanced_prompt, hospital_data):
+    """The original build_operator_prompt"""
+    operator_prompt = enhanced_prompt + "\n\nAvailable Hospital Resources:\n"
+    for hosp in hospital_data:
+        operator_prompt += f"\n{hosp['name']} ({hosp['address']}):\n"
+        operator_prompt += f"  Blood Plasma: {len(hosp['blood_plasma'])} types available\n"
+        for plasma in hosp['blood_plasma'][:3]:  # Show first 3
+            operator_prompt += f"    - {plasma['type']}: {plasma['stock']} units\n"
+        operator_prompt += f"  Medications: {len(hosp['medications'])} available\n"
+        for med in hosp['medications'][:3]:  # Show first 3
+            operator_prompt += f"    - {med['name']} ({med['type']}): {med['stock']} units\n"
+
+    operator_prompt += "\nBased on the patient's condition, medical history, and available resources, recommend the best hospital and any resource preparations needed."
+    return operator_prompt
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        result = fn(i)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="5,50,500,5000")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    print(f"{'hospitals':>9} {'legacy ms':>10} {'tokens':>8} {'cold ms':>9} {'warm ms':>9} {'tokens':>8} {'kept':>6}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        data = hospitals(n, rng)
+        legacy_ms, legacy_prompt = timed(lambda i: legacy_operator_prompt(ENHANCED_PROMPT, data), args.repeat)
+
+        builder = PromptBuilder(token_budget=args.budget)
+        cold_ms, _ = timed(lambda i: builder.operator_prompt(ENHANCED_PROMPT, data, f"v{i}", "Critical"), args.repeat)
+        warm_ms, (prompt, details) = timed(lambda i: builder.operator_prompt(ENHANCED_PROMPT, data, "v", "Critical"),
+                                           args.repeat)
+        assert details["cache_hit"]
+        print(f"{n:>9} {legacy_ms:>10.3f} {estimate_tokens(legacy_prompt):>8} {cold_ms:>9.3f} {warm_ms:>9.3f}"
+              f" {estimate_tokens(prompt):>8} {details['hospitals']:>6}")
+
+
+if __name__ == "__main__":
+    main()
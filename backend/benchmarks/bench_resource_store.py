@@ -0,0 +1,131 @@
+"""
+Compare the old per-hospital connection path with ResourceStore.
+
+    python -m benchmarks.bench_resource_store [--sizes 5 500 5000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from resource_store import ResourceStore
+
+BLOOD_TYPES = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+", "Fresh Frozen Plasma (FFP)"]
+MEDICATIONS = [
+    ("Morphine", "Painkiller", "5-10mg IV"),
+    ("Tranexamic Acid", "Hemostatic", "1g IV over 10 min"),
+    ("Epinephrine", "Vasopressor", "1mg IV"),
+    ("Ketamine", "Anesthetic", "1-2mg/kg IV"),
+    ("Lidocaine", "Local Anesthetic", "1-2mg/kg IV"),
+]
+
+
+def seed(directory, n_hospitals, rng):
+    """Create hospitals/blood_plasma/medications databases using the repo's init scripts"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = {}
+    for name in ("hospitals", "blood_plasma", "medications"):
+        path = os.path.join(directory, f"{name}.db")
+        with open(os.path.join(backend_dir, f"init_{name}.sql"), encoding="utf-8") as f:
+            schema = f.read().split("-- Insert")[0]
+        conn = sqlite3.connect(path)
+        conn.executescript(schema)
+        conn.close()
+        paths[name] = path
+
+    hospitals, plasma, meds = [], [], []
+    for i in range(n_hospitals):
+        hosp_id = f"hosp{i}"
+        hospitals.append((hosp_id, f"Hospital {i}", f"{i} Main St", 40.7 + rng.random() / 10, -74.0 + rng.random() / 10))
+        for j in range(rng.randint(2, 4)):
+            plasma.append((f"plasma{i}_{j}", hosp_id, rng.choice(BLOOD_TYPES), 500, "", rng.randint(0, 30), "2026-01-01"))
+        for j in range(rng.randint(2, 4)):
+            name, mtype, dosage = rng.choice(MEDICATIONS)
+            meds.append((f"med{i}_{j}", hosp_id, name, mtype, dosage, "", rng.randint(0, 80), "2026-06-30"))
+
+    with sqlite3.connect(paths["hospitals"]) as conn:
+        conn.executemany("INSERT INTO hospitals VALUES (?, ?, ?, ?, ?)", hospitals)
+    with sqlite3.connect(paths["blood_plasma"]) as conn:
+        conn.executemany("INSERT INTO blood_plasma VALUES (?, ?, ?, ?, ?, ?, ?)", plasma)
+    with sqlite3.connect(paths["medications"]) as conn:
+        conn.executemany("INSERT INTO medications VALUES (?, ?, ?, ?, ?, ?, ?, ?)", meds)
+    return paths
+
+
+def legacy_query(paths):
+    """The original query_hospitals_with_resources: one connection per table per hospital"""
+    hosp_conn = sqlite3.connect(paths["hospitals"])
+    hospitals = hosp_conn.execute("SELECT id, name, address, latitude, longitude FROM hospitals").fetchall()
+    hosp_conn.close()
+
+    hospital_data = []
+    for hosp_id, name, address, lat, lon in hospitals:
+        blood_conn = sqlite3.connect(paths["blood_plasma"])
+        blood_data = blood_conn.execute(
+            "SELECT blood_type, volume, stock_quantity, expiration_date FROM blood_plasma WHERE hospital_id = ? AND stock_quantity > 0",
+            (hosp_id,)
+        ).fetchall()
+        blood_conn.close()
+
+        med_conn = sqlite3.connect(paths["medications"])
+        med_data = med_conn.execute(
+            "SELECT name, type, dosage, stock_quantity FROM medications WHERE hospital_id = ? AND stock_quantity > 0",
+            (hosp_id,)
+        ).fetchall()
+        med_conn.close()
+
+        hospital_data.append({
+            "id": hosp_id,
+            "name": name,
+            "address": address,
+            "coordinates": {"lat": lat, "lon": lon},
+            "blood_plasma": [{"type": b[0], "volume": b[1], "stock": b[2], "expiration": b[3]} for b in blood_data],
+            "medications": [{"name": m[0], "type": m[1], "dosage": m[2], "stock": m[3]} for m in med_data]
+        })
+    return hospital_data
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def canonical(hospital_data):
+    """Order-insensitive view of the resource lists, for the equivalence check"""
+    return [
+        (h["id"], sorted(map(repr, h["blood_plasma"])), sorted(map(repr, h["medications"])))
+        for h in hospital_data
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'hospitals':>10} {'legacy ms':>12} {'store ms':>12} {'speedup':>9}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = seed(tmp, n, random.Random(args.seed))
+            store = ResourceStore(paths["hospitals"], paths["blood_plasma"], paths["medications"])
+            store.hospitals_with_resources()  # open the pooled connection and build indexes
+
+            legacy_s, legacy_data = timed(lambda: legacy_query(paths), args.repeat)
+            store_s, store_data = timed(store.hospitals_with_resources, args.repeat)
+            assert canonical(legacy_data) == canonical(store_data), "result mismatch"
+            store.close()
+
+        print(f"{n:>10} {legacy_s * 1000:>12.2f} {store_s * 1000:>12.2f} {legacy_s / store_s:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
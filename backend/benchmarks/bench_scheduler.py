@@ -0,0 +1,146 @@
+"""
+Overload behaviour of the call scheduler: a burst of calls against upstreams that can only
+serve a few requests at once, first with every call started on its own thread (the old
+handler behaviour: first come, first served at the upstream), then through Scheduler.
+
+Stage work is simulated with sleeps behind a per-stage semaphore standing in for the
+upstream's capacity. 10% of the bystander calls turn out Critical after STT, and one
+client floods tts_text requests alongside.
+
+    python -m benchmarks.bench_scheduler [--calls 300] [--rate 120]
+"""
+import argparse
+import random
+import threading
+import time
+
+from scheduler import BACKGROUND, CRITICAL, NORMAL, OPERATOR, Overloaded, Scheduler, StagePool
+
+STAGE_SECONDS = {"stt": 0.04, "llm": 0.08, "tts": 0.03}
+UPSTREAM_SLOTS = 4
+
+
+class Upstream:
+    def __init__(self):
+        self.slots = {stage: threading.Semaphore(UPSTREAM_SLOTS) for stage in STAGE_SECONDS}
+
+    def call(self, stage):
+        with self.slots[stage]:
+            time.sleep(STAGE_SECONDS[stage])
+
+
+def workload(n_calls, seed=7):
+    """(kind, sid) per arrival: operator / bystander / critical bystander, plus one tts_text flooder"""
+    rng = random.Random(seed)
+    calls = []
+    for i in range(n_calls):
+        roll = rng.random()
+        if roll < 0.2:
+            calls.append(("operator", f"operator-{i % 5}"))
+        elif roll < 0.3:
+            calls.append(("tts_text", "chatty"))
+        elif roll < 0.38:
+            calls.append(("critical", f"user-{i}"))
+        else:
+            calls.append(("normal", f"user-{i}"))
+    return calls
+
+
+def run_unbounded(calls, rate, upstream):
+    latencies = {kind: [] for kind in ("critical", "operator", "normal", "tts_text")}
+    lock = threading.Lock()
+
+    def pipeline(kind, started):
+        for stage in (["tts"] if kind == "tts_text" else ["stt", "llm", "tts"]):
+            upstream.call(stage)
+        with lock:
+            latencies[kind].append(time.perf_counter() - started)
+
+    threads = []
+    for kind, sid in calls:
+        thread = threading.Thread(target=pipeline, args=(kind, time.perf_counter()))
+        thread.start()
+        threads.append(thread)
+        time.sleep(1 / rate)
+    for thread in threads:
+        thread.join()
+    return latencies, {}
+
+
+def run_scheduled(calls, rate, upstream, max_calls):
+    scheduler = Scheduler([StagePool(stage, UPSTREAM_SLOTS) for stage in STAGE_SECONDS], max_calls=max_calls, per_sid=2)
+    latencies = {kind: [] for kind in ("critical", "operator", "normal", "tts_text")}
+    shed = {kind: [] for kind in latencies}
+    lock = threading.Lock()
+
+    def pipeline(kind, call, started):
+        try:
+            if kind == "tts_text":
+                call.run("tts", upstream.call, "tts")
+            else:
+                call.run("stt", upstream.call, "stt")
+                if kind == "critical":
+                    call.escalate(CRITICAL)  # the KB match comes back Critical
+                call.run("llm", upstream.call, "llm")
+                call.run("tts", upstream.call, "tts")
+        finally:
+            call.release()
+        with lock:
+            latencies[kind].append(time.perf_counter() - started)
+
+    priorities = {"operator": OPERATOR, "normal": NORMAL, "critical": NORMAL, "tts_text": BACKGROUND}
+    threads = []
+    for kind, sid in calls:
+        try:
+            call = scheduler.admit(sid, priorities[kind])
+        except Overloaded as e:
+            shed[kind].append(e.estimated_wait)
+        else:
+            thread = threading.Thread(target=pipeline, args=(kind, call, time.perf_counter()))
+            thread.start()
+            threads.append(thread)
+        time.sleep(1 / rate)
+    for thread in threads:
+        thread.join()
+    return latencies, shed, scheduler.stats()
+
+
+def percentile_ms(samples, q):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+def report(name, latencies, shed):
+    print(name)
+    for kind, samples in latencies.items():
+        dropped = shed.get(kind, [])
+        extra = f"  shed {len(dropped):3d} (est. wait ~{sum(dropped) / len(dropped):.1f} s)" if dropped else ""
+        print(f"  {kind:<9} done {len(samples):3d}  p50 {percentile_ms(samples, .5):7.0f} ms"
+              f"  p95 {percentile_ms(samples, .95):7.0f} ms{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=120, help="arrivals per second")
+    parser.add_argument("--max-calls", type=int, default=24)
+    args = parser.parse_args()
+
+    capacity = UPSTREAM_SLOTS / max(STAGE_SECONDS.values())
+    print(f"{args.calls} arrivals at {args.rate:.0f}/s, pipeline capacity ~{capacity:.0f} calls/s")
+    calls = workload(args.calls)
+
+    latencies, shed = run_unbounded(calls, args.rate, Upstream())
+    report("unbounded (thread per call, FIFO at the upstream)", latencies, shed)
+
+    latencies, shed, stats = run_scheduled(calls, args.rate, Upstream(), args.max_calls)
+    report(f"scheduler (max {args.max_calls} calls, per-sid 2, priority lanes)", latencies, shed)
+    for stage, pool in stats["stages"].items():
+        print(f"  {stage}: queue wait p50 {pool['wait_ms']['p50']} ms, p95 {pool['wait_ms']['p95']} ms,"
+              f" service {pool['service_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
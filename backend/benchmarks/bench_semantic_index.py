@@ -0,0 +1,104 @@
+"""
+Semantic index: paraphrase recall on the real knowledge base, then build / reload / query
+timings on a synthetic one (the query budget is < 1 ms at 50k entries).
+
+    python -m benchmarks.bench_semantic_index [--entries 50000] [--queries 2000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from knowledge_index import load_keyword_map
+from semantic_index import load_or_build
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIN_SCORE = 0.12
+
+# Paraphrases the keyword map does not cover -> the KB symptom they should retrieve
+PARAPHRASES = [
+    ("I can't catch my breath", "difficulty breathing"),
+    ("he is bleeding a lot from his leg", "severe bleeding"),
+    ("I think my chest hurts", "chest pain"),
+    ("his arm might be broken", "broken bone"),
+    ("my head hit the windshield", None),
+    ("stung by a bee and her face is swelling, some kind of allergic thing", "allergic reaction"),
+]
+
+
+def check_paraphrases():
+    with open(os.path.join(BACKEND_DIR, "medical_knowledge_base_v2.json"), encoding="utf-8") as f:
+        medical_kb = json.load(f)
+    keyword_map = load_keyword_map(os.path.join(BACKEND_DIR, "symptom_keywords.json"))
+    with tempfile.TemporaryDirectory() as tmp:
+        index = load_or_build(medical_kb, tmp, keyword_map)
+
+    misses = 0
+    for text, expected in PARAPHRASES:
+        found = [medical_kb[row]["symptom"] for row, _ in index.search(text, 3, MIN_SCORE)]
+        if expected and expected not in found:
+            misses += 1
+            print(f"MISS {text!r}: expected {expected}, got {found}")
+    return misses
+
+
+def synthetic_kb(n_entries, rng):
+    vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10))) for _ in range(5000)]
+    body = ["pain", "injury", "bleeding", "fracture", "fever", "chest", "head", "acute", "severe", "syndrome"]
+    entries = []
+    for i in range(n_entries):
+        entries.append({
+            "symptom": f"{rng.choice(body)} {rng.choice(vocab)} {i}",
+            "conditions": [" ".join(rng.choice(vocab) for _ in range(2)) for _ in range(3)],
+        })
+    queries = [" ".join(rng.choice(vocab + body) for _ in range(rng.randint(4, 12))) for _ in range(2000)]
+    return entries, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    misses = check_paraphrases()
+    print(f"paraphrases: {len(PARAPHRASES)} checked, {misses} misses")
+    if misses:
+        raise SystemExit(1)
+
+    rng = random.Random(0)
+    entries, queries = synthetic_kb(args.entries, rng)
+    queries = (queries * (args.queries // len(queries) + 1))[:args.queries]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        load_or_build(entries, tmp)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = load_or_build(entries, tmp)
+        reload_s = time.perf_counter() - start
+        assert isinstance(index.rows.base, np.memmap), "reload should memory-map, not rebuild"
+
+        for text in queries[:20]:
+            index.search(text, 3, MIN_SCORE)  # warm the page cache
+        latencies = []
+        for text in queries:
+            start = time.perf_counter()
+            index.search(text, 3, MIN_SCORE)
+            latencies.append(time.perf_counter() - start)
+        del index
+
+    latencies = np.array(latencies) * 1e6
+    print(f"synthetic KB: {args.entries} entries")
+    print(f"  build + save:        {build_s:8.2f} s")
+    print(f"  reload (mmap):       {reload_s * 1000:8.1f} ms (includes hashing the KB to check the digest)")
+    print(f"  query p50 / p99:     {np.percentile(latencies, 50):8.0f} / {np.percentile(latencies, 99):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+What the telemetry costs a call: one traced call (start, ten stage spans, finish) against
+the same stages untraced, with INFO and DEBUG logging, a /metrics render after many calls,
+and how much slower a CPU-bound stage runs while the sampling profiler is switched on.
+
+    python -m benchmarks.bench_telemetry [--calls 20000]
+"""
+import argparse
+import io
+import logging
+import threading
+import time
+
+from telemetry import Registry, SamplingProfiler, Tracer, configure_logging, logger
+
+STAGES = ("hospital_index", "stt", "extraction", "patient_db", "knowledge", "hospitals", "prompt", "llm", "tts", "tts")
+
+
+def call_untraced(req_id, tracer):
+    for stage in STAGES:
+        pass
+
+
+def call_traced(req_id, tracer):
+    tracer.start(req_id, "user")
+    for stage in STAGES:
+        with tracer.span(req_id, stage):
+            pass
+    tracer.finish(req_id)
+
+
+def per_call(fn, tracer, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(str(i), tracer)
+    return (time.perf_counter() - start) / calls
+
+
+def busy_work(seconds):
+    """CPU-bound stand-in for extraction / prompt building on a pipeline thread"""
+    done = threading.Event()
+    count = [0]
+
+    def spin():
+        while not done.is_set():
+            sum(range(200))
+            count[0] += 1
+    thread = threading.Thread(target=spin)
+    thread.start()
+    time.sleep(seconds)
+    done.set()
+    thread.join()
+    return count[0] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    configure_logging("INFO")
+    logger.handlers[0].stream = io.StringIO()  # measure formatting, not the terminal
+    registry = Registry()
+    tracer = Tracer(registry)
+    base = per_call(call_untraced, tracer, args.calls)
+    info = per_call(call_traced, tracer, args.calls)
+    logger.setLevel(logging.DEBUG)
+    debug = per_call(call_traced, tracer, args.calls // 4)
+    logger.setLevel(logging.INFO)
+    print(f"{'untraced us/call':>17} {'traced INFO us':>15} {'traced DEBUG us':>16}")
+    print(f"{base * 1e6:>17.2f} {info * 1e6:>15.2f} {debug * 1e6:>16.2f}")
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"/metrics render: {(time.perf_counter() - start) * 1000:.2f} ms, {len(text)} bytes")
+
+    profiler = SamplingProfiler()
+    off = busy_work(1.0)
+    rows = []
+    for interval_ms in (10, 5, 1):
+        profiler.start(interval_ms / 1000)
+        on = busy_work(1.0)
+        profiler.stop()
+        rows.append((interval_ms, on, profiler.samples, profiler.status()["stacks"]))
+    print(f"{'profiler':>9} {'work/s':>10} {'slowdown':>9} {'samples':>8} {'stacks':>7}")
+    print(f"{'off':>9} {off:>10.0f} {'':>9}")
+    for interval_ms, on, samples, stacks in rows:
+        print(f"{str(interval_ms) + ' ms':>9} {on:>10.0f} {(off / on - 1) * 100:>8.1f}% {samples:>8} {stacks:>7}")
+
+
+if __name__ == "__main__":
+    main()
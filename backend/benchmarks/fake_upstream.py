@@ -0,0 +1,187 @@
+"""
+Local stand-ins for the services the backend calls, so the whole app runs without API keys:
+
+    POST /v1/listen            Deepgram pre-recorded STT; the transcript is looked up by the
+                               sha1 of the posted audio, other audio gets the next one in turn
+    POST /v1/speak             Deepgram TTS; audio streamed back in 16 KB writes, size
+                               proportional to the text
+    POST /v1/chat/completions  OpenAI-compatible chat (CEREBRAS_BASE_URL), as server-sent
+                               events when the request has "stream": true
+
+Every request waits its service's latency plus an exponential jitter tail, and a fraction
+error_rate of them are answered 503 (which the backend retries). A new connection first waits
+connect_ms, standing in for the TCP and TLS handshakes with a remote host; HEAD and other GETs
+get an empty 404 after it. backend_env(port) has the
+environment that points the backend at a running instance.
+"""
+import hashlib
+import itertools
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRANSCRIPT = "My name is Jose. I am 36 years old. I fell and my ankle pain is 7, and I can't catch my breath."
+ANSWER = "Keep still and elevate the ankle. Urgency: Moderate."
+
+
+class Profile:
+    """How the fake services behave; latencies in ms"""
+
+    def __init__(self, stt_ms=20, tts_ms=20, llm_ms=20, jitter_ms=0, error_rate=0.0, token_ms=0,
+                 tts_bytes_per_char=200, transcripts=(TRANSCRIPT,), audio_transcripts=None, unique_answers=False,
+                 connect_ms=0):
+        self.stt_ms = stt_ms
+        self.tts_ms = tts_ms
+        self.llm_ms = llm_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.token_ms = token_ms  # between streamed LLM deltas
+        self.tts_bytes_per_char = tts_bytes_per_char
+        self.transcripts = list(transcripts)
+        self.audio_transcripts = dict(audio_transcripts or {})  # sha1 hex of the audio -> transcript
+        self.unique_answers = unique_answers  # distinct replies, so every call misses the TTS cache
+        self.connect_ms = connect_ms
+
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    profile = Profile()
+    turn = itertools.count()
+    answers = itertools.count()
+
+    def setup(self):
+        super().setup()
+        if self.profile.connect_ms:
+            time.sleep(self.profile.connect_ms / 1000)
+
+    def do_HEAD(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        profile = self.profile
+        service = "stt" if self.path.startswith("/v1/listen") else "tts" if self.path.startswith("/v1/speak") else "llm"
+        latency = getattr(profile, service + "_ms")
+        if profile.jitter_ms:
+            latency += random.expovariate(1 / profile.jitter_ms)
+        time.sleep(latency / 1000)
+        if profile.error_rate and random.random() < profile.error_rate:
+            self._reply(503, b'{"err_msg": "injected failure"}', "application/json")
+        elif service == "stt":
+            self._listen(body)
+        elif service == "tts":
+            self._speak(json.loads(body or b"{}").get("text", ""))
+        else:
+            self._chat(json.loads(body or b"{}"))
+
+    def _listen(self, audio):
+        transcript = self.profile.audio_transcripts.get(hashlib.sha1(audio).hexdigest())
+        if transcript is None:
+            transcripts = self.profile.transcripts
+            transcript = transcripts[next(self.turn) % len(transcripts)]
+        body = {"results": {"channels": [{"alternatives": [{"transcript": transcript}]}]}}
+        self._reply(200, json.dumps(body).encode(), "application/json")
+
+    def _speak(self, text):
+        size = max(1024, len(text) * self.profile.tts_bytes_per_char)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        self.wfile.write(b"ID3")
+        remaining = size - 3
+        while remaining:
+            n = min(remaining, 16 * 1024)
+            self.wfile.write(b"\0" * n)
+            remaining -= n
+
+    def _chat(self, request):
+        answer = ANSWER
+        if self.profile.unique_answers:
+            answer = f"{ANSWER} Case {next(self.answers)}."
+        if not request.get("stream"):
+            body = {"id": "c", "object": "chat.completion", "created": 0, "model": "fake",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}}
+            self._reply(200, json.dumps(body).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            if i and self.profile.token_ms:
+                time.sleep(self.profile.token_ms / 1000)
+            chunk = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                     "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _server(profile):
+    FakeUpstream.profile = profile
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstream)
+    server.daemon_threads = True
+    return server
+
+
+def _serve(profile, port):
+    server = _server(profile)
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+
+def start(profile=None, in_process=False):
+    """
+    Run the fake services on a free port; returns (port, stop). By default they get a process
+    of their own, so a load test does not share the GIL with them
+    """
+    profile = profile or Profile()
+    if in_process:
+        server = _server(profile)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.server_port, server.shutdown
+
+    port = multiprocessing.Value("i", 0)
+    process = multiprocessing.Process(target=_serve, args=(profile, port), daemon=True)
+    process.start()
+    while not port.value:
+        if not process.is_alive():
+            raise RuntimeError("fake upstream did not start")
+        time.sleep(0.01)
+    return port.value, process.terminate
+
+
+def backend_env(port):
+    return {
+        "DEEPGRAM_API_KEY": "fake",
+        "DEEPGRAM_URL_STT": f"http://127.0.0.1:{port}/v1/listen",
+        "DEEPGRAM_URL_TTS": f"http://127.0.0.1:{port}/v1/speak",
+        "CEREBRAS_API_KEY": "fake",
+        "CEREBRAS_BASE_URL": f"http://127.0.0.1:{port}/v1",
+    }
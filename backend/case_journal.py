@@ -0,0 +1,236 @@
+"""
+Append-only journal of what every call produced (transcript, patient info, knowledge base
+matches, replies, audio URLs), kept in SQLite so the history views survive a refresh.
+
+The call path only appends a tuple to an in-memory deque: no lock, no I/O, no JSON encoding.
+A background writer drains it every flush_interval seconds and inserts each batch in one
+transaction on a WAL connection with synchronous=NORMAL. When the writer falls max_queue
+records behind, new records are dropped and counted instead of slowing calls down; a batch
+that fails to commit is retried on the next flush.
+
+Schema: one `calls` row per req_id (start time, case, kind, patient name once one is known)
+with its events clustered by call in a WITHOUT ROWID table; payloads are compact JSON without
+the req_id they all repeat. history() pages through calls newest first with a keyset cursor
+(the calls rowid), so a deep page costs the same as the first.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from db import ConnectionPool, db_path, read_transaction
+from telemetry import log_event
+
+# Token deltas and raw audio frames: the journal keeps the finished reply and the audio URLs
+SKIPPED_EVENTS = {"response_delta", "audio_binary", "transcription_partial"}
+# Events whose `name` becomes the call's patient (patient_info is published last, so it wins)
+PATIENT_EVENTS = {"database_patient_found", "patient_info"}
+
+# Flushes a failed batch is retried on before it is dropped (a locked or full disk clears up, a bad record does not)
+MAX_RETRIES = 3
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    req_id TEXT NOT NULL UNIQUE,
+    started INTEGER NOT NULL,          -- ms since the epoch
+    case_id TEXT,
+    kind TEXT,                         -- user / operator
+    patient TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_calls_started ON calls (started);
+CREATE INDEX IF NOT EXISTS idx_calls_patient ON calls (patient, id) WHERE patient IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_calls_case ON calls (case_id, id) WHERE case_id IS NOT NULL;
+CREATE TABLE IF NOT EXISTS call_events (
+    call_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    ts INTEGER NOT NULL,               -- ms since the epoch
+    event TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (call_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def encode(data):
+    return json.dumps({k: v for k, v in data.items() if k != "req_id"},
+                      separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class CaseJournal:
+    """
+    Write-behind store of call events. Payloads are serialized by the writer, so they must not
+    be changed after they are published (every publish in app.py builds a fresh dict)
+    """
+
+    def __init__(self, path=None, flush_interval=0.2, max_queue=100000, batch_size=2000, open_calls=10000):
+        self.path = path or db_path("case_journal.db", "CASE_JOURNAL_PATH")
+        self.pool = ConnectionPool(self.path, setup=lambda conn: conn.executescript(SCHEMA_SQL), wal=True)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.open_calls = open_calls
+        self._pending = deque()
+        self._retry = []
+        self._retries = 0
+        self._call_ids = OrderedDict()  # req_id -> [calls.id, next seq], for calls still producing events
+        self._flush_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.max_queued = 0
+        self.last_flush_ms = None
+
+    # -- call path --------------------------------------------------------------------------
+
+    def begin(self, req_id, kind, case_id=None):
+        """Open the call's row: which console placed it and the case it belongs to"""
+        self._enqueue(("call", time.time(), req_id, kind, case_id))
+
+    def append(self, event_name, data):
+        """Queue one published event; events without a req_id and SKIPPED_EVENTS are not journaled"""
+        if event_name in SKIPPED_EVENTS or not isinstance(data, dict):
+            return
+        req_id = data.get("req_id")
+        if req_id is None:
+            return
+        self._enqueue(("event", time.time(), req_id, event_name, data))
+
+    def _enqueue(self, record):
+        # deque.append is atomic; the counters are approximate under contention, like StageStats
+        if len(self._pending) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+
+    # -- writer -----------------------------------------------------------------------------
+
+    def _call_id(self, conn, req_id, ts):
+        entry = self._call_ids.get(req_id)
+        if entry is not None:
+            return entry
+        conn.execute("INSERT INTO calls (req_id, started) VALUES (?, ?) ON CONFLICT(req_id) DO NOTHING",
+                     (req_id, int(ts * 1000)))
+        entry = list(conn.execute(
+            "SELECT id, (SELECT coalesce(max(seq) + 1, 0) FROM call_events WHERE call_id = calls.id) "
+            "FROM calls WHERE req_id = ?", (req_id,)).fetchone())
+        self._call_ids[req_id] = entry
+        if len(self._call_ids) > self.open_calls:
+            self._call_ids.popitem(last=False)
+        return entry
+
+    def _write(self, conn, batch):
+        events = []
+        with conn:
+            for record in batch:
+                kind, ts, req_id, a, b = record
+                entry = self._call_id(conn, req_id, ts)
+                if kind == "call":
+                    conn.execute("UPDATE calls SET started = ?, kind = ?, case_id = ? WHERE id = ?",
+                                 (int(ts * 1000), a, b, entry[0]))
+                    continue
+                events.append((entry[0], entry[1], int(ts * 1000), a, encode(b)))
+                entry[1] += 1
+                if a in PATIENT_EVENTS and b.get("name"):
+                    conn.execute("UPDATE calls SET patient = ? WHERE id = ?", (b["name"], entry[0]))
+            conn.executemany("INSERT INTO call_events (call_id, seq, ts, event, data) VALUES (?, ?, ?, ?, ?)", events)
+
+    def flush(self):
+        """Write everything queued so far in batches of batch_size; returns the number of records written"""
+        with self._flush_lock:
+            started = time.perf_counter()
+            self.max_queued = max(self.max_queued, len(self._pending))
+            with self.pool.connection() as conn:
+                # WAL + NORMAL: a commit is not fsynced, a power loss can lose the last batches but never corrupts
+                conn.execute("PRAGMA synchronous=NORMAL")
+                written = 0
+                while self._retry or self._pending:
+                    batch, self._retry = self._retry, []
+                    while self._pending and len(batch) < self.batch_size:
+                        batch.append(self._pending.popleft())
+                    try:
+                        self._write(conn, batch)
+                    except Exception as e:
+                        # Rolled back: the cached seq numbers may be ahead of the table now
+                        self._call_ids.clear()
+                        self.write_errors += 1
+                        self._retries += 1
+                        if self._retries < MAX_RETRIES:
+                            self._retry = batch
+                        else:
+                            self.dropped += len(batch)
+                            self._retries = 0
+                        log_event("case_journal_write_failed", logging.ERROR, records=len(batch), error=str(e))
+                        break
+                    self._retries = 0
+                    written += len(batch)
+                    self.batches += 1
+            self.written += written
+            if written:
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+            return written
+
+    def watch(self, sleep):
+        """Background writer; `sleep` is socketio.sleep so it cooperates with the server's async mode"""
+        while True:
+            sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log_event("case_journal_flush_failed", logging.ERROR, error=str(e))
+
+    def close(self):
+        self.flush()
+        self.pool.close_all()
+
+    # -- reads ------------------------------------------------------------------------------
+
+    def history(self, before=None, limit=20, patient=None, case_id=None):
+        """
+        One page of journaled calls, newest first, each with its events in order.
+        `before` is the `next` cursor of the previous page; `next` is None on the last page
+        """
+        clauses, params = [], []
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(int(before))
+        if patient:
+            clauses.append("patient = ?")
+            params.append(patient)
+        if case_id:
+            clauses.append("case_id = ?")
+            params.append(case_id)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self.pool.connection() as conn, read_transaction(conn):
+            rows = conn.execute(f"SELECT id, req_id, started, case_id, kind, patient FROM calls{where} "
+                                "ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+            calls = {}
+            for call_id, req_id, started, call_case, kind, call_patient in rows:
+                calls[call_id] = {"req_id": req_id, "case_id": call_case, "kind": kind, "patient": call_patient,
+                                  "started": started, "events": []}
+            if calls:
+                marks = ",".join("?" * len(calls))
+                for call_id, ts, event, data in conn.execute(
+                        f"SELECT call_id, ts, event, data FROM call_events WHERE call_id IN ({marks}) "
+                        "ORDER BY call_id, seq", tuple(calls)):
+                    calls[call_id]["events"].append({"event": event, "ts": ts, "data": json.loads(data)})
+        return {
+            "calls": list(calls.values()),
+            "next": rows[-1][0] if len(rows) == limit else None
+        }
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "queued": len(self._pending) + len(self._retry),
+            "max_queued": self.max_queued,
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "last_flush_ms": self.last_flush_ms,
+            "flush_interval_ms": round(self.flush_interval * 1000)
+        }
@@ -0,0 +1,160 @@
+"""
+Per-caller case state across utterances.
+
+Every socket has one open case. Each utterance's extracted fields are merged into it (a
+newly stated value replaces the old one, symptoms accumulate), the patient record found for
+the stated name/age is kept so follow-ups do not query the database again, and knowledge base
+matches accumulate by symptom. From the second utterance on the LLM gets a compact summary
+of the case (context()) plus what is new, instead of the whole case again.
+
+A case ends when the caller disconnects, sends end_case, or stays silent for longer than
+the TTL. Sessions live in process memory: Socket.IO keeps a sid on the process that
+accepted it, so every utterance of a case reaches the same session.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+MERGED_FIELDS = ("name", "age", "injury", "pain_location", "pain_level", "allergies")
+HISTORY_SUMMARY_CHARS = 160
+QUOTE_CHARS = 200
+
+
+def shorten(text, limit):
+    """text cut to about `limit` characters, at a clause or word boundary"""
+    text = " ".join(str(text).split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    for separator in ("; ", ". ", "。", "；", ", ", " "):
+        at = cut.rfind(separator)
+        if at > limit // 2:
+            return cut[:at].rstrip(",;. ") + " …"
+    return cut + " …"
+
+
+class CaseSession:
+    def __init__(self, sid):
+        self.sid = sid
+        self.case_id = str(uuid.uuid4())
+        self.fields = {field: None for field in MERGED_FIELDS}
+        self.fields["symptoms"] = []
+        self.turns = 0
+        self.patient_key = None  # (name, age) as stated, the default patient under (None, None)
+        self.patient = None
+        self.history_sent = False  # full medical history of self.patient already went to the LLM
+        self.knowledge = OrderedDict()  # symptom -> knowledge base match
+        self.utterances = deque(maxlen=2)
+        self.last_reply = None
+        self.touched = time.monotonic()
+        self._lock = threading.Lock()
+
+    def merge(self, info):
+        """Fold one utterance's fields into the case; returns (merged copy, turn number)"""
+        with self._lock:
+            for field in MERGED_FIELDS:
+                if info.get(field) not in (None, ""):
+                    self.fields[field] = info[field]
+            for symptom in info.get("symptoms") or []:
+                if symptom not in self.fields["symptoms"]:
+                    self.fields["symptoms"].append(symptom)
+            self.turns += 1
+            return {**self.fields, "symptoms": list(self.fields["symptoms"])}, self.turns
+
+    def cached_patient(self, key):
+        """(True, record or None) when this case already looked up `key`, else (False, None)"""
+        with self._lock:
+            if self.patient_key == key:
+                return True, self.patient
+            return False, None
+
+    def remember_patient(self, key, record):
+        with self._lock:
+            if record != self.patient:
+                self.history_sent = False
+            self.patient_key = key
+            self.patient = record
+
+    def add_knowledge(self, results):
+        """Remember an utterance's knowledge base matches; returns the ones new to this case"""
+        with self._lock:
+            new = [result for result in results if result["symptom"] not in self.knowledge]
+            for result in results:
+                self.knowledge[result["symptom"]] = result
+            return new
+
+    def all_knowledge(self):
+        with self._lock:
+            return list(self.knowledge.values())
+
+    def context(self, new_knowledge):
+        """
+        What the case established before this utterance, for a follow-up prompt:
+        {"summary": [lines], "history_sent": bool}; None on the first utterance
+        """
+        with self._lock:
+            if not self.utterances:
+                return None
+            summary = ["Earlier in this call:"]
+            summary += [f'- Caller said: "{shorten(text, QUOTE_CHARS)}"' for text in self.utterances]
+            if self.last_reply:
+                summary.append(f"- Advice already given: {shorten(self.last_reply, QUOTE_CHARS)}")
+            new = {result["symptom"] for result in new_knowledge}
+            earlier = [f"{symptom} ({result['severity']})" for symptom, result in self.knowledge.items() if symptom not in new]
+            if earlier:
+                summary.append(f"- Knowledge base matches so far: {', '.join(earlier)}")
+            return {"summary": summary, "history_sent": self.history_sent}
+
+    def record_turn(self, transcript, reply, history_sent):
+        with self._lock:
+            self.utterances.append(transcript)
+            self.last_reply = reply
+            self.history_sent = self.history_sent or history_sent
+
+
+class CaseSessionStore:
+    def __init__(self, ttl=600, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # sid -> CaseSession, least recently used first
+        self._lock = threading.Lock()
+        self.started = 0
+        self.expired = 0
+
+    def get(self, sid):
+        """The caller's open case, starting a new one when there is none or it went stale"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(sid)
+            if session is None:
+                session = self._sessions[sid] = CaseSession(sid)
+                self.started += 1
+            else:
+                self._sessions.move_to_end(sid)
+            session.touched = now
+            return session
+
+    def end(self, sid):
+        with self._lock:
+            return self._sessions.pop(sid, None) is not None
+
+    def _evict(self, now):
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if now - session.touched <= self.ttl and len(self._sessions) < self.max_sessions:
+                break
+            del self._sessions[sid]
+            self.expired += 1
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "open": len(sessions),
+            "started": self.started,
+            "expired": self.expired,
+            "ttl": self.ttl,
+            "multi_turn": sum(1 for session in sessions if session.turns > 1),
+        }
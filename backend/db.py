@@ -0,0 +1,202 @@
+"""
+SQLite connection helpers shared by the data-access modules
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from telemetry import log_event
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Working copies: the databases committed next to this file are seeds, copied here on first start
+DB_DIR = os.getenv("DB_DIR", os.path.join(BASE_DIR, "data"))
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+
+def db_path(filename, env_var=None):
+    """
+    Resolve a database path: an explicit env var override wins,
+    otherwise the filename is looked up in DB_DIR (defaults to data/ in the backend directory)
+    """
+    if env_var and os.getenv(env_var):
+        return os.getenv(env_var)
+    return os.path.join(DB_DIR, filename)
+
+
+def sqlite_uri(path, read_only=False):
+    uri = "file:" + pathname2url(os.path.abspath(path))
+    if read_only:
+        uri += "?mode=ro"
+    return uri
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections, checked out for one query or transaction:
+
+        with pool.connection() as conn:
+            conn.execute(...)
+
+    Calls run on short-lived threads, so connections are not tied to a thread: up to `size`
+    are opened on demand and handed back on exit, most recently returned first so sqlite3's
+    per-connection statement cache keeps our queries prepared. When all are in use a
+    checkout waits up to `timeout` seconds, then raises sqlite3.OperationalError.
+
+    `attach` maps a schema alias to the path of an extra database ATTACHed on every connection.
+    `setup` (index creation etc.) and the WAL switch run once on a writable bootstrap
+    connection; pooled connections are then opened read-only when `read_only` is set.
+    """
+
+    def __init__(self, path, attach=None, setup=None, read_only=False, wal=False, cached_statements=256,
+                 size=None, timeout=10.0):
+        self.path = path
+        self.attach = dict(attach or {})
+        self.setup = setup
+        self.read_only = read_only
+        self.wal = wal
+        self.cached_statements = cached_statements
+        self.size = size or POOL_SIZE
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._connections = set()  # every open connection, idle, checked out or dedicated
+        self._dedicated = []
+        self._pooled = 0
+        self._bootstrapped = False
+        self.waits = 0
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._pooled < self.size
+            if grow:
+                self._pooled += 1
+            else:
+                self.waits += 1
+        if grow:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._pooled -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"no free connection to {self.path} after {self.timeout}s") from None
+
+    def _checkin(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if conn in self._connections:
+                self._idle.put(conn)
+                return
+        # close_all() ran while it was checked out
+        conn.close()
+
+    def _open(self, read_only):
+        conn = sqlite3.connect(
+            sqlite_uri(self.path, read_only),
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for alias, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (sqlite_uri(path, read_only),))
+        return conn
+
+    def _bootstrap(self):
+        if not (self.setup or self.wal):
+            return
+        try:
+            conn = self._open(read_only=False)
+            try:
+                if self.wal:
+                    for schema in ["main", *self.attach]:
+                        conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+                if self.setup:
+                    self.setup(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            log_event("db_bootstrap_skipped", logging.WARNING, path=self.path, error=str(e))
+
+    def _connect(self):
+        with self._lock:
+            if not self._bootstrapped:
+                self._bootstrap()
+                self._bootstrapped = True
+
+        conn = self._open(self.read_only)
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def dedicated(self):
+        """
+        A connection of its own, outside the pool, for a watcher that has to compare
+        PRAGMA data_version on the same connection every time; closed by close_all()
+        """
+        conn = self._connect()
+        with self._lock:
+            self._dedicated.append(conn)
+        return conn
+
+    def warm(self, connections=None):
+        """
+        Open `connections` (default: all `size`) pooled connections with the schema loaded,
+        ahead of the first queries; returns how many are open
+        """
+        held = []
+        try:
+            for _ in range(min(connections or self.size, self.size)):
+                conn = self._checkout()
+                held.append(conn)
+                conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        finally:
+            for conn in held:
+                self._checkin(conn)
+        return self._pooled
+
+    def stats(self):
+        with self._lock:
+            return {"size": self.size, "open": self._pooled, "idle": self._idle.qsize(), "waits": self.waits}
+
+    def close_all(self):
+        """Close the idle and dedicated connections; checked-out ones are closed when they come back"""
+        with self._lock:
+            idle, self._idle = self._idle, queue.LifoQueue()
+            dedicated, self._dedicated = self._dedicated, []
+            self._connections = set()
+            self._pooled = 0
+        while not idle.empty():
+            idle.get_nowait().close()
+        for conn in dedicated:
+            conn.close()
+
+
+@contextmanager
+def read_transaction(conn):
+    """BEGIN ... COMMIT around a few reads, so they all see the same committed state"""
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.execute("COMMIT")
@@ -0,0 +1,177 @@
+"""
+Compiled patient info extraction (支持中英文).
+
+Every name/age/injury/pain/allergy/symptom pattern is compiled once at import together with
+the literals it cannot match without (e.g. "岁" for "(\\d+)岁", the keywords of a keyword
+alternation). The transcript is lowercased once and a pattern's regex only runs when one of
+its literals is present, so most patterns cost a C-level substring check instead of a full
+case-insensitive regex scan. This matters for streaming STT, where extraction reruns on every
+partial transcript.
+
+Within a field, patterns keep their priority order: the first pattern that matches anywhere wins.
+"""
+import re
+
+I = re.IGNORECASE
+
+# Non-ASCII letters that IGNORECASE treats as i/s/k but str.lower() does not map onto them;
+# transcripts containing any of them skip the prefilter
+CASE_FOLD_EXCEPTIONS = ("\u0130", "\u0131", "\u017f", "\u212a")
+
+
+class Rule:
+    def __init__(self, pattern, flags, literals):
+        self.regex = re.compile(pattern, flags)
+        # Lowercase substrings; at least one must occur in the transcript for the pattern to match
+        self.literals = tuple(literals)
+
+    def search(self, text, lowered):
+        if lowered is None:
+            return self.regex.search(text)
+        for literal in self.literals:
+            if literal in lowered:
+                return self.regex.search(text)
+        return None
+
+
+def first_match(rules, text, lowered):
+    for rule in rules:
+        match = rule.search(text, lowered)
+        if match:
+            return match
+    return None
+
+
+class KeywordRule(Rule):
+    """
+    A plain keyword alternation. The keywords are their own prefilter, and the scan runs
+    case-sensitively over the lowercased transcript (much cheaper than IGNORECASE); the
+    match is then re-anchored on the original text so group(0) keeps the caller's casing.
+    """
+
+    def __init__(self, *words):
+        super().__init__("(" + "|".join(words) + ")", I, [w.lower() for w in words])
+        self.lowered_regex = re.compile("(" + "|".join(self.literals) + ")")
+
+    def search(self, text, lowered):
+        if lowered is None or len(lowered) != len(text):
+            # lower() changed the length, offsets no longer line up
+            return super().search(text, lowered)
+        for literal in self.literals:
+            if literal in lowered:
+                found = self.lowered_regex.search(lowered)
+                return self.regex.match(text, found.start())
+        return None
+
+
+keywords = KeywordRule
+
+
+PAIN_TRIGGERS = ["痛", "疼"]
+
+# 提取姓名: 我叫XXX / My name is XXX / I am XXX / 患者名叫XXX
+NAME_RULES = [
+    Rule(r'患者名叫([A-Za-z\u4e00-\u9fa5\s]+?)(?:[,，。\.]|$)', I, ["患者名叫"]),
+    Rule(r'我叫([A-Za-z\u4e00-\u9fa5]+)', I, ["我叫"]),
+    Rule(r'(?:my name is|I am|I\'m)\s+([A-Za-z\s]+?)(?:[,\.]|$)', I, ["my name is", "i am", "i'm"]),
+]
+
+# 提取年龄: XX岁 / XX years old / I am XX
+AGE_RULES = [
+    Rule(r'(\d+)岁', I, ["岁"]),
+    Rule(r'(\d+)\s+years?\s+old', I, ["year"]),
+    Rule(r'I am (\d+)', I, ["i am "]),
+]
+
+# 提取受伤原因/症状: 中文优先, 然后英文
+INJURY_RULES = [
+    Rule(r'发生了?(车祸|交通事故)', 0, ["车祸", "交通事故"]),
+    Rule(r'从(.+?)摔下来', 0, ["摔下来"]),
+    Rule(r'被(.+?)(撞|打|咬)', 0, ["被"]),
+    Rule(r'(摔|跌|撞)(?:倒|伤)', 0, ["摔倒", "摔伤", "跌倒", "跌伤", "撞倒", "撞伤"]),
+    Rule(r'因为(.+?)(晕倒|昏倒|昏迷)', 0, ["因为"]),
+    Rule(r'(高血压|低血压|糖尿病|心脏病)', 0, ["高血压", "低血压", "糖尿病", "心脏病"]),
+    keywords("car accident", "traffic accident", "motor vehicle accident"),
+    keywords("fell", "fainted", "collapsed", "injured", "hit", "cut", "burned", "broke"),
+    Rule(r'because of\s+(.+?)(?:\.|,|$)', I, ["because of"]),
+    keywords("high blood pressure", "low blood pressure", "diabetes", "heart attack", "stroke"),
+]
+
+# 提取疼痛部位: 中文优先, 然后英文
+PAIN_LOCATION_RULES = [
+    Rule(r'([\u4e00-\u9fa5]+?)(很|特别|非常)?(痛|疼)', 0, PAIN_TRIGGERS),
+    Rule(r'(头|脚|手|腿|腰|背|胸|腹|肚子|脖子|颈|膝盖|脚踝|脚腕|手腕|肩膀|关节).*?(痛|疼)', 0, PAIN_TRIGGERS),
+    Rule(r'(head|chest|stomach|abdomen|back|neck|shoulder|arm|leg|knee|ankle|wrist|foot|hand)\s+(?:pain|hurt|ache)', I,
+         ["pain", "hurt", "ache"]),
+    Rule(r'pain in (?:my|the)\s+([a-z]+)', I, ["pain in "]),
+]
+
+# 提取疼痛等级: 疼痛等级是X / pain level X
+PAIN_LEVEL_RULES = [
+    Rule(r'疼痛等级.*?(\d+)', I, ["疼痛等级"]),
+    Rule(r'pain level.*?(\d+)', I, ["pain level"]),
+]
+
+# 提取过敏信息: 对XXX过敏 / allergic to XXX
+ALLERGY_RULES = [
+    Rule(r'对(.+?)过敏', I, ["过敏"]),
+    Rule(r'allergic to\s+([a-z\s]+)', I, ["allergic to"]),
+]
+
+# 提取症状关键词: every rule that matches contributes its first match
+SYMPTOM_RULES = [
+    keywords("晕倒", "昏倒", "昏迷", "fainted", "collapsed", "unconscious"),
+    keywords("高血压", "low blood pressure", "high blood pressure", "hypertension"),
+    keywords("呼吸困难", "difficulty breathing", "shortness of breath"),
+    keywords("出血", "bleeding"),
+    keywords("骨折", "broken bone", "fracture"),
+]
+
+
+def extract_patient_info(transcript):
+    """
+    使用预编译正则提取患者信息 (支持中英文)
+    """
+    info = {
+        "name": None,
+        "age": None,
+        "injury": None,
+        "pain_location": None,
+        "pain_level": None,
+        "allergies": None,
+        "symptoms": []
+    }
+    lowered = transcript.lower()
+    if any(c in transcript for c in CASE_FOLD_EXCEPTIONS):
+        lowered = None
+
+    match = first_match(NAME_RULES, transcript, lowered)
+    if match:
+        info["name"] = match.group(1).strip()
+
+    match = first_match(AGE_RULES, transcript, lowered)
+    if match:
+        info["age"] = int(match.group(1))
+
+    match = first_match(INJURY_RULES, transcript, lowered)
+    if match:
+        info["injury"] = match.group(0)
+
+    match = first_match(PAIN_LOCATION_RULES, transcript, lowered)
+    if match:
+        info["pain_location"] = match.group(1)
+
+    match = first_match(PAIN_LEVEL_RULES, transcript, lowered)
+    if match:
+        info["pain_level"] = int(match.group(1))
+
+    match = first_match(ALLERGY_RULES, transcript, lowered)
+    if match:
+        info["allergies"] = match.group(1).strip()
+
+    for rule in SYMPTOM_RULES:
+        match = rule.search(transcript, lowered)
+        if match:
+            info["symptoms"].append(match.group(0))
+
+    return info
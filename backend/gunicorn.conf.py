@@ -0,0 +1,31 @@
+"""
+Production server for one backend process (replaces the Werkzeug dev server):
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Threaded worker, with Socket.IO websockets served through simple-websocket. Socket.IO
+needs every request of a session to reach the same process, which gunicorn cannot
+guarantee across its own workers, so a process runs exactly one worker. To use more
+cores, run several processes (serve.py) behind a sticky load balancer (deploy/nginx.conf),
+sharing SOCKETIO_MESSAGE_QUEUE.
+"""
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = 1
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "100"))
+graceful_timeout = 30
+accesslog = "-"
+
+
+def on_starting(server):
+    """
+    Import the app module, and openai (its slowest import, otherwise done during warm-up), in
+    the master. Every worker it forks, including the replacement for one that crashed, then
+    starts with them loaded and goes straight to create_app(), which is where threads and
+    connections are started. The flip side: a HUP keeps the master's code, so deploy new code
+    by restarting the process
+    """
+    import app  # noqa: F401
+    import openai  # noqa: F401
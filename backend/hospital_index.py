@@ -0,0 +1,177 @@
+"""
+Nearest-hospital index.
+
+The hospitals and their in-stock resources are loaded once per inventory version into
+columnar numpy arrays (unit vectors on the sphere, stock totals, one in-stock bit per blood
+type and medication type). A query is then a handful of vectorized passes:
+
+    1. hospitals that stock what the case severity needs (SEVERITY_NEEDS, mask cached per severity)
+    2. the k nearest of those by dot product with the caller's unit vector (same order as
+       great-circle distance), topped up with the nearest others if fewer qualify
+    3. haversine distance for those k only
+    4. those k ordered by stock_score: severity-weighted stock, discounted by distance
+
+Without a caller location, step 3 picks the k best-stocked qualifying hospitals instead.
+"""
+import logging
+import math
+import threading
+
+import numpy as np
+
+from telemetry import log_event
+
+EARTH_RADIUS_KM = 6371.0088
+# (plasma, medication) weight per case severity: bleeding trauma needs plasma first
+STOCK_WEIGHTS = {"Critical": (1.0, 0.25), "Moderate": (0.5, 0.5), "Stable": (0.25, 1.0)}
+DISTANCE_SCALE_KM = 5.0
+# 每种严重程度需要的血浆类型 / 药品类别 (any one of each listed set)
+SEVERITY_NEEDS = {
+    "Critical": {"blood_types": {"O-", "Fresh Frozen Plasma (FFP)"}, "medication_types": {"Hemostatic", "Vasopressor"}},
+    "Moderate": {"blood_types": set(), "medication_types": {"Painkiller", "Antibiotic"}},
+    "Stable": {"blood_types": set(), "medication_types": set()},
+}
+
+
+def stock_score(plasma_units, medication_units, severity, distance_km=None):
+    """Severity-weighted stock, discounted by distance; works on scalars and numpy arrays"""
+    plasma_weight, medication_weight = STOCK_WEIGHTS.get(severity, STOCK_WEIGHTS["Critical"])
+    score = plasma_weight * plasma_units + medication_weight * medication_units
+    if distance_km is not None:
+        score = score / (1 + distance_km / DISTANCE_SCALE_KM)
+    return score
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from (lat, lon) to arrays of points, all in radians"""
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class HospitalIndex:
+    def __init__(self, hospital_data, version=None):
+        self.version = version
+        self.hospitals = hospital_data
+        n = len(hospital_data)
+        coords = [h.get("coordinates") or {} for h in hospital_data]
+        lat = np.array([c.get("lat") if c.get("lat") is not None else np.nan for c in coords], dtype=np.float64)
+        lon = np.array([c.get("lon") if c.get("lon") is not None else np.nan for c in coords], dtype=np.float64)
+        self.lat = np.radians(lat)
+        self.lon = np.radians(lon)
+        # 单位向量: 点积越大距离越近; hospitals without coordinates get NaN and sort last
+        self.xyz = np.column_stack([np.cos(self.lat) * np.cos(self.lon), np.cos(self.lat) * np.sin(self.lon), np.sin(self.lat)])
+        self.plasma_units = np.array([sum(p["stock"] for p in h["blood_plasma"]) for h in hospital_data], dtype=np.float64)
+        self.medication_units = np.array([sum(m["stock"] for m in h["medications"]) for h in hospital_data], dtype=np.float64)
+
+        self.blood_types = sorted({p["type"] for h in hospital_data for p in h["blood_plasma"]})
+        self.medication_types = sorted({m["type"] for h in hospital_data for m in h["medications"]})
+        self.has_blood = self._stock_matrix(n, self.blood_types, "blood_plasma", "type")
+        self.has_medication = self._stock_matrix(n, self.medication_types, "medications", "type")
+        self._needs_masks = {}
+
+    def _stock_matrix(self, n, columns, field, key):
+        column = {name: i for i, name in enumerate(columns)}
+        matrix = np.zeros((n, max(len(columns), 1)), dtype=bool)
+        for row, hosp in enumerate(self.hospitals):
+            for item in hosp[field]:
+                matrix[row, column[item[key]]] = True
+        return matrix
+
+    def _stocks_any(self, matrix, columns, wanted):
+        """Row mask: stocks at least one of `wanted` (everything passes when nothing is wanted)"""
+        if not wanted:
+            return np.ones(len(self.hospitals), dtype=bool)
+        idx = [i for i, name in enumerate(columns) if name in wanted]
+        if not idx:
+            return np.zeros(len(self.hospitals), dtype=bool)
+        return matrix[:, idx].any(axis=1)
+
+    def qualifying(self, severity, blood_types=None, medication_types=None):
+        """Row mask of hospitals stocking what the severity (or the explicit type lists) needs"""
+        default = blood_types is None and medication_types is None
+        if default and severity in self._needs_masks:
+            return self._needs_masks[severity]
+        needs = SEVERITY_NEEDS.get(severity, SEVERITY_NEEDS["Critical"])
+        blood_types = needs["blood_types"] if blood_types is None else set(blood_types)
+        medication_types = needs["medication_types"] if medication_types is None else set(medication_types)
+        mask = (self._stocks_any(self.has_blood, self.blood_types, blood_types)
+                & self._stocks_any(self.has_medication, self.medication_types, medication_types))
+        if default:
+            self._needs_masks[severity] = mask
+        return mask
+
+    def nearest(self, location, severity, k=5, blood_types=None, medication_types=None):
+        """
+        Up to k hospitals for a case of this severity near location ((lat, lon) in degrees, or
+        None), best first. Each is the ResourceStore dict plus distance_km and meets_needs
+        """
+        n = len(self.hospitals)
+        if n == 0 or k <= 0:
+            return []
+        k = min(k, n)
+        meets = self.qualifying(severity, blood_types, medication_types)
+
+        lat = lon = None
+        if location is not None:
+            lat, lon = math.radians(location[0]), math.radians(location[1])
+            # 先选最近的 k 家, 再按库存排序
+            closeness = self.xyz @ np.array([math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)])
+            # Below any dot product but above the -inf that masks the other group below
+            closeness = np.where(np.isnan(closeness), -2.0, closeness)
+        else:
+            closeness = stock_score(self.plasma_units, self.medication_units, severity)
+
+        # Qualifying hospitals always come before the rest
+        chosen = self._top(np.where(meets, closeness, -np.inf), k)
+        chosen = chosen[meets[chosen]]
+        if len(chosen) < k:
+            rest = self._top(np.where(meets, -np.inf, closeness), k - len(chosen))
+            rest = rest[~meets[rest]]
+        else:
+            rest = chosen[:0]
+
+        results = []
+        for group in (chosen, rest):
+            distance = None
+            if lat is not None:
+                distance = haversine_km(lat, lon, self.lat[group], self.lon[group])
+            score = stock_score(self.plasma_units[group], self.medication_units[group], severity, distance)
+            if distance is not None:
+                score = np.where(np.isnan(score), -np.inf, score)
+            for j in np.argsort(-score, kind="stable"):
+                hosp = dict(self.hospitals[group[j]])
+                km = None if distance is None or np.isnan(distance[j]) else round(float(distance[j]), 2)
+                hosp["distance_km"] = km
+                hosp["meets_needs"] = bool(meets[group[j]])
+                results.append(hosp)
+        return results
+
+    @staticmethod
+    def _top(values, k):
+        """Indices of the k largest values (unordered)"""
+        if k >= len(values):
+            return np.arange(len(values))
+        return np.argpartition(-values, k - 1)[:k]
+
+
+class HospitalDirectory:
+    """
+    The current HospitalIndex over an InventoryView: built on first use and rebuilt only
+    when the inventory version changes, so a call normally costs no query at all
+    """
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self._index = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        hospitals, version = self.inventory.snapshot()
+        index = self._index
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            if self._index is None or self._index.version != version:
+                self._index = HospitalIndex(hospitals, version)
+                log_event("hospital_index_loaded", version=version, hospitals=len(hospitals))
+            return self._index
@@ -0,0 +1,340 @@
+"""
+Pooled HTTP transport for the Deepgram REST endpoints (STT and TTS).
+
+One keep-alive requests.Session is shared by all calls, so requests after the first reuse
+a warm TCP+TLS connection instead of handshaking with api.deepgram.com every time. Each
+call gets a per-stage deadline that bounds connecting, waiting for a pool slot, retries
+and backoff together, so a stalled upstream can no longer pin a Socket.IO worker. A
+stream=True response keeps its slot and its deadline until the body is read (iter_body).
+
+Retries: connection errors, timeouts, 429 and 5xx are retried with full-jitter exponential
+backoff (Retry-After is honored) while the deadline allows. Hedging (optional): when an
+attempt is still running after the stage's observed p95 latency, an identical second
+request is sent and whichever answers first wins. Only enable it for idempotent calls.
+"""
+import queue
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+
+class StageStats:
+    """Counters and a rolling latency window for one stage (stt, tts, ...)"""
+
+    def __init__(self, window=200):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def count(self, counter):
+        """Add one to a counter; several hedged or concurrent requests update the same stage"""
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def percentile(self, q):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self.lock:
+            counters = {
+                "requests": self.requests,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failures": self.failures
+            }
+        return {
+            **counters,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class HTTPTransport:
+    def __init__(self, headers=None, pool_size=10, retries=2, backoff=0.2, connect_timeout=3.05,
+                 hedge=False, hedge_min_samples=20):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        # Retries are ours (deadline-aware); urllib3 must not retry underneath
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        # At most pool_size requests in flight, so every one of them gets a kept-alive connection
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._stages_lock = threading.Lock()
+
+    def stage(self, name):
+        with self._stages_lock:
+            if name not in self._stages:
+                self._stages[name] = StageStats()
+            return self._stages[name]
+
+    def post(self, stage, url, deadline, **kwargs):
+        """
+        POST with retries inside `deadline` seconds. Returns the final response (which may
+        still be an error status once retries run out); raises the last exception if no
+        attempt got a response at all
+        """
+        stats = self.stage(stage)
+        stats.count("requests")
+        give_up_at = time.monotonic() + deadline
+        last_error = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.count("retries")
+            try:
+                start = time.monotonic()
+                response = self._attempt(stats, url, give_up_at, kwargs)
+                if response.status_code < 500:
+                    # Latency as the caller saw it (a won hedge counts as fast), which is what hedging keys off
+                    with stats.lock:
+                        stats.latencies.append(time.monotonic() - start)
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                response = None
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.retries:
+                break
+
+            delay = random.uniform(0, self.backoff * (2 ** attempt))  # full jitter
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            if time.monotonic() + delay >= give_up_at:
+                break
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        stats.count("failures")
+        if response is not None:
+            return response
+        raise last_error or DeadlineExceeded(f"{stage}: deadline of {deadline}s exceeded")
+
+    def _attempt(self, stats, url, give_up_at, kwargs):
+        hedge_after = stats.percentile(0.95) if self.hedge and len(stats.latencies) >= self.hedge_min_samples else None
+        if hedge_after is None:
+            return self._send(stats, url, give_up_at, kwargs)
+
+        race = _Race()
+        race.start("first", self._send, stats, url, give_up_at, kwargs)
+        outcome = race.next(hedge_after)
+        launched = 1
+        if outcome is None:
+            stats.count("hedges")
+            race.start("hedge", self._send, stats, url, give_up_at, kwargs)
+            launched = 2
+
+        error = None
+        for _ in range(launched):
+            if outcome is None:
+                outcome = race.next(give_up_at - time.monotonic())
+                if outcome is None:
+                    break
+            tag, response, e = outcome
+            outcome = None
+            if e is not None:
+                error = e
+                continue
+            if tag == "hedge":
+                stats.count("hedge_wins")
+            race.settle()
+            return response
+        race.settle()
+        raise error or DeadlineExceeded("hedged attempts exceeded the deadline")
+
+    def _send(self, stats, url, give_up_at, kwargs):
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+            raise DeadlineExceeded("no connection slot before the deadline")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            stats.count("attempts")
+            remaining = max(0.001, give_up_at - time.monotonic())
+            response = self.session.post(url, timeout=(min(self.connect_timeout, remaining), remaining), **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        if not kwargs.get("stream"):
+            self._release()
+            return response
+
+        # stream=True: the body is still to come, so the slot stays taken until the response is
+        # closed (or collected, should a caller drop it unread) and iter_body keeps the deadline
+        release = weakref.finalize(response, self._release)
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+
+        response.close = close_and_release
+        response.deadline = give_up_at
+        return response
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def warm(self, url, connections=1, timeout=5.0):
+        """
+        Open up to `connections` keep-alive connections to url's host ahead of the first call,
+        TCP and TLS handshakes included. Any HTTP answer will do (HEAD on an API path is usually
+        a 4xx); returns how many connections got one
+        """
+        connections = max(1, min(connections, self.pool_size))
+        results = []
+
+        def head():
+            try:
+                # Read and closed, so the connection goes back to the pool
+                self.session.head(url, timeout=(min(self.connect_timeout, timeout), timeout)).close()
+                results.append(True)
+            except requests.exceptions.RequestException:
+                results.append(False)
+
+        # Concurrent requests, or urllib3 would reuse one connection for all of them
+        threads = [threading.Thread(target=head, daemon=True) for _ in range(connections)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(results)
+
+    def stats(self):
+        pools = []
+        manager = self.adapter.poolmanager.pools
+        for key in manager.keys():
+            pool = manager.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests
+            })
+        with self._stages_lock:
+            stages = {name: stats.snapshot() for name, stats in self._stages.items()}
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self._in_flight,
+            "pools": pools,
+            "stages": stages
+        }
+
+
+def iter_body(response, chunk_size=16 * 1024):
+    """
+    Body of a stream=True response, chunk by chunk as it arrives; the connection (and the
+    transport's slot) goes back once the body is read or the consumer stops early. Reading
+    stops with DeadlineExceeded at the request's deadline: every socket read gets only the
+    time that is left
+    """
+    deadline = getattr(response, "deadline", None)
+    try:
+        chunks = response.iter_content(chunk_size)
+        while True:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("response body not read before the deadline")
+                _set_read_timeout(response, remaining)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            yield chunk
+    finally:
+        response.close()
+
+
+def _set_read_timeout(response, seconds):
+    # The socket of a kept-alive connection; a response on a connection the server closes
+    # keeps the read timeout it was sent with and is only checked between chunks
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        sock.settimeout(seconds)
+
+
+class _Race:
+    """Attempts running on their own threads; responses that arrive after settle() are closed"""
+
+    def __init__(self):
+        self.outcomes = queue.Queue()
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def start(self, tag, fn, *args):
+        threading.Thread(target=self._run, args=(tag, fn, args), daemon=True).start()
+
+    def _run(self, tag, fn, args):
+        try:
+            outcome = (tag, fn(*args), None)
+        except Exception as e:
+            # Any failure is this attempt's outcome: the waiter wakes up instead of sitting out the
+            # deadline, and _attempt re-raises it as the unhedged path would
+            outcome = (tag, None, e)
+        with self.lock:
+            if not self.settled:
+                self.outcomes.put(outcome)
+                return
+        if outcome[1] is not None:
+            outcome[1].close()  # the losing attempt: hand its connection back to the pool
+
+    def next(self, timeout):
+        try:
+            return self.outcomes.get(timeout=max(0, timeout))
+        except queue.Empty:
+            return None
+
+    def settle(self):
+        with self.lock:
+            self.settled = True
+        while True:
+            try:
+                _, response, _ = self.outcomes.get_nowait()
+            except queue.Empty:
+                return
+            if response is not None:
+                response.close()
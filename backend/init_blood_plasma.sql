@@ -10,6 +10,9 @@ CREATE TABLE IF NOT EXISTS blood_plasma (
     FOREIGN KEY (hospital_id) REFERENCES hospitals(id)
 );
 
+-- Per-hospital in-stock lookups
+CREATE INDEX IF NOT EXISTS idx_blood_plasma_hospital_stock ON blood_plasma (hospital_id, stock_quantity);
+
 -- Insert sample blood plasma data, varying by hospital
 INSERT OR REPLACE INTO blood_plasma (id, hospital_id, blood_type, volume, usage, stock_quantity, expiration_date) VALUES
     ('plasma1', 'hosp1', 'O-', 500, 'Universal donor for emergency transfusion', 25, '2025-10-20'),
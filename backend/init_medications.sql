@@ -11,6 +11,9 @@ CREATE TABLE IF NOT EXISTS medications (
     FOREIGN KEY (hospital_id) REFERENCES hospitals(id)
 );
 
+-- Per-hospital in-stock lookups
+CREATE INDEX IF NOT EXISTS idx_medications_hospital_stock ON medications (hospital_id, stock_quantity);
+
 -- Insert sample medication data for car accident scenarios, varying by hospital
 INSERT OR REPLACE INTO medications (id, hospital_id, name, type, dosage, usage, stock_quantity, expiration_date) VALUES
     ('med1', 'hosp1', 'Morphine', 'Painkiller', '5-10mg IV', 'For severe pain in trauma patients', 60, '2026-06-30'),
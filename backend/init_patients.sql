@@ -7,6 +7,9 @@ CREATE TABLE IF NOT EXISTS patients (
     allergies TEXT
 );
 
+-- Name (+ age) lookups from transcribed patient info
+CREATE INDEX IF NOT EXISTS idx_patients_name_age ON patients (name, age);
+
 -- Insert sample patient data with detailed medical history and professional allergy information
 INSERT OR REPLACE INTO patients (id, name, age, medical_history, allergies) VALUES
     ('uuid1', 'John Doe', 70, 'Chronic ischemic heart disease with previous acute myocardial infarction in 2015 requiring percutaneous coronary intervention (PCI) and stent placement; hypertension managed with ACE inhibitors and beta-blockers; type 2 diabetes mellitus controlled with metformin and lifestyle modifications; history of hyperlipidemia treated with statins; previous coronary artery bypass grafting (CABG) in 2020', 'Severe anaphylactic reaction to penicillin-class antibiotics (e.g., amoxicillin, resulting in hives, swelling, and hypotension); mild intolerance to NSAIDs (e.g., ibuprofen, causing gastrointestinal upset)'),
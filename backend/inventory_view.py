@@ -0,0 +1,152 @@
+"""
+In-memory view of hospital inventory.
+
+Every hospital with its in-stock plasma and medications is read once into a dict keyed by
+hospital id; after that a read is a dictionary lookup. A watcher polls PRAGMA data_version
+(no rows read while nothing was committed) and, when a database changed, pulls only the
+hospitals touched since its changelog cursor (ResourceStore.changes_since). The updated
+hospitals are swapped in copy-on-write, and on_delta gets
+
+    {"version": "...", "hospitals": [changed hospitals], "removed": [hospital ids]}
+
+so operator consoles can patch the hospitals they show instead of receiving the whole list.
+When the changelog cannot answer (truncated past our cursor, a database without the
+triggers) the view falls back to a full reload and diffs it against the old one.
+"""
+import logging
+import sqlite3
+import threading
+
+from telemetry import log_event
+
+
+class InventoryView:
+    def __init__(self, store, poll_interval=1.0, on_delta=None):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.on_delta = on_delta
+        self._state = None  # (version, hospital list, id -> hospital); replaced, never mutated
+        self._cursor = None
+        self._data_versions = None  # data versions seen at the last load/poll
+        self._reloads = 0
+        self._lock = threading.Lock()
+        self.deltas = 0
+        self.full_reloads = 0
+
+    def snapshot(self):
+        """(hospitals, version) to use for one request (loaded on first use)"""
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._load()
+            state = self._state
+        return state[1], state[0]
+
+    def hospitals(self):
+        return self.snapshot()[0]
+
+    def get(self, hospital_id):
+        self.snapshot()
+        return self._state[2].get(hospital_id)
+
+    @property
+    def version(self):
+        state = self._state
+        return state[0] if state else None
+
+    def poll(self):
+        """Apply committed inventory changes; returns the delta (or None when nothing changed)"""
+        with self._lock:
+            if self._state is None:
+                self._load()
+                return None
+            versions = self.store.data_versions()
+            if versions == self._data_versions:
+                return None
+            self._data_versions = versions
+
+            try:
+                changes = self.store.changes_since(self._cursor)
+            except sqlite3.Error as e:
+                log_event("inventory_changelog_unavailable", logging.WARNING, fallback="reload", error=str(e))
+                changes = None
+            if changes is None:
+                delta = self._reload()
+            else:
+                cursor, changed, removed = changes
+                if cursor == self._cursor:
+                    # A commit the triggers did not log (e.g. tables rebuilt by hand)
+                    delta = self._reload()
+                else:
+                    self._cursor = cursor
+                    delta = self._apply(changed, removed)
+        if delta and self.on_delta:
+            self.on_delta(delta)
+        return delta
+
+    def watch(self, sleep):
+        """Poll loop for a background task; `sleep` is socketio.sleep so it also yields under eventlet"""
+        while True:
+            sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                log_event("inventory_watcher_failed", logging.ERROR, error=str(e))
+
+    def stats(self):
+        state = self._state
+        return {
+            "version": state[0] if state else None,
+            "hospitals": len(state[1]) if state else 0,
+            "poll_interval": self.poll_interval,
+            "deltas": self.deltas,
+            "full_reloads": self.full_reloads,
+        }
+
+    def _version(self):
+        version = ".".join(str(seq) for seq in self._cursor.values())
+        return f"{version}r{self._reloads}" if self._reloads else version
+
+    def _load(self):
+        self._data_versions = self.store.data_versions()
+        try:
+            self._cursor, hospitals = self.store.snapshot()
+        except sqlite3.Error as e:
+            log_event("inventory_changelog_unavailable", logging.WARNING, fallback="read_without", error=str(e))
+            self._cursor, hospitals = {}, self.store.hospitals_with_resources()
+            self._reloads += 1
+        self._state = (self._version(), hospitals, {hosp["id"]: hosp for hosp in hospitals})
+        log_event("inventory_loaded", version=self._state[0], hospitals=len(hospitals))
+
+    def _reload(self):
+        """Full reload, diffed against the old view"""
+        old = self._state[2]
+        self._reloads += 1
+        self.full_reloads += 1
+        self._load()
+        new = self._state[2]
+        changed = [hosp for hosp_id, hosp in new.items() if old.get(hosp_id) != hosp]
+        removed = sorted(set(old) - set(new))
+        if not changed and not removed:
+            return None
+        self.deltas += 1
+        return {"version": self._state[0], "hospitals": changed, "removed": removed}
+
+    def _apply(self, changed, removed):
+        _, hospitals, by_id = self._state
+        by_id = dict(by_id)
+        for hosp_id in removed:
+            by_id.pop(hosp_id, None)
+        known = len(by_id)
+        for hosp in changed:
+            by_id[hosp["id"]] = hosp
+        # 保持原有顺序, new hospitals go last
+        ordered = [by_id[hosp["id"]] for hosp in hospitals if hosp["id"] in by_id]
+        if len(by_id) > known:
+            seen = {hosp["id"] for hosp in ordered}
+            ordered.extend(hosp for hosp in changed if hosp["id"] not in seen)
+        self._state = (self._version(), ordered, by_id)
+        self.deltas += 1
+        log_event("inventory_updated", version=self._state[0], changed=len(changed), removed=len(removed))
+        return {"version": self._state[0], "hospitals": changed, "removed": removed}
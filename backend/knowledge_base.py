@@ -0,0 +1,138 @@
+"""
+Hot-reloadable medical knowledge base (支持中英文).
+
+The JSON knowledge base and symptom_keywords.json are loaded on first use, validated and
+turned into an immutable KnowledgeSnapshot (entries + keyword index + semantic index).
+A watcher polls both files; when either changes, a new snapshot is built off to the side
+and swapped in with a single reference assignment. Searches grab the current snapshot
+once and never take a lock, so a reload never blocks an in-flight call, and a call never
+mixes two versions. A file that fails to load or validate leaves the old snapshot serving.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from knowledge_index import KnowledgeIndex, keyword_map_from_groups
+from semantic_index import load_or_build as load_semantic_index
+from telemetry import log_event
+
+
+def validate_entries(entries):
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("knowledge base must be a non-empty JSON list")
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"entry {i}: expected an object")
+        if not isinstance(entry.get("symptom"), str) or not entry["symptom"].strip():
+            raise ValueError(f"entry {i}: missing symptom")
+        if not isinstance(entry.get("severity"), str) or not entry["severity"]:
+            raise ValueError(f"entry {i} ({entry['symptom']}): missing severity")
+        conditions = entry.get("conditions")
+        if not isinstance(conditions, list) or not all(isinstance(c, str) for c in conditions):
+            raise ValueError(f"entry {i} ({entry['symptom']}): conditions must be a list of strings")
+        if not isinstance(entry.get("treatment"), str):
+            raise ValueError(f"entry {i} ({entry['symptom']}): missing treatment")
+
+
+class KnowledgeSnapshot:
+    """One loaded version of the knowledge base and its lookup indexes; never mutated"""
+
+    def __init__(self, entries, keyword_map, version, index_dir):
+        self.entries = entries
+        self.version = version
+        self.loaded_at = time.time()
+        self.keyword_index = KnowledgeIndex(entries, keyword_map)
+        self.semantic_index = load_semantic_index(entries, index_dir, keyword_map)
+
+    def search(self, search_text, semantic_text, top_k=3, min_score=0.12):
+        """Keyword hits first, then semantic matches on semantic_text that the keywords missed"""
+        results = self.keyword_index.search(search_text)
+        if semantic_text.strip():
+            for row, score in self.semantic_index.search(semantic_text, top_k, min_score):
+                entry = self.entries[row]
+                if all(entry is not hit for hit in results):
+                    log_event("kb_semantic_match", logging.DEBUG, symptom=entry["symptom"], score=round(float(score), 2))
+                    results.append(entry)
+        return results
+
+
+class KnowledgeBase:
+    def __init__(self, path, keywords_path, index_dir, poll_interval=2.0):
+        self.path = path
+        self.keywords_path = keywords_path
+        self.index_dir = index_dir
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._signature = None
+        self._reload_lock = threading.Lock()
+
+    def current(self):
+        """The snapshot to use for one request (loaded on first use)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self._load()
+            snapshot = self._snapshot
+        return snapshot
+
+    def reload(self):
+        """Rebuild from disk; returns False (old version keeps serving) when the files are invalid"""
+        with self._reload_lock:
+            try:
+                self._load()
+                return True
+            except (OSError, ValueError) as e:
+                log_event("kb_reload_failed", logging.ERROR, version=self.version, error=str(e))
+                return False
+
+    def check_for_changes(self):
+        if self._snapshot is not None and self._file_signature() != self._signature:
+            self.reload()
+
+    def watch(self, sleep):
+        """Poll loop for a background task; `sleep` is socketio.sleep so it also yields under eventlet"""
+        while True:
+            sleep(self.poll_interval)
+            try:
+                self.check_for_changes()
+            except Exception as e:
+                log_event("kb_watcher_failed", logging.ERROR, error=str(e))
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.path, self.keywords_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load(self):
+        # Remember what we tried, so a broken file is reported once rather than on every poll
+        self._signature = self._file_signature()
+        with open(self.path, "rb") as f:
+            kb_bytes = f.read()
+        with open(self.keywords_path, "rb") as f:
+            keyword_bytes = f.read()
+
+        entries = json.loads(kb_bytes.decode("utf-8"))
+        validate_entries(entries)
+        keyword_map = keyword_map_from_groups(json.loads(keyword_bytes.decode("utf-8")))
+        known = {" ".join(entry["symptom"].lower().split()) for entry in entries}
+        for symptom in sorted(set(keyword_map.values()) - known):
+            log_event("kb_keyword_unknown_symptom", logging.WARNING, symptom=symptom)
+
+        version = hashlib.sha256(kb_bytes + b"\0" + keyword_bytes).hexdigest()[:12]
+        snapshot = KnowledgeSnapshot(entries, keyword_map, version, self.index_dir)
+        self._snapshot = snapshot  # atomic swap: readers see the old or the new version, never a mix
+        log_event("kb_loaded", version=version, entries=len(entries))
@@ -0,0 +1,98 @@
+"""
+Keyword index over the medical knowledge base (支持中英文).
+
+Built once at load time: an Aho-Corasick automaton over every keyword in
+symptom_keywords.json (plus each KB entry's own symptom name), and a map from
+normalized symptom to its KB entries. A lookup is then one pass over the search
+text, however many keywords and entries the knowledge base grows to.
+"""
+import json
+from collections import deque
+
+
+def normalize(symptom):
+    return " ".join(symptom.lower().split())
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher; values() reports every pattern found, overlaps included"""
+
+    def __init__(self, patterns):
+        # patterns: {pattern: value}; patterns are matched as given (callers lowercase)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, value in patterns.items():
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(value)
+
+        # Breadth-first fail links; each state inherits the outputs of its fail state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def values(self, text):
+        found = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+def load_keyword_map(path):
+    """symptom_keywords.json: {"kb symptom": ["keyword", ...]} -> {keyword: normalized symptom}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return keyword_map_from_groups(json.load(f))
+
+
+def keyword_map_from_groups(grouped):
+    if not isinstance(grouped, dict) or not all(isinstance(k, list) for k in grouped.values()):
+        raise ValueError("symptom keywords must map each symptom to a list of keywords")
+    return {
+        keyword.lower(): normalize(symptom)
+        for symptom, keywords in grouped.items()
+        for keyword in keywords
+    }
+
+
+class KnowledgeIndex:
+    def __init__(self, entries, keyword_map):
+        self.entries = entries
+        self.by_symptom = {}
+        for position, entry in enumerate(entries):
+            self.by_symptom.setdefault(normalize(entry["symptom"]), []).append(position)
+
+        patterns = {symptom: symptom for symptom in self.by_symptom}
+        patterns.update(keyword_map)
+        self.matcher = AhoCorasick(patterns)
+
+    def search(self, text):
+        """KB entries whose symptom or keywords occur in text, in knowledge base order"""
+        positions = set()
+        for symptom in self.matcher.values(text.lower()):
+            positions.update(self.by_symptom.get(symptom, ()))
+        return [self.entries[p] for p in sorted(positions)]
@@ -0,0 +1,175 @@
+"""
+Start-up of one backend process: database bootstrap, warm-up phases and readiness.
+
+create_app() (app.py) bootstraps any missing database in DB_DIR before it serves anything:
+a copy of the database of the same name committed in the backend directory, or else a fresh
+one from its init_*.sql script. The committed databases are only read, so the indexes,
+triggers and WAL mode the stores add never touch the files in the repository. It then runs
+the warm-up on a background task: pooled SQLite connections, the knowledge base and inventory
+indexes, and keep-alive connections to the STT/TTS/LLM hosts. /healthz reports 503 until the
+warm-up has finished, so a load balancer only sends calls to a worker that restarted
+mid-incident once its first call no longer pays for loading and handshakes.
+
+Time to the first served call (process start to the first call that finished "ok") is kept
+next to the phase timings and exported on /metrics.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from db import db_path, sqlite_uri
+from telemetry import log_event
+
+# (database file, env var that overrides its path, init script, table the script creates)
+DATABASES = [
+    ("patients.db", "PATIENTS_DB_PATH", "init_patients.sql", "patients"),
+    ("hospitals.db", "HOSPITALS_DB_PATH", "init_hospitals.sql", "hospitals"),
+    ("blood_plasma.db", "BLOOD_PLASMA_DB_PATH", "init_blood_plasma.sql", "blood_plasma"),
+    ("medications.db", "MEDICATIONS_DB_PATH", "init_medications.sql", "medications"),
+]
+
+
+def process_age():
+    """Seconds since this process started (Linux /proc); 0 elsewhere"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return max(0.0, time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+
+def has_table(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def bootstrap_database(path, script_path, table, seed_path=None):
+    """
+    Create the database at `path` unless it already has `table`: a copy of seed_path when that
+    exists (and is another file), else from the init script. Returns True when it was created
+    or seeded. A new file is built beside the target and linked into place, so a crash or a
+    second worker starting at the same time never sees it half seeded
+    """
+    with open(script_path, encoding="utf-8") as f:
+        script = f.read()
+
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            if has_table(conn, table):
+                return False
+            conn.executescript("BEGIN IMMEDIATE;\n" + script + "\nCOMMIT;")
+            return True
+        finally:
+            conn.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        conn = sqlite3.connect(tmp)
+        try:
+            if seed_path and os.path.exists(seed_path) and os.path.abspath(seed_path) != os.path.abspath(path):
+                seed = sqlite3.connect(sqlite_uri(seed_path, read_only=True), uri=True)
+                try:
+                    seed.backup(conn)
+                finally:
+                    seed.close()
+            else:
+                conn.executescript(script)
+                conn.commit()
+        finally:
+            conn.close()
+        # link() fails when the file exists: another worker got there first with the same script
+        os.link(tmp, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def bootstrap_databases(scripts_dir):
+    """
+    Bootstrap every database in DATABASES from the committed copy or init script in
+    scripts_dir; returns the paths that were created or seeded
+    """
+    created = []
+    for filename, env_var, script, table in DATABASES:
+        path = db_path(filename, env_var)
+        if bootstrap_database(path, os.path.join(scripts_dir, script), table, os.path.join(scripts_dir, filename)):
+            created.append(path)
+    return created
+
+
+class Lifecycle:
+    """Timed start-up phases, readiness, and the time to the first served call"""
+
+    def __init__(self):
+        self.begin()
+        self.phases = []  # {"phase", "ms", "error"} in the order they ran
+        self.ready_after = None
+        self.first_call_after = None
+        self.first_call_ms = None
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Measure from the start of this process: a forked gunicorn worker's own, not its master's"""
+        self.started = time.monotonic() - process_age()
+
+    @property
+    def ready(self):
+        return self.ready_after is not None
+
+    def uptime(self):
+        return time.monotonic() - self.started
+
+    def phase(self, name, fn, *args):
+        """
+        Run one start-up phase and record how long it took. A failing phase is logged and
+        recorded but does not stop start-up: a worker that never becomes ready during an
+        upstream outage would only take more capacity away
+        """
+        started = time.perf_counter()
+        error = None
+        try:
+            return fn(*args)
+        except Exception as e:
+            error = str(e)
+            log_event("startup_phase_failed", logging.WARNING, phase=name, error=error)
+            return None
+        finally:
+            ms = round((time.perf_counter() - started) * 1000, 1)
+            with self._lock:
+                self.phases.append({"phase": name, "ms": ms, "error": error})
+
+    def mark_ready(self):
+        with self._lock:
+            if self.ready_after is None:
+                self.ready_after = self.uptime()
+        log_event("app_ready", ready_after_s=round(self.ready_after, 3),
+                  phases_ms={p["phase"]: p["ms"] for p in self.phases})
+
+    def call_finished(self, outcome, seconds):
+        """Tracer hook: remembers when the first successful call finished"""
+        if outcome != "ok" or self.first_call_after is not None:
+            return
+        with self._lock:
+            if self.first_call_after is not None:
+                return
+            self.first_call_after = self.uptime()
+            self.first_call_ms = round(seconds * 1000, 1)
+        log_event("first_call_served", after_s=round(self.first_call_after, 3), call_ms=self.first_call_ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "uptime_s": round(self.uptime(), 3),
+                "ready_after_s": round(self.ready_after, 3) if self.ready else None,
+                "first_call_after_s": round(self.first_call_after, 3) if self.first_call_after is not None else None,
+                "first_call_ms": self.first_call_ms,
+                "phases": list(self.phases)
+            }
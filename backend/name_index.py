@@ -0,0 +1,504 @@
+"""
+Fuzzy patient-name index.
+
+Transcribed names rarely match the registry exactly: "Jon Smith" for John Smith, "约翰" for
+John, "Smith" for Emily Smith. Every patient's name is normalized (NameNormalizer: case,
+accents, titles, traditional characters, Chinese transliterations of Western names from
+name_aliases.json) into tokens and held in memory, and search(name, age) ranks patients in
+two steps:
+
+    1. each query token against the vocabulary of distinct name tokens: Dice overlap of
+       character trigrams (characters and bigrams for Chinese), or an equal phonetic key
+       (phonetic_key, Metaphone-like: Jon/John, Smyth/Smith, Catherine/Kathryn)
+    2. the patients holding the matched tokens, from sorted per-token posting arrays:
+       candidates come from the rarest query tokens, the other tokens are checked by binary
+       search, and each candidate is scored on how much of the query it matches, its own
+       unmatched tokens and its age
+
+The vocabulary stays in the thousands however many patients there are, so step 1 is
+cheap, and step 2 is a few numpy passes over the candidates.
+
+The index is built in segments: the main one from a full read of the patients table, and
+a small delta segment with every patient the changelog reported since
+(PatientStore.name_changes_since); changed and deleted patients are tombstoned in the main
+segment. A watcher polls PRAGMA data_version, and once the delta outgrows delta_limit the
+main segment is rebuilt from a fresh read.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+from telemetry import log_event
+
+TOKEN_RE = re.compile(r"[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff]+")
+TOKEN_MIN_SIMILARITY = 0.45  # Dice overlap below this is not the same token
+PHONETIC_SIMILARITY = 0.8  # same sound, different spelling
+MAX_TOKEN_MATCHES = 8  # vocabulary tokens kept per query token
+MATCH_SPREAD = 0.3  # ... and only those within this of the best one
+CANDIDATE_LIMIT = 2000  # query tokens holding more rows than this only re-score candidates
+MAX_CANDIDATES = 5000  # rows scored per query; past this the name is too common to tell patients apart
+SIMILAR_CACHE_SIZE = 50000
+ROW_TOKENS = 4  # tokens per name that count towards its score
+EXTRA_TOKEN_PENALTY = 0.15  # share of the score lost when none of the patient's tokens were said
+AGE_TOLERANCE = 1  # callers round; a year off still counts as the stated age...
+AGE_NEAR = 0.95  # ... scored a little below the exact one
+AGE_UNKNOWN = 0.9  # factor when the registry has no age
+AGE_MISMATCH = 0.6
+AGE_LIMIT = 200  # ages outside 0..AGE_LIMIT-1 count as unknown
+NO_ROWS = np.zeros(0, dtype=np.int32)
+MIN_SCORE = 0.3
+
+# 发音规则, applied in order (Metaphone-like, English spellings)
+PHONETIC_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r"ph", "f"), (r"sch", "sk"), (r"t?ch", "X"), (r"sh", "X"), (r"th", "0"), (r"ck", "k"),
+    (r"c(?=[eiy])", "s"), (r"c", "k"), (r"dg", "j"), (r"gh", ""), (r"g(?=[eiy])", "j"), (r"q", "k"),
+    (r"x", "ks"), (r"z", "s"), (r"v", "f"), (r"(?<=.)[why](?![aeiou])", ""),
+)]
+
+
+def phonetic_key(token):
+    """Consonant skeleton of a Latin token ("" for others): john/jon -> jn, smith/smyth -> sm0, michael -> mXl"""
+    if not token.isascii() or not token.isalpha():
+        return ""
+    word = token
+    if word[:2] in ("kn", "gn", "pn", "wr", "ps"):
+        word = word[1:]
+    elif word[0] == "x":
+        word = "s" + word[1:]
+    for pattern, replacement in PHONETIC_RULES:
+        word = pattern.sub(replacement, word)
+    if not word:
+        return ""
+    key = word[0] + re.sub(r"[aeiou]", "", word[1:])
+    return re.sub(r"(.)\1+", r"\1", key)
+
+
+def token_grams(token):
+    """Padded character trigrams of a Latin token; characters and bigrams of a Chinese one"""
+    if token.isascii():
+        padded = f"$${token}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    return set(token) | {token[i:i + 2] for i in range(len(token) - 1)}
+
+
+class NameNormalizer:
+    """Name -> tokens, the same way for the registry and for transcripts"""
+
+    def __init__(self, aliases):
+        self.titles = {title for title in aliases.get("titles", []) if title.isascii()}
+        self.cjk_titles = [title for title in aliases.get("titles", []) if not title.isascii()]
+        self.traditional = str.maketrans(aliases.get("traditional", {}))
+        self.transliterations = aliases.get("transliterations", {})
+        self.longest = max(map(len, self.transliterations), default=0)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def tokens(self, name):
+        text = unicodedata.normalize("NFKC", name or "").casefold()
+        if not text.isascii():
+            # José -> jose, 張 -> 张, 王先生 -> 王
+            text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+            text = text.translate(self.traditional)
+            for title in self.cjk_titles:
+                text = text.replace(title, " ")
+        text = text.replace("'", "").replace("’", "")
+        tokens = []
+        for run in TOKEN_RE.findall(text):
+            if run.isascii():
+                if run not in self.titles:
+                    tokens.append(run)
+            else:
+                tokens.extend(self._segment(run))
+        return list(dict.fromkeys(tokens))
+
+    def _segment(self, run):
+        """Greedy longest-match of known transliterations in a run of Chinese characters"""
+        tokens = []
+        rest = ""
+        i = 0
+        while i < len(run):
+            for size in range(min(self.longest, len(run) - i), 0, -1):
+                latin = self.transliterations.get(run[i:i + size])
+                if latin:
+                    break
+            else:
+                rest += run[i]
+                i += 1
+                continue
+            if rest:
+                tokens.append(rest)
+                rest = ""
+            tokens.append(latin)
+            i += size
+        if rest:
+            tokens.append(rest)
+        return tokens
+
+
+class Segment:
+    """Immutable token index over (id, name, age) rows, apart from its tombstones"""
+
+    def __init__(self, rows, normalizer):
+        self.ids = []
+        self.names = []
+        ages = array("h")
+        token_counts = array("B")  # capped at 255
+        row_tokens = array("i")  # ROW_TOKENS token ids per row, -1 padded
+        self.token_ids = {}
+        postings = []  # token id -> rows
+        seen = {}  # name -> (the one str kept for it, padded token ids, token count)
+        for patient_id, name, age in rows:
+            known = seen.get(name)
+            if known is None:
+                tokens = normalizer.tokens(name)
+                ids = [self.token_ids.setdefault(token, len(self.token_ids)) for token in tokens]
+                postings.extend(array("i") for _ in range(len(self.token_ids) - len(postings)))
+                known = seen[name] = (name, (ids + [-1] * ROW_TOKENS)[:ROW_TOKENS], min(len(ids), 255))
+            name, padded, count = known
+            if not count:
+                continue
+            row = len(self.ids)
+            self.ids.append(patient_id)
+            self.names.append(name)
+            ages.append(age if isinstance(age, int) and 0 <= age < AGE_LIMIT else -1)
+            token_counts.append(count)
+            row_tokens.extend(padded)
+            for token_id in padded:
+                if token_id < 0:
+                    break
+                postings[token_id].append(row)
+
+        self.ages = np.frombuffer(ages, dtype=np.int16) if ages else np.zeros(0, dtype=np.int16)
+        self.token_counts = np.frombuffer(token_counts, dtype=np.uint8).astype(np.float32)
+        # one contiguous array per token slot, gathered separately for the candidates
+        self.row_tokens = np.ascontiguousarray(np.frombuffer(row_tokens, dtype=np.int32).reshape(-1, ROW_TOKENS).T) \
+            if row_tokens else np.zeros((ROW_TOKENS, 0), dtype=np.int32)
+        self.slots_used = int(min(self.token_counts.max(initial=0), ROW_TOKENS))
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.vocab = list(self.token_ids)
+        self.postings = [np.frombuffer(rows_of_token, dtype=np.int32) for rows_of_token in postings]  # ascending
+        # the same rows ordered by (age, row) with their ages, so an age window is one slice
+        self.by_age = []
+        self.by_age_ages = []
+        for posting in self.postings:
+            posting_ages = self.ages[posting]
+            order = np.argsort(posting_ages, kind="stable")
+            self.by_age.append(posting[order])
+            self.by_age_ages.append(posting_ages[order])
+
+        # 词表层面的 trigram / 发音 索引
+        gram_postings = defaultdict(list)
+        phonetic = defaultdict(list)
+        gram_counts = []
+        for i, token in enumerate(self.vocab):
+            grams = token_grams(token)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                gram_postings[gram].append(i)
+            key = phonetic_key(token)
+            if key:
+                phonetic[key].append(i)
+        self.gram_counts = np.array(gram_counts, dtype=np.float32)
+        self.gram_postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in gram_postings.items()}
+        self.phonetic = dict(phonetic)
+        self._similar = {}  # query token -> similar_tokens(); the vocabulary never changes
+
+        # id -> row, without a million-entry dict: hash(id) sorted, with the row it came from
+        hashes = np.fromiter((hash(patient_id) for patient_id in self.ids), dtype=np.int64, count=len(self.ids))
+        self._hash_order = np.argsort(hashes, kind="stable").astype(np.int32)
+        self._hashes = hashes[self._hash_order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows_of(self, patient_id):
+        """Rows holding this id (normally at most one)"""
+        h = hash(patient_id)
+        lo = np.searchsorted(self._hashes, h, side="left")
+        hi = np.searchsorted(self._hashes, h, side="right")
+        return [int(row) for row in self._hash_order[lo:hi] if self.ids[row] == patient_id]
+
+    def similar_tokens(self, token, grams, key):
+        """[(vocabulary index, similarity)] for one query token, best first"""
+        matched = self._similar.get(token)
+        if matched is not None:
+            return matched
+        scores = {}
+        hits = [self.gram_postings[gram] for gram in grams if gram in self.gram_postings]
+        if hits:
+            shared = np.bincount(np.concatenate(hits), minlength=len(self.vocab)).astype(np.float32)
+            dice = 2 * shared / (len(grams) + self.gram_counts)
+            for i in np.flatnonzero(dice >= TOKEN_MIN_SIMILARITY):
+                scores[int(i)] = float(dice[i])
+        for i in self.phonetic.get(key, ()) if key else ():
+            scores[i] = max(scores.get(i, 0.0), PHONETIC_SIMILARITY)
+        exact = self.token_ids.get(token)
+        if exact is not None:
+            scores[exact] = 1.0
+        matched = sorted(scores.items(), key=lambda item: -item[1])[:MAX_TOKEN_MATCHES]
+        if matched:
+            matched = [(i, similarity) for i, similarity in matched if similarity >= matched[0][1] - MATCH_SPREAD]
+        if len(self._similar) >= SIMILAR_CACHE_SIZE:
+            self._similar.clear()
+        self._similar[token] = matched
+        return matched
+
+    def rows(self, v, age=None):
+        """
+        Rows holding vocabulary token v as (rows without an age, rows of about `age`), array
+        views; (empty, all of them) without an age
+        """
+        if age is None:
+            return NO_ROWS, self.postings[v]
+        rows = self.by_age[v]
+        unknown, lo, hi = np.searchsorted(self.by_age_ages[v], (0, age - AGE_TOLERANCE, age + AGE_TOLERANCE + 1))
+        return rows[:unknown], rows[lo:hi]
+
+    def search(self, query, age, limit):
+        """[(score, row)] best first; query is [(token, grams, phonetic key)]"""
+        matches = [self.similar_tokens(*term) for term in query]
+        if age is not None:
+            # 先只看年龄相符的; a misheard age falls back to every age, scored down
+            found = self._search(matches, age, limit, window=True)
+            if found:
+                return found
+        return self._search(matches, age, limit, window=False)
+
+    def _search(self, matches, age, limit, window):
+        rows = [[self.rows(v, age if window else None) for v, _ in matched] for matched in matches]
+        sizes = [sum(len(unknown) + len(known) for unknown, known in parts) for parts in rows]
+        present = sorted((size, i) for i, size in enumerate(sizes) if size)
+        if not present:
+            return []
+        # 候选来自罕见的 token; a misheard token then only costs its own share of the score
+        seeds = [i for size, i in present if size <= CANDIDATE_LIMIT] or [present[0][1]]
+        known = [rows_ for i in seeds for _, rows_ in rows[i] if len(rows_)]
+        unknown = [rows_ for i in seeds for rows_, _ in rows[i] if len(rows_)]
+        overlap = len(seeds) > 1 or len(matches[seeds[0]]) > 1
+        if sum(map(len, known)) + sum(map(len, unknown)) <= CANDIDATE_LIMIT:
+            return self._score(matches, self._candidates(known + unknown, overlap), age, limit)
+
+        # 候选很多: patients without an age score at most AGE_UNKNOWN times the best name
+        # score, so they are only read when the ones with the age leave room for them
+        found = self._score(matches, self._candidates(known, overlap), age, limit) if known else []
+        ceiling = AGE_UNKNOWN * sum(matched[0][1] for matched in matches if matched) / len(matches)
+        if unknown and not (len(found) == limit and found[-1][0] >= ceiling):
+            found += self._score(matches, self._candidates(unknown, overlap), age, limit)
+            found = sorted(found, reverse=True)[:limit]
+        return found
+
+    def _candidates(self, parts, overlap):
+        """Live rows out of row arrays, at most MAX_CANDIDATES; `overlap` when the arrays can share rows"""
+        candidates = np.concatenate(parts)[:MAX_CANDIDATES] if len(parts) > 1 else parts[0][:MAX_CANDIDATES]
+        if overlap:
+            candidates = np.unique(candidates)
+        return candidates[self.alive[candidates]]
+
+    def _score(self, matches, candidates, age, limit):
+        if not len(candidates):
+            return []
+        # 每个候选的 token 直接查表: similarity of each of its tokens to each query token
+        slots = [self.row_tokens[j][candidates] for j in range(self.slots_used)]
+        best = np.zeros((len(matches), len(candidates)), dtype=np.float32)
+        for i, matched in enumerate(matches):
+            lookup = np.zeros(len(self.vocab) + 1, dtype=np.float32)  # index -1 (padding) -> 0
+            for v, similarity in matched:
+                lookup[v] = similarity
+            for slot in slots:
+                np.maximum(best[i], lookup[slot], out=best[i])
+
+        said = np.count_nonzero(best, axis=0).astype(np.float32)
+        counts = self.token_counts[candidates]
+        unmatched = np.maximum(counts - said, 0) / counts
+        scores = best.sum(axis=0) / len(matches) * (1 - EXTRA_TOKEN_PENALTY * unmatched)
+        if age is not None:
+            # 年龄系数查表, ages[row] == -1 (unknown) reads the last entry
+            factors = np.full(AGE_LIMIT + 1, AGE_MISMATCH, dtype=np.float32)
+            factors[max(age - AGE_TOLERANCE, 0):age + AGE_TOLERANCE + 1] = AGE_NEAR
+            factors[age] = 1.0
+            factors[-1] = AGE_UNKNOWN
+            scores *= factors[self.ages[candidates]]
+
+        k = min(limit, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), int(candidates[i])) for i in top if scores[i] >= MIN_SCORE]
+
+
+class PatientNameIndex:
+    def __init__(self, store, aliases_path, poll_interval=2.0, delta_limit=5000):
+        self.store = store
+        self.normalizer = NameNormalizer.from_file(aliases_path)
+        self.poll_interval = poll_interval
+        self.delta_limit = delta_limit
+        self._state = None  # (main segment, delta segment); replaced, never mutated (but for tombstones)
+        self._delta_rows = {}  # id -> (id, name, age) changed since the main segment was built
+        self._cursor = 0
+        self._data_version = None  # PRAGMA data_version seen at the last load/poll
+        self._lock = threading.Lock()
+        self._terms = {}
+        self.loaded_at = None
+        self.load_seconds = None
+        self.full_loads = 0
+        self.deltas = 0
+
+    def query_terms(self, name):
+        """[(token, grams, phonetic key)] for a transcribed name; callers repeat names, so they are cached"""
+        terms = self._terms.get(name)
+        if terms is None:
+            terms = [(token, token_grams(token), phonetic_key(token)) for token in self.normalizer.tokens(name)]
+            if len(self._terms) >= SIMILAR_CACHE_SIZE:
+                self._terms.clear()
+            self._terms[name] = terms
+        return terms
+
+    def search(self, name, age=None, limit=5):
+        """
+        Patients whose name sounds or spells like `name`, best first:
+        [{"id", "name", "age", "score"}], scores in (0, 1] (1 = same tokens, same age)
+        """
+        query = self.query_terms(name)
+        if not query:
+            return []
+        try:
+            age = int(age) if age not in (None, "") else None
+        except (TypeError, ValueError):
+            age = None
+        if age is not None and not 0 <= age < AGE_LIMIT:
+            age = None
+        segments = self._segments()
+        if segments is None:
+            return []
+        main, delta = segments
+
+        results = {}
+        for segment in (delta, main):  # the delta has the newer version of a patient
+            if not len(segment):
+                continue
+            for score, row in segment.search(query, age, limit):
+                patient_id = segment.ids[row]
+                if patient_id not in results:
+                    age_value = int(segment.ages[row])
+                    results[patient_id] = {"id": patient_id, "name": segment.names[row],
+                                           "age": age_value if age_value >= 0 else None, "score": round(score, 4)}
+        return sorted(results.values(), key=lambda result: -result["score"])[:limit]
+
+    def best(self, name, age=None, min_score=0.8, margin=0.05):
+        """
+        The one candidate clearly meant by `name`: scoring min_score or more and at least
+        `margin` ahead of the next one. None when nothing matches or the name is ambiguous
+        """
+        candidates = self.search(name, age, limit=2)
+        if not candidates or candidates[0]["score"] < min_score:
+            return None
+        if len(candidates) > 1 and candidates[0]["score"] - candidates[1]["score"] < margin:
+            return None
+        return candidates[0]
+
+    def poll(self):
+        """Apply committed patient changes; returns the number of patients updated (None when nothing changed)"""
+        with self._lock:
+            if self._state is None:
+                self._load()
+                return None
+            version = self.store.data_version()
+            if version == self._data_version:
+                return None
+            self._data_version = version
+            try:
+                changes = self.store.name_changes_since(self._cursor)
+            except sqlite3.Error as e:
+                log_event("patient_changelog_unavailable", logging.WARNING, fallback="reload", error=str(e))
+                changes = None
+            if changes is None:
+                self._load()
+                return None
+            cursor, rows, removed = changes
+            if cursor == self._cursor:
+                return None
+            self._cursor = cursor
+            return self._apply(rows, removed)
+
+    def watch(self, sleep):
+        """
+        Poll loop for a background task, building the index first thing; `sleep` is
+        socketio.sleep so it also yields under eventlet
+        """
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                log_event("name_index_watcher_failed", logging.ERROR, error=str(e))
+            sleep(self.poll_interval)
+
+    def stats(self):
+        state = self._state
+        return {
+            "patients": (int(state[0].alive.sum()) + len(state[1])) if state else 0,
+            "tokens": len(state[0].vocab) if state else 0,
+            "delta": len(state[1]) if state else 0,
+            "cursor": self._cursor,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "full_loads": self.full_loads,
+            "deltas": self.deltas,
+            "poll_interval": self.poll_interval,
+        }
+
+    def _segments(self):
+        """(main, delta); None while another thread builds the first index (a call does not wait for it)"""
+        state = self._state
+        if state is None:
+            if not self._lock.acquire(blocking=False):
+                return None
+            try:
+                if self._state is None:
+                    self._load()
+            finally:
+                self._lock.release()
+            state = self._state
+        return state
+
+    def _load(self):
+        started = time.perf_counter()
+        self._data_version = self.store.data_version()
+        try:
+            self._cursor, rows = self.store.names()
+        except sqlite3.Error as e:
+            log_event("patient_changelog_unavailable", logging.WARNING, fallback="index_without", error=str(e))
+            self._cursor, rows = 0, self.store.all_names()
+        self._delta_rows = {}
+        self._state = (Segment(rows, self.normalizer), Segment([], self.normalizer))
+        self.full_loads += 1
+        self.loaded_at = time.time()
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        log_event("name_index_loaded", patients=len(self._state[0]), seconds=self.load_seconds)
+
+    def _apply(self, rows, removed):
+        main, _ = self._state
+        for patient_id in removed:
+            self._delta_rows.pop(patient_id, None)
+        for row in rows:
+            self._delta_rows[row[0]] = tuple(row)
+        if len(self._delta_rows) > self.delta_limit:
+            self._load()
+            return len(rows) + len(removed)
+        # 新的 delta 先生效, then the old main rows are tombstoned (search prefers the delta meanwhile)
+        self._state = (main, Segment(self._delta_rows.values(), self.normalizer))
+        for patient_id in [row[0] for row in rows] + list(removed):
+            for row in main.rows_of(patient_id):
+                main.alive[row] = False
+        self.deltas += 1
+        log_event("name_index_updated", changed=len(rows), removed=len(removed))
+        return len(rows) + len(removed)
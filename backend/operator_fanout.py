@@ -0,0 +1,75 @@
+"""
+Fan-out of pipeline events to operator consoles.
+
+Operators join one Socket.IO room on connect, so a broadcast is a single room emit: the
+packet is encoded once and written to every operator socket, instead of one emit (and
+one JSON encoding) per operator sid.
+
+With a coalescing window (OPERATOR_CASE_UPDATE_MS), the events of one request that
+arrive within the window are merged into a single `case_update` message:
+
+    {"req_id": "...", "events": [["transcription", {...}], ["patient_info", {...}], ...]}
+
+Streamed events (response_delta, audio_chunk, audio_binary, transcription_partial) are never
+held back, nor kept in the case store, which has the finished text; any pending update for the
+same request is flushed first, so operators still see events in order. Only events that leave
+out the same sender (skip_sid) are merged; an event with another one flushes the pending
+update first.
+"""
+import threading
+
+OPERATORS_ROOM = "operators"
+STREAMED_EVENTS = {"response_delta", "audio_chunk", "audio_binary", "transcription_partial"}
+
+
+class OperatorFanout:
+    def __init__(self, socketio, room=OPERATORS_ROOM, coalesce_window=0):
+        self.socketio = socketio
+        self.room = room
+        self.coalesce_window = coalesce_window
+        self._pending = {}  # req_id -> {"events": [...], "skip_sid": sid}
+        self._lock = threading.Lock()
+
+    def broadcast(self, event_name, data, exclude_sid=None):
+        self.socketio.emit(event_name, data, to=self.room, skip_sid=exclude_sid)
+
+    def publish(self, event_name, data, exclude_sid=None):
+        """Broadcast one pipeline event, merged into the request's case_update when coalescing"""
+        req_id = data.get("req_id") if isinstance(data, dict) else None
+        if not self.coalesce_window or req_id is None:
+            self.broadcast(event_name, data, exclude_sid)
+            return
+
+        if event_name in STREAMED_EVENTS:
+            self.flush(req_id)
+            self.broadcast(event_name, data, exclude_sid)
+            return
+
+        with self._lock:
+            pending = self._pending.get(req_id)
+            if pending is not None and pending["skip_sid"] != exclude_sid:
+                # A different sender to leave out: send what is merged so far, in order, and start over
+                del self._pending[req_id]
+                flushed, pending = pending, None
+            else:
+                flushed = None
+            if pending is None:
+                pending = self._pending[req_id] = {"events": [], "skip_sid": exclude_sid}
+                start_timer = True
+            else:
+                start_timer = False
+            pending["events"].append([event_name, data])
+        if flushed:
+            self.broadcast("case_update", {"req_id": req_id, "events": flushed["events"]}, flushed["skip_sid"])
+        if start_timer:
+            self.socketio.start_background_task(self._flush_later, req_id)
+
+    def _flush_later(self, req_id):
+        self.socketio.sleep(self.coalesce_window)
+        self.flush(req_id)
+
+    def flush(self, req_id):
+        with self._lock:
+            pending = self._pending.pop(req_id, None)
+        if pending:
+            self.broadcast("case_update", {"req_id": req_id, "events": pending["events"]}, pending["skip_sid"])
@@ -0,0 +1,141 @@
+"""
+Patient record lookups over pooled, read-only patients.db connections
+
+patients.db also gets a patient_changelog table, filled by triggers with the id of every
+inserted, updated or deleted patient, so the in-memory name index (name_index.py) can pick
+up registry changes without re-reading the table.
+"""
+import json
+import threading
+
+from db import ConnectionPool, db_path, read_transaction
+
+INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_patients_name_age ON patients (name, age)"
+
+BY_NAME_SQL = "SELECT name, age, medical_history, allergies FROM patients WHERE name = ?"
+BY_NAME_AGE_SQL = "SELECT name, age, medical_history, allergies FROM patients WHERE name = ? AND age = ?"
+BY_ID_SQL = "SELECT name, age, medical_history, allergies FROM patients WHERE id = ?"
+
+NAMES_SQL = "SELECT id, name, age FROM patients"
+NAMES_BY_ID_SQL = NAMES_SQL + " WHERE id IN (SELECT value FROM json_each(?))"
+
+CHANGELOG_KEEP = 10000  # entries kept; a reader further behind reloads everything
+
+# INSERT OR REPLACE deletes the old row without firing the delete trigger, but the insert
+# trigger logs the same id, which is all a reader needs
+CHANGELOG_SQL = f"""
+CREATE TABLE IF NOT EXISTS patient_changelog (seq INTEGER PRIMARY KEY AUTOINCREMENT, patient_id TEXT);
+CREATE TRIGGER IF NOT EXISTS patients_changelog_insert AFTER INSERT ON patients BEGIN
+    INSERT INTO patient_changelog (patient_id) VALUES (NEW.id);
+    DELETE FROM patient_changelog WHERE seq <= (SELECT max(seq) FROM patient_changelog) - {CHANGELOG_KEEP};
+END;
+CREATE TRIGGER IF NOT EXISTS patients_changelog_update AFTER UPDATE OF id, name, age ON patients BEGIN
+    INSERT INTO patient_changelog (patient_id) VALUES (NEW.id);
+    INSERT INTO patient_changelog (patient_id) SELECT OLD.id WHERE OLD.id IS NOT NEW.id;
+    DELETE FROM patient_changelog WHERE seq <= (SELECT max(seq) FROM patient_changelog) - {CHANGELOG_KEEP};
+END;
+CREATE TRIGGER IF NOT EXISTS patients_changelog_delete AFTER DELETE ON patients BEGIN
+    INSERT INTO patient_changelog (patient_id) VALUES (OLD.id);
+    DELETE FROM patient_changelog WHERE seq <= (SELECT max(seq) FROM patient_changelog) - {CHANGELOG_KEEP};
+END;
+"""
+
+
+def ensure_indexes(conn):
+    conn.execute(INDEX_SQL)
+
+
+def ensure_changelog(conn):
+    """Create the patient_changelog table and the triggers that fill it"""
+    conn.executescript(CHANGELOG_SQL)
+
+
+def setup_patients(conn):
+    ensure_indexes(conn)
+    ensure_changelog(conn)
+
+
+def _record(row):
+    return {
+        "name": row[0],
+        "age": row[1],
+        "medical_history": row[2],
+        "allergies": row[3]
+    }
+
+
+class PatientStore:
+    def __init__(self, path=None):
+        self.pool = ConnectionPool(
+            path or db_path("patients.db", "PATIENTS_DB_PATH"),
+            setup=setup_patients,
+            read_only=True,
+            wal=True
+        )
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+
+    def find(self, name, age=None):
+        """
+        Look up a patient by name (and age when known).
+        Returns a dict with name/age/medical_history/allergies, or None
+        """
+        with self.pool.connection() as conn:
+            if age:
+                row = conn.execute(BY_NAME_AGE_SQL, (name, age)).fetchone()
+            else:
+                row = conn.execute(BY_NAME_SQL, (name,)).fetchone()
+
+        if row:
+            return _record(row)
+        return None
+
+    def get(self, patient_id):
+        """The patient with this id, in the same shape as find(); None if there is none"""
+        with self.pool.connection() as conn:
+            row = conn.execute(BY_ID_SQL, (patient_id,)).fetchone()
+        return _record(row) if row else None
+
+    def data_version(self):
+        """
+        PRAGMA data_version: changes whenever another connection commits. The value is per
+        connection, so it is always read on the store's own connection outside the pool
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = self.pool.dedicated()
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def names(self):
+        """(cursor, [(id, name, age)]): every patient plus the changelog position it reflects"""
+        with self.pool.connection() as conn, read_transaction(conn):
+            cursor = conn.execute("SELECT coalesce(max(seq), 0) FROM patient_changelog").fetchone()[0]
+            return cursor, conn.execute(NAMES_SQL).fetchall()
+
+    def name_changes_since(self, cursor):
+        """
+        (cursor, [(id, name, age)], removed_ids) for the patients touched since `cursor`;
+        None when the changelog no longer reaches back that far (reload everything)
+        """
+        with self.pool.connection() as conn, read_transaction(conn):
+            low, high = conn.execute("SELECT min(seq), max(seq) FROM patient_changelog").fetchone()
+            high = high or 0
+            # 日志被截断或数据库被替换
+            if high < cursor or (low is not None and low > cursor + 1):
+                return None
+            changed = {patient_id for (patient_id,) in conn.execute(
+                "SELECT patient_id FROM patient_changelog WHERE seq > ?", (cursor,))}
+            changed.discard(None)
+            rows = conn.execute(NAMES_BY_ID_SQL, (json.dumps(sorted(changed)),)).fetchall() if changed else []
+        removed = changed - {row[0] for row in rows}
+        return high, rows, sorted(removed)
+
+    def all_names(self):
+        """[(id, name, age)] of every patient, for a patients.db without the changelog"""
+        with self.pool.connection() as conn:
+            return conn.execute(NAMES_SQL).fetchall()
+
+    def close(self):
+        with self._version_lock:
+            self._version_conn = None
+        self.pool.close_all()
@@ -0,0 +1,157 @@
+"""
+Operator prompt assembly.
+
+The hospital section of the operator prompt is rendered once per hospital and cached
+under the inventory version (InventoryView.version), so a call only re-renders
+after the inventory changed. Prompts are assembled with list joins and capped by a token
+budget: hospitals are ranked by the stock that matters for the case severity (and by
+distance when known) and the lowest-ranked ones are left out first.
+
+Tokens are estimated at ~4 characters each, which is close enough for English prompts
+to keep the prompt inside its budget without loading a tokenizer.
+"""
+import threading
+from collections import deque
+
+from hospital_index import STOCK_WEIGHTS, stock_score
+from telemetry import log_event
+
+CHARS_PER_TOKEN = 4
+SEVERITY_ORDER = ["Critical", "Moderate", "Stable"]
+
+HOSPITALS_HEADER = "\n\nAvailable Hospital Resources:\n"
+OPERATOR_INSTRUCTION = ("\nBased on the patient's condition, medical history, and available resources, "
+                        "recommend the best hospital and any resource preparations needed.")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def case_severity(knowledge_results, default="Critical"):
+    """Most severe level among the knowledge base matches; unknown cases are treated as Critical"""
+    levels = [r.get("severity") for r in knowledge_results or [] if r.get("severity") in STOCK_WEIGHTS]
+    if not levels:
+        return default
+    return min(levels, key=SEVERITY_ORDER.index)
+
+
+def render_hospital(hosp):
+    lines = [f"\n{hosp['name']} ({hosp['address']}):",
+             f"  Blood Plasma: {len(hosp['blood_plasma'])} types available"]
+    for plasma in hosp["blood_plasma"][:3]:  # Show first 3
+        lines.append(f"    - {plasma['type']}: {plasma['stock']} units")
+    lines.append(f"  Medications: {len(hosp['medications'])} available")
+    for med in hosp["medications"][:3]:  # Show first 3
+        lines.append(f"    - {med['name']} ({med['type']}): {med['stock']} units")
+    return "\n".join(lines) + "\n"
+
+
+class HospitalBlock:
+    """One hospital's rendered prompt text with the numbers ranking needs"""
+    __slots__ = ("id", "text", "tokens", "plasma_units", "medication_units")
+
+    def __init__(self, hosp):
+        self.id = hosp["id"]
+        self.text = render_hospital(hosp)
+        self.tokens = estimate_tokens(self.text)
+        self.plasma_units = sum(p["stock"] for p in hosp["blood_plasma"])
+        self.medication_units = sum(m["stock"] for m in hosp["medications"])
+
+    def score(self, severity, distance_km=None):
+        return stock_score(self.plasma_units, self.medication_units, severity, distance_km)
+
+
+class PromptBuilder:
+    def __init__(self, token_budget=2000, window=200):
+        self.token_budget = token_budget
+        self._version = None
+        self._blocks = {}  # hospital id -> HospitalBlock for self._version
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.cache_hits = 0
+        self.truncated = 0
+        self.recent = deque(maxlen=window)
+
+    def hospital_blocks(self, hospital_data, version):
+        """(blocks, cache_hit): rendered blocks, reused while the inventory version is unchanged"""
+        with self._lock:
+            if version is None or version != self._version:
+                self._version = version
+                self._blocks = {}
+            cached = self._blocks
+        blocks = []
+        cache_hit = True
+        for hosp in hospital_data:
+            block = cached.get(hosp["id"])
+            if block is None:
+                block = cached[hosp["id"]] = HospitalBlock(hosp)
+                cache_hit = False
+            blocks.append(block)
+        return blocks, cache_hit
+
+    def rank(self, blocks, severity, distances=None):
+        """Blocks best first; `distances` maps hospital id -> km when the caller's location is known"""
+        distances = distances or {}
+        return sorted(blocks, key=lambda b: -b.score(severity, distances.get(b.id)))
+
+    def operator_prompt(self, enhanced_prompt, hospital_data, version, severity, distances=None, ranked=False):
+        """
+        (prompt, details): the case prompt plus as many ranked hospitals as the token budget allows.
+        ranked=True keeps the order of hospital_data (already ranked by HospitalIndex.nearest)
+        """
+        blocks, cache_hit = self.hospital_blocks(hospital_data, version)
+        omitted_note = "\n({} more hospitals with less relevant stock omitted)\n"
+        available = self.token_budget - estimate_tokens(
+            enhanced_prompt + HOSPITALS_HEADER + OPERATOR_INSTRUCTION + omitted_note.format(len(blocks))
+        )
+
+        parts = [enhanced_prompt, HOSPITALS_HEADER]
+        included = 0
+        distances = distances or {}
+        for block in (blocks if ranked else self.rank(blocks, severity, distances)):
+            # Distance depends on the caller, so it is appended to the cached block per request
+            distance = distances.get(block.id)
+            extra = f"  Distance from caller: {distance:.1f} km\n" if distance is not None else ""
+            tokens = block.tokens + estimate_tokens(extra)
+            # The best hospital always goes in, even when the case description alone fills the budget
+            if included and tokens > available:
+                break
+            parts.append(block.text)
+            if extra:
+                parts.append(extra)
+            available -= tokens
+            included += 1
+        omitted = len(blocks) - included
+        if omitted:
+            parts.append(omitted_note.format(omitted))
+        parts.append(OPERATOR_INSTRUCTION)
+
+        details = {"hospitals": included, "hospitals_total": len(hospital_data), "severity": severity,
+                   "cache_hit": cache_hit, "inventory_version": version}
+        return "".join(parts), details
+
+    def report(self, req_id, prompt, build_seconds, **details):
+        """Record and log the size and build time of one request's prompt"""
+        entry = {"req_id": req_id, "chars": len(prompt), "tokens": estimate_tokens(prompt),
+                 "build_ms": round(build_seconds * 1000, 3), **details}
+        with self._lock:
+            self.builds += 1
+            self.cache_hits += bool(details.get("cache_hit"))
+            self.truncated += details.get("hospitals_total", 0) > details.get("hospitals", 0)
+            self.recent.append(entry)
+        log_event("prompt_built", **entry)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            recent = list(self.recent)
+            return {
+                "token_budget": self.token_budget,
+                "builds": self.builds,
+                "hospital_cache_hits": self.cache_hits,
+                "truncated": self.truncated,
+                "avg_tokens": round(sum(e["tokens"] for e in recent) / len(recent), 1) if recent else None,
+                "avg_build_ms": round(sum(e["build_ms"] for e in recent) / len(recent), 3) if recent else None,
+                "recent": recent[-20:],
+            }
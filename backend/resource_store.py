@@ -0,0 +1,189 @@
+"""
+Hospital resource store.
+
+hospitals.db, blood_plasma.db and medications.db are ATTACHed behind one pooled
+connection, so reading every hospital with its in-stock plasma and medications
+costs two queries instead of 1 + 2N fresh connections.
+
+Each database also gets an inventory_changelog table, filled by triggers with the
+hospital_id of every inserted, updated or deleted row. Readers keep a cursor (the last
+seq seen per database) and ask for the hospitals changed since, instead of re-reading
+everything (see InventoryView).
+"""
+import json
+import threading
+
+from db import ConnectionPool, db_path, read_transaction
+
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS plasma.idx_blood_plasma_hospital_stock ON blood_plasma (hospital_id, stock_quantity);
+CREATE INDEX IF NOT EXISTS meds.idx_medications_hospital_stock ON medications (hospital_id, stock_quantity);
+"""
+
+HOSPITALS_SQL = "SELECT id, name, address, latitude, longitude FROM hospitals"
+
+# 一次查询取出所有医院的库存, kind 区分血浆('b')和药品('m')
+RESOURCES_SQL = """
+SELECT 'b', hospital_id, blood_type, volume, NULL, stock_quantity, expiration_date
+FROM plasma.blood_plasma WHERE stock_quantity > 0
+UNION ALL
+SELECT 'm', hospital_id, name, type, dosage, stock_quantity, NULL
+FROM meds.medications WHERE stock_quantity > 0
+"""
+HOSPITALS_BY_ID_SQL = HOSPITALS_SQL + " WHERE id IN (SELECT value FROM json_each(?))"
+
+RESOURCES_BY_ID_SQL = """
+SELECT 'b', hospital_id, blood_type, volume, NULL, stock_quantity, expiration_date
+FROM plasma.blood_plasma WHERE stock_quantity > 0 AND hospital_id IN (SELECT value FROM json_each(?))
+UNION ALL
+SELECT 'm', hospital_id, name, type, dosage, stock_quantity, NULL
+FROM meds.medications WHERE stock_quantity > 0 AND hospital_id IN (SELECT value FROM json_each(?))
+"""
+
+# 变更日志: schema -> (table, column holding the hospital id)
+CHANGELOG_TABLES = {
+    "main": ("hospitals", "id"),
+    "plasma": ("blood_plasma", "hospital_id"),
+    "meds": ("medications", "hospital_id"),
+}
+CHANGELOG_KEEP = 10000  # entries kept per database; a reader further behind reloads everything
+
+CHANGELOG_SQL = """
+CREATE TABLE IF NOT EXISTS {schema}.inventory_changelog (seq INTEGER PRIMARY KEY AUTOINCREMENT, hospital_id TEXT);
+CREATE TRIGGER IF NOT EXISTS {schema}.{table}_changelog_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO inventory_changelog (hospital_id) VALUES (NEW.{column});
+    {prune}
+END;
+CREATE TRIGGER IF NOT EXISTS {schema}.{table}_changelog_update AFTER UPDATE ON {table} BEGIN
+    INSERT INTO inventory_changelog (hospital_id) VALUES (NEW.{column});
+    INSERT INTO inventory_changelog (hospital_id) SELECT OLD.{column} WHERE OLD.{column} IS NOT NEW.{column};
+    {prune}
+END;
+CREATE TRIGGER IF NOT EXISTS {schema}.{table}_changelog_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO inventory_changelog (hospital_id) VALUES (OLD.{column});
+    {prune}
+END;
+"""
+CHANGELOG_PRUNE = ("DELETE FROM inventory_changelog "
+                   f"WHERE seq <= (SELECT max(seq) FROM inventory_changelog) - {CHANGELOG_KEEP};")
+
+
+def ensure_indexes(conn):
+    """Create the hospital_id/stock_quantity indexes"""
+    conn.executescript(INDEX_SQL)
+
+
+def ensure_changelog(conn):
+    """Create the inventory_changelog tables and the triggers that fill them"""
+    for schema, (table, column) in CHANGELOG_TABLES.items():
+        conn.executescript(CHANGELOG_SQL.format(schema=schema, table=table, column=column, prune=CHANGELOG_PRUNE))
+
+
+def setup_inventory(conn):
+    ensure_indexes(conn)
+    ensure_changelog(conn)
+
+
+class ResourceStore:
+    def __init__(self, hospitals_path=None, plasma_path=None, medications_path=None):
+        self.pool = ConnectionPool(
+            hospitals_path or db_path("hospitals.db", "HOSPITALS_DB_PATH"),
+            attach={
+                "plasma": plasma_path or db_path("blood_plasma.db", "BLOOD_PLASMA_DB_PATH"),
+                "meds": medications_path or db_path("medications.db", "MEDICATIONS_DB_PATH"),
+            },
+            setup=setup_inventory,
+            read_only=True,
+            wal=True
+        )
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+
+    def hospitals_with_resources(self, hospital_ids=None):
+        """
+        All hospitals (or just `hospital_ids`) with their in-stock blood plasma and
+        medications, in the same shape query_hospitals_with_resources has always returned
+        """
+        with self.pool.connection() as conn:
+            return self._read(conn, hospital_ids)
+
+    def _read(self, conn, hospital_ids=None):
+        if hospital_ids is None:
+            hospitals = conn.execute(HOSPITALS_SQL)
+            resources = conn.execute(RESOURCES_SQL)
+        else:
+            ids = json.dumps(list(hospital_ids))
+            hospitals = conn.execute(HOSPITALS_BY_ID_SQL, (ids,))
+            resources = conn.execute(RESOURCES_BY_ID_SQL, (ids, ids))
+
+        hospital_data = []
+        by_id = {}
+        for hosp_id, name, address, lat, lon in hospitals:
+            hosp = {
+                "id": hosp_id,
+                "name": name,
+                "address": address,
+                "coordinates": {"lat": lat, "lon": lon},
+                "blood_plasma": [],
+                "medications": []
+            }
+            by_id[hosp_id] = hosp
+            hospital_data.append(hosp)
+
+        for kind, hosp_id, a, b, c, stock, expiration in resources:
+            hosp = by_id.get(hosp_id)
+            if hosp is None:
+                continue
+            if kind == "b":
+                hosp["blood_plasma"].append({"type": a, "volume": b, "stock": stock, "expiration": expiration})
+            else:
+                hosp["medications"].append({"name": a, "type": b, "dosage": c, "stock": stock})
+
+        return hospital_data
+
+    def data_versions(self):
+        """
+        PRAGMA data_version of the three databases: changes whenever another connection
+        commits to one of them. The values are per connection, so they are always read on the
+        store's own connection outside the pool
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = self.pool.dedicated()
+            conn = self._version_conn
+            return tuple(conn.execute(f"PRAGMA {schema}.data_version").fetchone()[0] for schema in CHANGELOG_TABLES)
+
+    def snapshot(self):
+        """(cursor, hospitals): every hospital plus the changelog position it reflects, read in one transaction"""
+        with self.pool.connection() as conn, read_transaction(conn):
+            cursor = {schema: conn.execute(f"SELECT coalesce(max(seq), 0) FROM {schema}.inventory_changelog").fetchone()[0]
+                      for schema in CHANGELOG_TABLES}
+            return cursor, self._read(conn)
+
+    def changes_since(self, cursor):
+        """
+        (cursor, hospitals, removed_ids) for the hospitals touched since `cursor`, read in one
+        transaction; None when the changelog no longer reaches back that far (reload everything)
+        """
+        with self.pool.connection() as conn, read_transaction(conn):
+            new_cursor = {}
+            changed = set()
+            for schema in CHANGELOG_TABLES:
+                last = cursor.get(schema, 0)
+                low, high = conn.execute(f"SELECT min(seq), max(seq) FROM {schema}.inventory_changelog").fetchone()
+                high = high or 0
+                # 日志被截断或数据库被替换
+                if high < last or (low is not None and low > last + 1):
+                    return None
+                changed.update(hosp_id for (hosp_id,) in conn.execute(
+                    f"SELECT hospital_id FROM {schema}.inventory_changelog WHERE seq > ?", (last,)))
+                new_cursor[schema] = high
+            changed.discard(None)
+            hospitals = self._read(conn, changed) if changed else []
+        removed = changed - {hosp["id"] for hosp in hospitals}
+        return new_cursor, hospitals, sorted(removed)
+
+    def close(self):
+        with self._version_lock:
+            self._version_conn = None
+        self.pool.close_all()
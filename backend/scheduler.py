@@ -0,0 +1,256 @@
+"""
+Job scheduler between the Socket.IO handlers and the call pipeline.
+
+Each pipeline stage (STT, LLM, TTS) has a bounded pool of workers, so a burst of calls
+queues up instead of opening unbounded Deepgram / Cerebras requests. Queued jobs sit in
+priority lanes, and inside a lane in per-sid queues served round-robin, so one chatty
+client cannot starve the others:
+
+    critical    a knowledge base match with Critical severity
+    operator    calls from the operator console (3001)
+    normal      bystander calls (3000)
+    background  ad-hoc tts_text requests
+
+A call is admitted once, when it arrives. The scheduler caps calls in flight (and per sid);
+beyond that the call is shed with Overloaded, which carries an estimated wait for the
+`busy` event. Higher lanes are counted first, so a critical or operator call is only shed
+when the calls ahead of it alone fill the cap.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+CRITICAL, OPERATOR, NORMAL, BACKGROUND = 0, 1, 2, 3
+LANES = ("critical", "operator", "normal", "background")
+
+
+class Overloaded(Exception):
+    def __init__(self, reason, estimated_wait):
+        super().__init__(f"{reason}, estimated wait {estimated_wait:.1f} s")
+        self.reason = reason
+        self.estimated_wait = estimated_wait
+
+
+class Job:
+    """One queued stage call; result() waits for it and returns its value"""
+
+    def __init__(self, fn, args, kwargs, sid, priority):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.sid = sid
+        self.priority = priority
+        self.queued_at = time.monotonic()
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def _run(self):
+        try:
+            self._value = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    def result(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class StagePool:
+    """Fixed number of workers for one stage, fed from priority lanes of per-sid queues"""
+
+    def __init__(self, name, workers, start_task=None, expected_service=1.0, window=1000, autostart=True):
+        self.name = name
+        self.workers = workers
+        self.lanes = [OrderedDict() for _ in LANES]  # sid -> deque of jobs
+        self.queued = [0] * len(LANES)
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.service_time = expected_service  # EWMA, seeds the wait estimate before the first job
+        self.waits = deque(maxlen=window)
+        self._cond = threading.Condition()
+        self._start_task = start_task or _start_thread
+        self.started = False
+        if autostart:
+            self.start()
+
+    def start(self):
+        """Start the workers; with autostart=False the owner calls this once it can run background tasks"""
+        if self.started:
+            return
+        self.started = True
+        for _ in range(self.workers):
+            self._start_task(self._worker)
+
+    def submit(self, fn, *args, sid=None, priority=NORMAL, **kwargs):
+        job = Job(fn, args, kwargs, sid, priority)
+        with self._cond:
+            self.lanes[priority].setdefault(sid, deque()).append(job)
+            self.queued[priority] += 1
+            self._cond.notify()
+        return job
+
+    def run(self, fn, *args, sid=None, priority=NORMAL, **kwargs):
+        return self.submit(fn, *args, sid=sid, priority=priority, **kwargs).result()
+
+    def _next_job(self):
+        for priority, lane in enumerate(self.lanes):
+            if not lane:
+                continue
+            # Round-robin: take the oldest job of the first sid, then move that sid to the back
+            sid, jobs = next(iter(lane.items()))
+            job = jobs.popleft()
+            del lane[sid]
+            if jobs:
+                lane[sid] = jobs
+            self.queued[priority] -= 1
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self.busy += 1
+            started = time.monotonic()
+            job._run()
+            finished = time.monotonic()
+            with self._cond:
+                self.busy -= 1
+                self.completed += 1
+                if job._error is not None:
+                    self.failed += 1
+                self.waits.append(started - job.queued_at)
+                self.service_time += 0.2 * ((finished - started) - self.service_time)
+
+    def seconds_per_job(self):
+        """Average time between job completions with every worker busy"""
+        return self.service_time / self.workers
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self.waits)
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": dict(zip(LANES, self.queued)),
+                "completed": self.completed,
+                "failed": self.failed,
+                "service_ms": round(self.service_time * 1000, 1),
+                "wait_ms": {
+                    "p50": _percentile_ms(waits, 0.5),
+                    "p95": _percentile_ms(waits, 0.95),
+                    "max": _percentile_ms(waits, 1.0),
+                },
+            }
+
+
+class Call:
+    """An admitted call: runs its stages at the call's priority, release() when done"""
+
+    def __init__(self, scheduler, sid, priority):
+        self.scheduler = scheduler
+        self.sid = sid
+        self.priority = priority
+        self.released = False
+
+    def submit(self, stage, fn, *args, **kwargs):
+        return self.scheduler.pools[stage].submit(fn, *args, sid=self.sid, priority=self.priority, **kwargs)
+
+    def run(self, stage, fn, *args, **kwargs):
+        return self.submit(stage, fn, *args, **kwargs).result()
+
+    def escalate(self, priority):
+        """Move the remaining stages to a higher lane (e.g. once the KB says Critical)"""
+        self.scheduler.escalate(self, priority)
+
+    def release(self):
+        self.scheduler.release(self)
+
+
+class Scheduler:
+    def __init__(self, pools, max_calls=64, per_sid=2):
+        self.pools = {pool.name: pool for pool in pools}
+        self.max_calls = max_calls
+        self.per_sid = per_sid
+        self.active = [0] * len(LANES)
+        self.active_by_sid = {}
+        self.admitted = 0
+        self.rejected = dict.fromkeys(LANES, 0)
+        self._lock = threading.Lock()
+
+    def start(self):
+        for pool in self.pools.values():
+            pool.start()
+
+    def admit(self, sid, priority=NORMAL):
+        """Admit a new call or raise Overloaded"""
+        with self._lock:
+            ahead = sum(self.active[:priority + 1])
+            if ahead >= self.max_calls:
+                reason = "too many calls in progress"
+            elif self.active_by_sid.get(sid, 0) >= self.per_sid:
+                reason = "too many requests from this client"
+            else:
+                self.active[priority] += 1
+                self.active_by_sid[sid] = self.active_by_sid.get(sid, 0) + 1
+                self.admitted += 1
+                return Call(self, sid, priority)
+            self.rejected[LANES[priority]] += 1
+        raise Overloaded(reason, self.estimated_wait(ahead))
+
+    def escalate(self, call, priority):
+        with self._lock:
+            if call.released or priority >= call.priority:
+                return
+            self.active[call.priority] -= 1
+            self.active[priority] += 1
+            call.priority = priority
+
+    def release(self, call):
+        with self._lock:
+            if call.released:
+                return
+            call.released = True
+            self.active[call.priority] -= 1
+            remaining = self.active_by_sid.get(call.sid, 0) - 1
+            if remaining > 0:
+                self.active_by_sid[call.sid] = remaining
+            else:
+                self.active_by_sid.pop(call.sid, None)
+
+    def estimated_wait(self, calls_ahead):
+        """Time for the bottleneck stage to work through the calls ahead"""
+        bottleneck = max(pool.seconds_per_job() for pool in self.pools.values())
+        return max(calls_ahead, 1) * bottleneck
+
+    def stats(self):
+        with self._lock:
+            calls = {
+                "max_calls": self.max_calls,
+                "per_sid": self.per_sid,
+                "active": dict(zip(LANES, self.active)),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+            }
+        return {"calls": calls, "stages": {name: pool.stats() for name, pool in self.pools.items()}}
+
+
+def _start_thread(fn):
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    return thread
+
+
+def _percentile_ms(samples, q):
+    if not samples:
+        return None
+    return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
@@ -0,0 +1,230 @@
+"""
+Offline semantic retrieval over the medical knowledge base (支持中英文).
+
+Catches paraphrases the keyword index misses ("can't catch my breath" vs "difficulty
+breathing"). No model and no network: text is turned into TF-IDF weighted, hashed
+features (word unigrams, character trigrams of each word, Chinese character uni/bigrams)
+and ranked by cosine similarity.
+
+The entry vectors are stored feature-major (CSC: indptr / rows / weights) as .npy files
+and loaded memory-mapped, so a restart reuses the index as long as meta.json's digest
+still matches the knowledge base. A query touches only the postings of its own features
+and scores every entry with a single bincount, which stays well under a millisecond at
+50k entries.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zlib
+
+import numpy as np
+
+from telemetry import log_event
+
+WORD = re.compile(r"[a-z0-9]+")
+CJK_RUN = re.compile(r"[\u4e00-\u9fa5]+")
+FORMAT_VERSION = 1
+
+
+class HashingVectorizer:
+    def __init__(self, n_features=1 << 18):
+        self.n_features = n_features
+
+    def features(self, text):
+        """Raw hashed term counts: {feature index: count}"""
+        text = text.lower()
+        counts = {}
+        for token in self._tokens(text):
+            index = zlib.crc32(token.encode("utf-8")) % self.n_features
+            counts[index] = counts.get(index, 0) + 1
+        return counts
+
+    def _tokens(self, text):
+        for word in WORD.findall(text):
+            yield "w:" + word
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3]
+        for run in CJK_RUN.findall(text):
+            for i, ch in enumerate(run):
+                yield "z:" + ch
+                if i + 1 < len(run):
+                    yield "z:" + run[i:i + 2]
+
+    def weighted(self, text, idf):
+        """Sublinear TF-IDF, L2-normalized: (feature indices, weights)"""
+        counts = self.features(text)
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        weights = (1 + np.log(tf)) * idf[indices]
+        norm = np.linalg.norm(weights)
+        if norm:
+            weights /= norm
+        return indices, weights
+
+
+def entry_documents(entries, keyword_map=None):
+    """Text embedded for each entry: symptom, conditions and the entry's keywords (中文同义词)"""
+    keywords_by_symptom = {}
+    for keyword, symptom in (keyword_map or {}).items():
+        keywords_by_symptom.setdefault(symptom, []).append(keyword)
+
+    documents = []
+    for entry in entries:
+        symptom = " ".join(entry["symptom"].lower().split())
+        parts = [symptom] + list(entry.get("conditions", [])) + keywords_by_symptom.get(symptom, [])
+        documents.append(" ".join(parts))
+    return documents
+
+
+class SemanticIndex:
+    def __init__(self, indptr, rows, weights, idf, vectorizer, size):
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.idf = idf
+        self.vectorizer = vectorizer
+        self.size = size  # number of entries (rows)
+
+    @classmethod
+    def build(cls, documents, vectorizer=None):
+        vectorizer = vectorizer or HashingVectorizer()
+        n_features = vectorizer.n_features
+        counts = [vectorizer.features(doc) for doc in documents]
+
+        df = np.zeros(n_features, dtype=np.float32)
+        for doc_counts in counts:
+            df[list(doc_counts)] += 1
+        idf = (np.log((1 + len(documents)) / (1 + df)) + 1).astype(np.float32)
+
+        # One (feature, row, weight) triple per nonzero, then sort feature-major
+        features, rows, weights = [], [], []
+        for row, doc_counts in enumerate(counts):
+            if not doc_counts:
+                continue
+            indices = np.fromiter(doc_counts.keys(), dtype=np.int64, count=len(doc_counts))
+            tf = np.fromiter(doc_counts.values(), dtype=np.float32, count=len(doc_counts))
+            w = (1 + np.log(tf)) * idf[indices]
+            features.append(indices)
+            rows.append(np.full(len(indices), row, dtype=np.int32))
+            weights.append((w / np.linalg.norm(w)).astype(np.float32))
+
+        features = np.concatenate(features) if features else np.empty(0, dtype=np.int64)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        weights = np.concatenate(weights) if weights else np.empty(0, dtype=np.float32)
+        order = np.argsort(features, kind="stable")
+        indptr = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(np.bincount(features, minlength=n_features), out=indptr[1:])
+
+        return cls(indptr, rows[order], weights[order], idf, vectorizer, len(documents))
+
+    def save(self, directory, digest):
+        os.makedirs(directory, exist_ok=True)
+        for name in ("indptr", "rows", "weights", "idf"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        # meta.json last: a directory without it (interrupted save) is simply rebuilt
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"digest": digest, "size": self.size, "n_features": self.vectorizer.n_features,
+                       "format": FORMAT_VERSION}, f)
+
+    @classmethod
+    def load(cls, directory, digest):
+        """Memory-map a saved index; None when it is missing or was built from different data"""
+        try:
+            with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("digest") != digest or meta.get("format") != FORMAT_VERSION:
+            return None
+        # Plain ndarray views over the maps: same pages, without np.memmap's per-slice overhead
+        arrays = [np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+                  for name in ("indptr", "rows", "weights", "idf")]
+        return cls(*arrays, HashingVectorizer(meta["n_features"]), meta["size"])
+
+    def search(self, text, k=3, min_score=0.2):
+        """Top-k (row, cosine score) pairs, best first"""
+        indices, query = self.vectorizer.weighted(text, self.idf)
+        if not len(indices) or not self.size:
+            return []
+
+        # Gather the postings of every query feature in one shot: positions s..e-1 per feature
+        starts = self.indptr[indices]
+        lengths = self.indptr[indices + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return []
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        positions = np.arange(total) + offsets
+        contributions = self.weights[positions] * np.repeat(query, lengths)
+        scores = np.bincount(self.rows[positions], weights=contributions, minlength=self.size)
+
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in candidates]
+
+
+def documents_digest(documents, vectorizer):
+    h = hashlib.sha256()
+    h.update(f"{FORMAT_VERSION}:{vectorizer.n_features}".encode("utf-8"))
+    for doc in documents:
+        h.update(b"\0" + doc.encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_or_build(entries, directory, keyword_map=None):
+    """
+    Reuse the persisted index when it matches the knowledge base, otherwise build and save it.
+    Each knowledge base version gets its own subdirectory, written aside and renamed into
+    place, so files an older index still has memory-mapped are never overwritten.
+    """
+    vectorizer = HashingVectorizer()
+    documents = entry_documents(entries, keyword_map)
+    digest = documents_digest(documents, vectorizer)
+    target = os.path.join(directory, digest[:16])
+
+    index = SemanticIndex.load(target, digest)
+    if index is not None:
+        return index
+
+    log_event("semantic_index_building", entries=len(documents), path=target)
+    index = SemanticIndex.build(documents, vectorizer)
+    staging = tempfile.mkdtemp(prefix=".building-", dir=_ensure_dir(directory))
+    try:
+        index.save(staging, digest)
+        os.replace(staging, target)
+    except OSError as e:
+        # Another process got there first, or the directory is read-only: serve from memory
+        log_event("semantic_index_save_failed", logging.WARNING, path=target, error=str(e))
+        shutil.rmtree(staging, ignore_errors=True)
+        return index
+    prune(directory, keep=os.path.basename(target))
+    return index
+
+
+def _ensure_dir(directory):
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def prune(directory, keep):
+    """Drop indexes of older knowledge base versions (open maps stay valid after unlink)"""
+    for name in os.listdir(directory):
+        if name == keep or name.startswith("."):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            pass
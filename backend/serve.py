@@ -0,0 +1,51 @@
+"""
+Start N backend processes on consecutive ports, each one gunicorn worker (gunicorn.conf.py):
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python serve.py --workers 4 --port 5001
+
+Put a sticky load balancer in front of them (deploy/nginx.conf). More than one process needs
+SOCKETIO_MESSAGE_QUEUE, so a user call handled on one process reaches operators connected to
+another; the client registry and case state follow it into the same Redis unless
+SHARED_STATE_URL says otherwise.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "1")))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5001")), help="first port")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    args = parser.parse_args()
+
+    if args.workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+        sys.exit("--workers > 1 needs SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0)")
+
+    processes = []
+    for i in range(args.workers):
+        env = dict(os.environ, HOST=args.host, PORT=str(args.port + i), WORKER_ID=f"worker-{args.port + i}")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"], cwd=BASE_DIR, env=env
+        ))
+        print(f"worker-{args.port + i} listening on {args.host}:{args.port + i}")
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    exit_code = 0
+    for process in processes:
+        exit_code = process.wait() or exit_code
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
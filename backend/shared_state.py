@@ -0,0 +1,160 @@
+"""
+Client registry and per-case state, kept either in process memory (single worker, the
+default) or in Redis (SHARED_STATE_URL, usually the same Redis as SOCKETIO_MESSAGE_QUEUE)
+so every worker of a multi-process deployment sees the same operators, users and cases.
+
+Registry layout in Redis:
+    {prefix}:clients:{role}      set of sids connected with that role ("3000" / "3001")
+    {prefix}:client_roles        hash sid -> role
+    {prefix}:worker:{worker_id}  set of sids owned by one worker, purged when it restarts
+Cases:
+    {prefix}:case:{req_id}       list of JSON [event, data] pairs, expiring after case_ttl
+    {prefix}:case_location:{case_id}  JSON [lat, lon] of the bystander whose case it is, same ttl,
+                                 so an operator on any worker can follow that case
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+from telemetry import log_event
+
+
+def default_worker_id():
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def connect_redis(url):
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("SHARED_STATE_URL requires the redis package")
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+class LocalClientRegistry:
+    def __init__(self):
+        self._roles = {}
+        self._lock = threading.Lock()
+
+    def add(self, role, sid):
+        with self._lock:
+            self._roles[sid] = role
+
+    def remove(self, sid):
+        """Forget sid; returns the role it was registered with, or None"""
+        with self._lock:
+            return self._roles.pop(sid, None)
+
+    def count(self, role):
+        with self._lock:
+            return sum(1 for r in self._roles.values() if r == role)
+
+
+class RedisClientRegistry:
+    def __init__(self, client, worker_id, prefix="emc"):
+        self.client = client
+        self.prefix = prefix
+        self.worker_key = f"{prefix}:worker:{worker_id}"
+        # A restarted worker with a stable WORKER_ID drops the sids its previous life left behind
+        self.purge_worker()
+        atexit.register(self.purge_worker)
+
+    def _role_key(self, role):
+        return f"{self.prefix}:clients:{role}"
+
+    def add(self, role, sid):
+        pipe = self.client.pipeline()
+        pipe.sadd(self._role_key(role), sid)
+        pipe.hset(f"{self.prefix}:client_roles", sid, role)
+        pipe.sadd(self.worker_key, sid)
+        pipe.execute()
+
+    def remove(self, sid):
+        role = self.client.hget(f"{self.prefix}:client_roles", sid)
+        pipe = self.client.pipeline()
+        if role:
+            pipe.srem(self._role_key(role), sid)
+        pipe.hdel(f"{self.prefix}:client_roles", sid)
+        pipe.srem(self.worker_key, sid)
+        pipe.execute()
+        return role
+
+    def count(self, role):
+        return self.client.scard(self._role_key(role))
+
+    def purge_worker(self):
+        try:
+            for sid in self.client.smembers(self.worker_key):
+                self.remove(sid)
+            self.client.delete(self.worker_key)
+        except Exception as e:
+            log_event("client_registry_cleanup_failed", logging.ERROR, error=str(e))
+
+
+class LocalCaseStore:
+    def __init__(self, max_cases=1000):
+        self.max_cases = max_cases
+        self._cases = OrderedDict()
+        self._locations = OrderedDict()  # case_id -> (lat, lon)
+        self._lock = threading.Lock()
+
+    def record(self, req_id, event_name, data):
+        with self._lock:
+            events = self._cases.get(req_id)
+            if events is None:
+                events = self._cases[req_id] = []
+                while len(self._cases) > self.max_cases:
+                    self._cases.popitem(last=False)
+            events.append([event_name, data])
+
+    def events(self, req_id):
+        with self._lock:
+            return list(self._cases.get(req_id, []))
+
+    def set_location(self, case_id, lat, lon):
+        with self._lock:
+            self._locations.pop(case_id, None)
+            self._locations[case_id] = (lat, lon)
+            while len(self._locations) > self.max_cases:
+                self._locations.popitem(last=False)
+
+    def location(self, case_id):
+        """(lat, lon) of the case's caller, or None"""
+        with self._lock:
+            return self._locations.get(case_id)
+
+
+class RedisCaseStore:
+    def __init__(self, client, case_ttl=3600, prefix="emc"):
+        self.client = client
+        self.case_ttl = case_ttl
+        self.prefix = prefix
+
+    def record(self, req_id, event_name, data):
+        key = f"{self.prefix}:case:{req_id}"
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps([event_name, data], ensure_ascii=False, default=str))
+        pipe.expire(key, self.case_ttl)
+        pipe.execute()
+
+    def events(self, req_id):
+        return [json.loads(item) for item in self.client.lrange(f"{self.prefix}:case:{req_id}", 0, -1)]
+
+    def set_location(self, case_id, lat, lon):
+        self.client.set(f"{self.prefix}:case_location:{case_id}", json.dumps([lat, lon]), ex=self.case_ttl)
+
+    def location(self, case_id):
+        value = self.client.get(f"{self.prefix}:case_location:{case_id}")
+        return tuple(json.loads(value)) if value else None
+
+
+def create_shared_state(url=None, case_ttl=3600, prefix="emc"):
+    """(client registry, case store): Redis-backed when url is set, in-process otherwise"""
+    if not url:
+        return LocalClientRegistry(), LocalCaseStore()
+    client = connect_redis(url)
+    return RedisClientRegistry(client, default_worker_id(), prefix), RedisCaseStore(client, case_ttl, prefix)
@@ -0,0 +1,62 @@
+"""
+Helpers for streaming LLM output to speech: cut the token stream into sentences
+and release per-sentence TTS results in order.
+"""
+import re
+import threading
+
+# Sentence end: ASCII punctuation followed by whitespace (so "1.5" or "Dr.X" never splits
+# mid-token), or CJK full-width punctuation which needs no trailing space
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|[。！？；]+')
+
+
+class SentenceSplitter:
+    """
+    Accumulates streamed text and returns each sentence once it is complete.
+    Fragments shorter than min_chars are held back and merged with the next sentence
+    so TTS isn't called for a lone "OK."
+    """
+
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Whatever is left once the stream has ended"""
+        tail = self._buffer.strip()
+        self._buffer = ""
+        return tail
+
+
+class ChunkSequencer:
+    """
+    Collects results that finish out of order and hands them to `release(seq, item)`
+    strictly in sequence order. A None item advances the sequence without a release.
+    """
+
+    def __init__(self, release):
+        self.release = release
+        self._next = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def complete(self, seq, item):
+        with self._lock:
+            self._pending[seq] = item
+            while self._next in self._pending:
+                ready = self._pending.pop(self._next)
+                if ready is not None:
+                    self.release(self._next, ready)
+                self._next += 1
@@ -0,0 +1,181 @@
+"""
+Streaming speech-to-text ingestion.
+
+Clients send `audio_chunk` events with sequence numbers; AudioChunkBuffer puts them back
+in order and a pluggable backend session turns them into partial and final transcripts.
+
+Backends (STT_BACKEND env var):
+  - "deepgram": Deepgram live transcription over a websocket (needs websocket-client)
+  - "replay":   offline stand-in that replays transcripts from STT_REPLAY_FILE, revealing
+                a few words per received chunk, for local testing without API keys
+"""
+import abc
+import itertools
+import json
+import os
+import threading
+from urllib.parse import urlencode
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEEPGRAM_URL_STT_LIVE = os.getenv("DEEPGRAM_URL_STT_LIVE", "wss://api.deepgram.com/v1/listen")
+
+
+class AudioChunkBuffer:
+    """
+    Bounded reorder buffer for one audio stream. push() returns the chunks that are now
+    contiguous in sequence order. If more than `capacity` chunks pile up behind a missing
+    sequence number, the gap is given up on and counted in `dropped`.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.next_seq = 0
+        self.dropped = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def push(self, seq, data):
+        with self._lock:
+            if seq < self.next_seq or seq in self._pending:
+                return []  # duplicate / late retransmit
+            self._pending[seq] = data
+
+            if len(self._pending) > self.capacity:
+                skip_to = min(self._pending)
+                self.dropped += skip_to - self.next_seq
+                self.next_seq = skip_to
+
+            ready = []
+            while self.next_seq in self._pending:
+                ready.append(self._pending.pop(self.next_seq))
+                self.next_seq += 1
+            return ready
+
+
+class STTSession(abc.ABC):
+    """One utterance being transcribed. on_partial(text) receives the running transcript"""
+
+    def __init__(self, on_partial):
+        self.on_partial = on_partial
+
+    @abc.abstractmethod
+    def send(self, chunk):
+        """Feed the next in-order audio chunk"""
+
+    @abc.abstractmethod
+    def finish(self, timeout=10):
+        """Flush the stream and return the final transcript"""
+
+    def close(self):
+        pass
+
+
+class DeepgramLiveSession(STTSession):
+    def __init__(self, on_partial, api_key, params):
+        super().__init__(on_partial)
+        try:
+            import websocket
+        except ImportError:
+            raise RuntimeError("STT_BACKEND=deepgram requires the websocket-client package")
+
+        url = f"{DEEPGRAM_URL_STT_LIVE}?{urlencode(params)}"
+        self.ws = websocket.create_connection(url, header=[f"Authorization: Token {api_key}"], timeout=10)
+        self.final_segments = []
+        self._send_lock = threading.Lock()
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._receiver.start()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self.ws.recv()
+            except Exception:
+                break
+            if not message:
+                break
+            result = json.loads(message)
+            if result.get("type") != "Results":
+                continue
+
+            text = result["channel"]["alternatives"][0]["transcript"]
+            if result.get("is_final"):
+                if text:
+                    self.final_segments.append(text)
+                running = " ".join(self.final_segments)
+            else:
+                running = " ".join(self.final_segments + [text])
+            if running:
+                self.on_partial(running)
+
+    def send(self, chunk):
+        with self._send_lock:
+            self.ws.send_binary(bytes(chunk))
+
+    def finish(self, timeout=10):
+        with self._send_lock:
+            self.ws.send(json.dumps({"type": "CloseStream"}))
+        self._receiver.join(timeout)
+        self.close()
+        return " ".join(self.final_segments)
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class DeepgramLiveBackend:
+    def __init__(self, api_key, model="nova-2"):
+        self.api_key = api_key
+        self.params = {
+            "model": model,
+            "smart_format": "true",
+            "interim_results": "true"
+        }
+
+    def open(self, on_partial):
+        return DeepgramLiveSession(on_partial, self.api_key, self.params)
+
+
+class ReplaySession(STTSession):
+    def __init__(self, on_partial, transcript, words_per_chunk):
+        super().__init__(on_partial)
+        self.words = transcript.split()
+        self.words_per_chunk = words_per_chunk
+        self.revealed = 0
+
+    def send(self, chunk):
+        if self.revealed >= len(self.words):
+            return
+        self.revealed = min(len(self.words), self.revealed + self.words_per_chunk)
+        self.on_partial(" ".join(self.words[:self.revealed]))
+
+    def finish(self, timeout=10):
+        return " ".join(self.words)
+
+
+class ReplayBackend:
+    """Offline stand-in: each stream replays the next transcript (one per line) from a text file"""
+
+    def __init__(self, path, words_per_chunk=2):
+        with open(path, "r", encoding="utf-8") as f:
+            transcripts = [line.strip() for line in f if line.strip()]
+        if not transcripts:
+            raise ValueError(f"No transcripts in {path}")
+        self._transcripts = itertools.cycle(transcripts)
+        self._lock = threading.Lock()
+        self.words_per_chunk = words_per_chunk
+
+    def open(self, on_partial):
+        with self._lock:
+            transcript = next(self._transcripts)
+        return ReplaySession(on_partial, transcript, self.words_per_chunk)
+
+
+def create_backend(name, api_key=None):
+    if name == "deepgram":
+        return DeepgramLiveBackend(api_key)
+    if name == "replay":
+        return ReplayBackend(os.getenv("STT_REPLAY_FILE", os.path.join(BASE_DIR, "stt_replay.txt")))
+    raise ValueError(f"Unknown STT backend: {name}")
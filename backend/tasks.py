@@ -0,0 +1,27 @@
+"""
+Background stage runner for the call pipeline.
+
+Stages run through SocketIO.start_background_task, so they are real threads under
+the threading async mode and greenlets under eventlet/gevent.
+"""
+
+
+class BackgroundResult:
+    """Runs fn(*args, **kwargs) as a background task; result() waits for it and returns its value"""
+
+    def __init__(self, socketio, fn, *args, **kwargs):
+        self._value = None
+        self._error = None
+        self._task = socketio.start_background_task(self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        try:
+            self._value = fn(*args, **kwargs)
+        except Exception as e:
+            self._error = e
+
+    def result(self):
+        self._task.join()
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,309 @@
+"""
+Call pipeline telemetry: metrics, per-request spans, structured logs and a sampling profiler.
+
+    metrics   Counter / Gauge / Histogram in a Registry rendered in the Prometheus text
+              format (GET /metrics). Gauges can read their value at scrape time instead
+              of being kept up to date on the hot path
+    spans     Tracer.span(req_id, stage) times one stage of one call into the
+              stage histogram and the call's trace; Tracer.finish records end-to-end latency
+              and logs the whole call as one `call_finished` line with its stage breakdown
+    logs      log_event(event, **fields) writes one JSON object per line to the `pipeline`
+              logger (LOG_LEVEL), instead of free-form prints
+    profiler  SamplingProfiler samples every thread's stack on a timer while switched on and
+              keeps counts of collapsed stacks ("a;b;c 42", the flamegraph.pl input format)
+
+Metrics are per process; with several backend processes each one is scraped separately.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("pipeline")
+
+
+def configure_logging(level="INFO"):
+    """JSON lines on stdout for the pipeline logger (once per process)"""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level.upper())
+
+
+def log_event(event, level=logging.INFO, **fields):
+    if not logger.isEnabledFor(level):
+        return
+    record = {"ts": round(time.time(), 3), "level": logging.getLevelName(level).lower(), "event": event, **fields}
+    logger.log(level, json.dumps(record, ensure_ascii=False, default=str))
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    """
+    Counted on the hot path with inc(), or read at scrape time from collect() ->
+    {label value tuple: value} when another component already keeps the number
+    """
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        if self.collect is not None:
+            return [(self.name, tuple(str(v) for v in key), (), value) for key, value in self.collect().items()]
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append((self.name + "_bucket", key, (("le", repr(float(bound))),), cumulative))
+            samples.append((self.name + "_bucket", key, (("le", "+Inf"),), values[-1]))
+            samples.append((self.name + "_sum", key, (), values[-2]))
+            samples.append((self.name + "_count", key, (), values[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=(), collect=None):
+        return self._add(Counter(name, help, labelnames, collect))
+
+    def gauge(self, name, help, labelnames=(), collect=None):
+        return self._add(Gauge(name, help, labelnames, collect))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format, version 0.0.4"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                log_event("metric_collect_failed", logging.WARNING, metric=metric.name, error=str(e))
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in samples:
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Spans of recent calls by req_id, feeding the stage and end-to-end histograms"""
+
+    def __init__(self, registry, window=500, on_finish=None):
+        self.on_finish = on_finish  # (outcome, seconds) of every finished call
+        self.stage_seconds = registry.histogram(
+            "call_stage_seconds", "Time a call spent in each pipeline stage, queueing included", ["stage"])
+        self.call_seconds = registry.histogram(
+            "call_seconds", "End-to-end call latency, from the audio arriving to the last reply event", ["kind", "outcome"])
+        self.stage_errors = registry.counter("call_stage_errors_total", "Pipeline stages that raised", ["stage"])
+        self.window = window
+        self._traces = OrderedDict()  # req_id -> {"kind", "started", "wall_start", "spans": [...]}
+        self._lock = threading.Lock()
+
+    def start(self, req_id, kind):
+        with self._lock:
+            self._traces[req_id] = {"kind": kind, "started": time.perf_counter(), "wall_start": time.time(),
+                                    "spans": [], "outcome": None}
+            while len(self._traces) > self.window:
+                self._traces.popitem(last=False)
+
+    @contextmanager
+    def span(self, req_id, stage):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            self.stage_errors.inc(stage=stage)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.stage_seconds.observe(duration, stage=stage)
+            with self._lock:
+                trace = self._traces.get(req_id)
+                if trace is not None:
+                    trace["spans"].append({"stage": stage, "start_ms": round((started - trace["started"]) * 1000, 2),
+                                           "ms": round(duration * 1000, 2), "error": error})
+            log_event("span", logging.DEBUG, req_id=req_id, stage=stage, ms=round(duration * 1000, 2), error=error)
+
+    def finish(self, req_id, outcome="ok"):
+        """End-to-end latency of the call, logged once with its stage breakdown"""
+        with self._lock:
+            trace = self._traces.get(req_id)
+            if trace is None or trace["outcome"] is not None:
+                return
+            trace["outcome"] = outcome
+            total = time.perf_counter() - trace["started"]
+            trace["ms"] = round(total * 1000, 2)
+            stages = {}
+            for span in trace["spans"]:
+                stages[span["stage"]] = round(stages.get(span["stage"], 0) + span["ms"], 2)
+        self.call_seconds.observe(total, kind=trace["kind"], outcome=outcome)
+        if self.on_finish is not None:
+            self.on_finish(outcome, total)
+        log_event("call_finished", req_id=req_id, kind=trace["kind"], outcome=outcome, ms=trace["ms"], stages_ms=stages)
+
+    def trace(self, req_id):
+        with self._lock:
+            trace = self._traces.get(req_id)
+            if trace is None:
+                return None
+            return {"req_id": req_id, "kind": trace["kind"], "started_at": trace["wall_start"],
+                    "outcome": trace["outcome"], "ms": trace.get("ms"), "spans": list(trace["spans"])}
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every other thread every `interval` seconds while running. Costs
+    nothing when stopped; start()/stop() can be called at any time
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.started_at = None
+        self._stacks = defaultdict(int)
+        self._stop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None, reset=True):
+        with self._lock:
+            if self.running:
+                return False
+            if interval:
+                self.interval = interval
+            if reset:
+                self._stacks = defaultdict(int)
+                self.samples = 0
+            self.started_at = time.time()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True, name="sampling-profiler")
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return False
+            self._stop.set()
+            thread = self._thread
+        thread.join()
+        return True
+
+    def _run(self, stop):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks, most frequent first"""
+        stacks = sorted(list(self._stacks.items()), key=lambda item: -item[1])
+        if limit:
+            stacks = stacks[:limit]
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def status(self):
+        return {"running": self.running, "interval_ms": round(self.interval * 1000, 3), "samples": self.samples,
+                "stacks": len(self._stacks), "started_at": self.started_at}
@@ -0,0 +1,24 @@
+"""extract_patient_info against the golden corpus the extraction benchmark also checks"""
+import json
+import os
+
+import pytest
+
+from extraction import extract_patient_info
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "extraction_corpus.json")
+
+with open(CORPUS_PATH, encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[case["transcript"][:40] for case in CORPUS])
+def test_golden_corpus(case):
+    assert extract_patient_info(case["transcript"]) == case["expected"]
+
+
+def test_empty_transcript():
+    assert extract_patient_info("") == {
+        "name": None, "age": None, "injury": None, "pain_location": None,
+        "pain_level": None, "allergies": None, "symptoms": []
+    }
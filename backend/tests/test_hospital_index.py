@@ -0,0 +1,67 @@
+from hospital_index import HospitalIndex
+
+
+def hospital(name, lat, lon, plasma=(), medications=()):
+    return {
+        "name": name,
+        "coordinates": {"lat": lat, "lon": lon},
+        "blood_plasma": [{"type": kind, "stock": stock} for kind, stock in plasma],
+        "medications": [{"type": kind, "stock": stock} for kind, stock in medications],
+    }
+
+
+CRITICAL_STOCK = {"plasma": [("O-", 10)], "medications": [("Hemostatic", 10)]}
+
+HOSPITALS = [
+    hospital("near_empty", 40.7130, -74.0060),  # next to the caller, stocks nothing
+    hospital("near", 40.7200, -74.0000, **CRITICAL_STOCK),
+    hospital("far", 41.5000, -73.0000, **CRITICAL_STOCK),
+    hospital("near_big", 40.7300, -73.9900, plasma=[("O-", 200)], medications=[("Hemostatic", 200)]),
+    hospital("painkillers", 40.7140, -74.0050, medications=[("Painkiller", 50)]),
+]
+CALLER = (40.7128, -74.0060)
+
+
+def names(results):
+    return [h["name"] for h in results]
+
+
+def test_qualifying_hospitals_come_first():
+    results = HospitalIndex(HOSPITALS).nearest(CALLER, "Critical", k=5)
+    meets = [h["meets_needs"] for h in results]
+    assert meets == sorted(meets, reverse=True)
+    assert set(names(results[:3])) == {"near", "far", "near_big"}
+
+
+def test_stock_outweighs_a_short_detour():
+    results = HospitalIndex(HOSPITALS).nearest(CALLER, "Critical", k=3)
+    assert names(results) == ["near_big", "near", "far"]
+    assert results[0]["distance_km"] < results[2]["distance_km"]
+
+
+def test_k_nearest_before_ranking():
+    # k=2 keeps the two closest qualifying hospitals; "far" never makes the cut
+    assert "far" not in names(HospitalIndex(HOSPITALS).nearest(CALLER, "Critical", k=2))
+
+
+def test_severity_needs():
+    results = HospitalIndex(HOSPITALS).nearest(CALLER, "Moderate", k=1)
+    assert names(results) == ["painkillers"]
+    assert results[0]["meets_needs"]
+
+
+def test_without_location_best_stocked_first():
+    results = HospitalIndex(HOSPITALS).nearest(None, "Critical", k=3)
+    assert names(results)[0] == "near_big"
+    assert all(h["distance_km"] is None for h in results)
+
+
+def test_missing_coordinates_sort_last_among_qualifying():
+    hospitals = HOSPITALS + [{**hospital("unknown", None, None, **CRITICAL_STOCK), "coordinates": None}]
+    results = HospitalIndex(hospitals).nearest(CALLER, "Critical", k=5)
+    assert names(results)[3:] == ["unknown", "near_empty"]
+    assert results[3]["distance_km"] is None
+
+
+def test_empty_index():
+    assert HospitalIndex([]).nearest(CALLER, "Critical") == []
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+
+import pytest
+
+from name_index import PatientNameIndex
+from patient_store import PatientStore
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def index(tmp_path):
+    """The sample registry from init_patients.sql plus two John Smiths a year apart"""
+    path = str(tmp_path / "patients.db")
+    with open(os.path.join(BACKEND_DIR, "init_patients.sql"), encoding="utf-8") as f:
+        script = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(script)
+    conn.executemany("INSERT INTO patients (id, name, age) VALUES (?, ?, ?)",
+                     [("js40", "John Smith", 40), ("js41", "John Smith", 41)])
+    conn.commit()
+    conn.close()
+    store = PatientStore(path)
+    index = PatientNameIndex(store, os.path.join(BACKEND_DIR, "name_aliases.json"), poll_interval=0)
+    index.poll()
+    yield index
+    store.close()
+
+
+@pytest.mark.parametrize("name, age, expected", [
+    ("John Doe", 70, "uuid1"),
+    ("Jon Doe", 70, "uuid1"),  # spelling
+    ("Emily Smyth", None, "uuid6"),  # sound
+    ("约翰", 70, "uuid1"),  # transliteration
+    ("Sarah Jonson", 65, "uuid8"),
+    ("John Smith", 40, "js40"),  # the age settles a shared name
+])
+def test_best_finds_the_patient(index, name, age, expected):
+    assert index.best(name, age)["id"] == expected
+
+
+def test_best_none_when_nothing_matches(index):
+    assert index.best("Zebulon Quart") is None
+    assert index.best("") is None
+
+
+def test_best_none_when_ambiguous(index):
+    assert len(index.search("John Smith", limit=5)) >= 2
+    assert index.best("John Smith") is None
+
+
+def test_best_none_below_min_score(index):
+    # Right name, wrong age: found by search, but not confidently enough for best()
+    assert index.search("Jose", 99)[0]["id"] == "uuid2"
+    assert index.best("Jose", 99) is None
+    assert index.best("Jose", 99, min_score=0.5)["id"] == "uuid2"
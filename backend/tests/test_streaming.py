@@ -0,0 +1,45 @@
+from streaming import ChunkSequencer, SentenceSplitter
+
+
+def test_splitter_releases_complete_sentences():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Keep the patient still and ") == []
+    assert splitter.feed("apply pressure. Call back if the bleeding") == ["Keep the patient still and apply pressure."]
+    assert splitter.flush() == "Call back if the bleeding"
+    assert splitter.flush() == ""
+
+
+def test_splitter_does_not_split_inside_tokens():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Give him 1.5 tablets of Dr.X aspirin now. ") == ["Give him 1.5 tablets of Dr.X aspirin now."]
+
+
+def test_splitter_merges_short_fragments():
+    splitter = SentenceSplitter()
+    assert splitter.feed("OK. Stay on the line with me. ") == ["OK. Stay on the line with me."]
+
+
+def test_splitter_cjk_punctuation_needs_no_space():
+    splitter = SentenceSplitter(min_chars=4)
+    assert splitter.feed("请保持患者平躺。不要移动他") == ["请保持患者平躺。"]
+    assert splitter.flush() == "不要移动他"
+
+
+def test_sequencer_releases_in_order():
+    released = []
+    sequencer = ChunkSequencer(lambda seq, item: released.append((seq, item)))
+    sequencer.complete(2, "c")
+    sequencer.complete(1, "b")
+    assert released == []
+    sequencer.complete(0, "a")
+    assert released == [(0, "a"), (1, "b"), (2, "c")]
+    sequencer.complete(3, "d")
+    assert released[-1] == (3, "d")
+
+
+def test_sequencer_none_skips_without_release():
+    released = []
+    sequencer = ChunkSequencer(lambda seq, item: released.append((seq, item)))
+    sequencer.complete(1, "b")
+    sequencer.complete(0, None)
+    assert released == [(1, "b")]
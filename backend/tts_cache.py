@@ -0,0 +1,184 @@
+"""
+Content-addressed cache for synthesized speech in static/audio.
+
+Files are named by a hash of (text, model, encoding), so a repeated phrase ("Urgency:
+Critical", standard instructions, operator readbacks) is synthesized once and then served
+from disk, and two different texts can never overwrite each other. Concurrent requests for
+the same key share one in-flight synthesis. The directory is kept under a size budget by
+evicting the least recently used files; files older than max_age are re-synthesized.
+
+Synthesis can hand back the audio as an iterator of chunks; they are written to disk as they
+arrive and, with on_chunk, passed on at the same time (e.g. to the caller's socket), so a
+clip never sits in memory as a whole.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CHUNK_BYTES = 16 * 1024
+
+
+def cache_key(text, model, encoding):
+    return hashlib.sha256(f"{model}\0{encoding}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.path = None
+
+
+class TTSCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=30 * 86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # requests that waited on another request's synthesis
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._files = OrderedDict()  # filename -> (size, last used), least recently used first
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Pick up files left by earlier runs, oldest first"""
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            found.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._files[name] = (size, mtime)
+            self._bytes += size
+
+    def get_or_create(self, text, model, encoding, synthesize, on_chunk=None):
+        """
+        Filename for the audio of `text`, calling synthesize(text) -> bytes or an iterator of
+        byte chunks (or None on failure) only when no fresh copy exists and nobody else is
+        already making one. on_chunk(chunk) receives the whole clip, live or read back from disk
+        """
+        name = f"{cache_key(text, model, encoding)}.{encoding}"
+        with self._lock:
+            cached = self._files.get(name)
+            hit = cached and time.time() - cached[1] <= self.max_age and os.path.exists(self.path(name))
+            if hit:
+                self.hits += 1
+                self._touch(name)
+            elif name in self._in_flight:
+                flight = self._in_flight[name]
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._in_flight[name] = _InFlight()
+                self.misses += 1
+                leader = True
+
+        if hit:
+            return self._replay(name, on_chunk)
+        if not leader:
+            flight.done.wait()
+            return self._replay(flight.path, on_chunk) if flight.path else None
+
+        try:
+            audio = synthesize(text)
+            if audio and self._store(name, audio, on_chunk):
+                flight.path = name
+        finally:
+            with self._lock:
+                del self._in_flight[name]
+            flight.done.set()
+        return flight.path
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _replay(self, name, on_chunk):
+        """Stream a stored clip to on_chunk; None if it was evicted in the meantime"""
+        if on_chunk is None:
+            return name
+        try:
+            with open(self.path(name), "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+                    on_chunk(chunk)
+        except FileNotFoundError:
+            return None
+        return name
+
+    def _touch(self, name):
+        size, _ = self._files.pop(name)
+        now = time.time()
+        self._files[name] = (size, now)
+        # Hits don't rewrite the file, but eviction order survives a restart via mtime
+        try:
+            os.utime(self.path(name), (now, now))
+        except OSError:
+            pass
+
+    def _store(self, name, audio, on_chunk=None):
+        """Write the clip chunk by chunk as it arrives; False when nothing arrived"""
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = [audio]
+        # Write aside and rename, so a client fetching the URL never sees a partial file
+        tmp = self.path(f".{name}.{threading.get_ident()}.tmp")
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in audio:
+                    f.write(chunk)
+                    size += len(chunk)
+                    if on_chunk:
+                        on_chunk(chunk)
+            if not size:
+                os.remove(tmp)
+                return False
+            os.replace(tmp, self.path(name))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            previous = self._files.pop(name, None)
+            if previous:
+                self._bytes -= previous[0]
+            self._files[name] = (size, time.time())
+            self._bytes += size
+            self._evict(keep=name)
+        return True
+
+    def _evict(self, keep):
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, (size, _) = next(iter(self._files.items()))
+            if name == keep:
+                break
+            del self._files[name]
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -1,35 +1,54 @@
 import React, { useEffect, useState, useRef } from 'react';
 import axios from 'axios';
 import IconButton from '@mui/material/IconButton';
+import Button from '@mui/material/Button';
 import MicIcon from '@mui/icons-material/Mic';
 import StopIcon from '@mui/icons-material/Stop';
-import { useAudioRecorder } from 'react-audio-voice-recorder';
 import { io } from "socket.io-client";
 import History from "./components/history";
+import { useChunkedRecorder } from "./chunkedRecorder";
 
 import "./App.css";
 
 const host = 'http://localhost:5000/'
-const socket = io(host)
+// Call history holds patient data: the backend only replays it to consoles holding OPERATOR_TOKEN
+const socket = io(host, { auth: { token: process.env.REACT_APP_OPERATOR_TOKEN } })
 
 export default function App() {
+  // Each slice goes out as an audio_chunk (binary attachment) while the caller is still talking
   const {
     startRecording,
     stopRecording,
-    recordingBlob,
     isRecording
-  } = useAudioRecorder();
+  } = useChunkedRecorder((seq, data, final) => socket.emit('audio_chunk', { seq, data, final }));
 
-  const [messages, setMessages] = useState([{role: "bot", text : "I have access to the databases of nearby hospital to help you decide which hospital to send the patient to. Please hit record to talk about patient symptoms."}]);
+  const greeting = {role: "bot", text : "I have access to the databases of nearby hospital to help you decide which hospital to send the patient to. Please hit record to talk about patient symptoms."};
+  const [messages, setMessages] = useState([greeting]);
 
   // ONE shared audio element
   const playerRef = useRef(new Audio());
+  // AUDIO_TRANSPORT=binary: reply chunks per req_id, and replies already played from them
+  const binaryChunks = useRef({});
+  const binaryPlayed = useRef(new Set());
+  // STREAM_RESPONSES: the reply's sentence clips (audio_chunk), played one after another in seq
+  // order as they arrive; replies played that way don't replay their joined audio_url
+  const chunkQueue = useRef({ reqId: null, urls: [], playing: false });
+  const chunkPlayed = useRef(new Set());
+  // Journaled calls from before a refresh, replayed once per page load without autoplay
+  const historyLoaded = useRef(false);
+  const replaying = useRef(false);
+  // The bystander case on screen; the server ranks hospitals for this console's calls around its caller
+  const bystanderCase = useRef(null);
   const [playingId, setPlayingId] = useState("card-1");
   const [paused, setPaused] = useState(true);
 
   useEffect(() => {
     const a = playerRef.current;
-    const onEnded = () => { setPlayingId(null); setPaused(false); };
+    const onEnded = () => {
+      setPlayingId(null);
+      setPaused(false);
+      if (chunkQueue.current.playing) playNextChunk();
+    };
     const onPause = () => setPaused(true);
     const onPlay = () => setPaused(false);
 
@@ -61,6 +80,28 @@ export default function App() {
     }
   };
 
+  const playNextChunk = () => {
+    const queue = chunkQueue.current;
+    const next = queue.urls.shift();
+    queue.playing = next !== undefined;
+    if (queue.playing) playAudio(next.url, queue.reqId);
+  };
+
+  const upsertTranscript = (reqId, text) => {
+    const id = `${reqId}:t`;
+    setMessages(prev => prev.some(m => m.id === id)
+      ? prev.map(m => m.id === id ? { ...m, text } : m)
+      : [...prev, { id, role: 'user', text }]);
+  };
+
+  // Streamed reply text: one message per req_id, grown by response_delta, replaced by the final text
+  const upsertReply = (id, text, append) => {
+    setMessages(prev => {
+      if (!prev.some(m => m.id === id)) return [...prev, { id, role: 'bot', text, audioUrl: null }];
+      return prev.map(m => m.id === id ? { ...m, text: append ? m.text + text : text } : m);
+    });
+  };
+
   const pauseAudio = () => {
     const a = playerRef.current;
     if (!a.paused) a.pause(); // `paused` will flip via event listener
@@ -71,18 +112,57 @@ export default function App() {
     if (a.paused) a.play().catch(() => {})
   };
 
+  const handleStartRecording = () => {
+    socket.emit('follow_case', { case_id: bystanderCase.current });
+    startRecording();
+  };
+
   const handleStopRecording = () => {
     stopRecording();
   };
 
+  // Recordings follow up on the same patient until the operator starts a new case
+  const handleNewCase = () => {
+    socket.emit('end_case');
+    bystanderCase.current = null;
+    setMessages([greeting]);
+  };
+
   useEffect(() => {
     socket.on('connect', () => {
       console.log('Connected to WebSocket server');
+      if (!historyLoaded.current) socket.emit('history', { limit: 20 });
+    });
+
+    // Newest first from the backend: replay oldest first through the same handlers as live events
+    socket.on('history', (page) => {
+      if (historyLoaded.current) return;
+      historyLoaded.current = true;
+      if (page.error) {
+        console.warn('Call history unavailable:', page.error);
+        return;
+      }
+      replaying.current = true;
+      try {
+        [...page.calls].reverse().forEach((call) => {
+          call.events.forEach(({ event, data }) => {
+            socket.listeners(event).forEach((handler) => handler({ ...data, req_id: call.req_id }));
+          });
+        });
+      } finally {
+        replaying.current = false;
+      }
+    });
+
+    // The running transcript while the caller is still talking, replaced by `transcription`
+    socket.on('transcription_partial', (data) => {
+      upsertTranscript(data.req_id, data.text);
     });
 
     socket.on('transcription', (data) => {
       console.log('Transcription:', data.text);
-      setMessages(prev => [...prev, { id: `${data.req_id}:t`, role: 'user', text: data.text }]);
+      if (data.case_id) bystanderCase.current = data.case_id;
+      upsertTranscript(data.req_id, data.text);
       // Optionally update the UI to show the transcription
     });
 
@@ -94,6 +174,19 @@ export default function App() {
       ]);
     });
 
+    socket.on('caller_location', (data) => {
+      console.log('Bystander location for case', data.case_id, data.lat, data.lon);
+    });
+
+    socket.on('busy', (data) => {
+      const wait = Math.max(1, Math.round(data.estimated_wait));
+      const politeMsg = `The service is busy right now. Please try again in about ${wait} second${wait === 1 ? '' : 's'}.`;
+      setMessages(prev => [
+        ...prev,
+        { id: `${data.req_id}:busy`, role: 'user', type: 'error', text: politeMsg }
+      ]);
+    });
+
     socket.on('patient_info', (data) => {
       console.log('Patient Info:', data);
       setMessages(prev => [...prev, { id: `${data.req_id}:patient`, role: 'info', type: 'patient', data }]);
@@ -114,36 +207,101 @@ export default function App() {
       setMessages(prev => [...prev, { id: `${data.req_id}:hosp`, role: 'info', type: 'hospitals', data }]);
     });
 
+    // Inventory changes: patch the stock of the hospitals already on screen, keeping their distance
+    socket.on('hospital_resources_delta', (delta) => {
+      const changed = new Map(delta.hospitals.map(h => [h.id, h]));
+      const removed = new Set(delta.removed);
+      setMessages(prev => prev.map(m => {
+        if (m.type !== 'hospitals' || !m.data.hospitals.some(h => changed.has(h.id) || removed.has(h.id))) return m;
+        const hospitals = m.data.hospitals
+          .filter(h => !removed.has(h.id))
+          .map(h => changed.has(h.id) ? { ...changed.get(h.id), distance_km: h.distance_km, meets_needs: h.meets_needs } : h);
+        return { ...m, data: { ...m.data, hospitals } };
+      }));
+    });
+
+    // dispatch: generated for a bystander's call, next to the advice that call's `response` carries
     socket.on('operator_recommendation', (data) => {
-      setMessages(prev => [...prev, { id: data.req_id, role: 'bot', text: data.text, audioUrl: null }]);
+      const id = data.dispatch ? `${data.req_id}:dispatch` : data.req_id;
+      upsertReply(id, data.text, false);
       console.log('Operator Recommendation:', data.text);
     });
 
     socket.on('response', (data) => {
-      setMessages(prev => [...prev, { id: data.req_id, role: 'bot', text: data.text, audioUrl: null }]);
+      upsertReply(data.req_id, data.text, false);
       console.log('Response Text:', data.text);
     });
 
+    socket.on('response_delta', (data) => {
+      upsertReply(data.req_id, data.text, true);
+    });
+
+    socket.on('audio_chunk', (data) => {
+      if (replaying.current) return;
+      let queue = chunkQueue.current;
+      if (queue.reqId !== data.req_id) {
+        queue = chunkQueue.current = { reqId: data.req_id, urls: [], playing: false };
+      }
+      chunkPlayed.current.add(data.req_id);
+      queue.urls.push({ seq: data.seq, url: host + data.url });
+      queue.urls.sort((a, b) => a.seq - b.seq);
+      if (!queue.playing) playNextChunk();
+    });
+
+    // The reply as binary attachments, ahead of audio_url: play it without fetching the file
+    socket.on('audio_binary', (data) => {
+      const parts = binaryChunks.current[data.req_id] || (binaryChunks.current[data.req_id] = []);
+      if (!data.final) {
+        parts.push(data.data);
+        return;
+      }
+      delete binaryChunks.current[data.req_id];
+      if (!data.complete) return;
+      const url = URL.createObjectURL(new Blob(parts, { type: 'audio/mpeg' }));
+      binaryPlayed.current.add(data.req_id);
+      setMessages(prev => prev.map(m => m.id === data.req_id ? { ...m, audioUrl: url } : m));
+      playAudio(url, data.req_id);
+    });
+
     socket.on('audio_url', (data) => {
+      if (binaryPlayed.current.delete(data.req_id)) return;
       const full = host + data.url;
       setMessages(prev => prev.map(m => m.id === data.req_id ? { ...m, audioUrl: full } : m));
-      // AUTOPLAY right away
-      playAudio(full, data.req_id);
+      // Already heard sentence by sentence: keep the joined clip for replay only
+      if (chunkPlayed.current.delete(data.req_id)) return;
+      // AUTOPLAY right away, except for replayed history
+      if (!replaying.current) playAudio(full, data.req_id);
       console.log('Received audio URL:', host + data.url);
       // Handle playing the received audio URL here
     });
 
+    // Coalesced per-request events (OPERATOR_CASE_UPDATE_MS on the backend): replay each through its handler
+    socket.on('case_update', (update) => {
+      update.events.forEach(([name, data]) => {
+        socket.listeners(name).forEach((handler) => handler(data));
+      });
+    });
+
     return () => {
       socket.off('connect');
+      socket.off('history');
       socket.off('transcription');
+      socket.off('transcription_partial');
       socket.off('no_transcription');
+      socket.off('busy');
+      socket.off('caller_location');
       socket.off('patient_info');
       socket.off('database_patient_found');
       socket.off('knowledge_base_results');
       socket.off('hospital_resources');
+      socket.off('hospital_resources_delta');
       socket.off('operator_recommendation');
       socket.off('response');
+      socket.off('response_delta');
+      socket.off('audio_chunk');
       socket.off('audio_url');
+      socket.off('audio_binary');
+      socket.off('case_update');
     };
   }, []);
 
@@ -151,19 +309,6 @@ export default function App() {
     axios.get(host + 'healthz').then(r => console.log('Is backend reached:', r.data));
   }, []);
 
-  useEffect(() => {
-    if (recordingBlob) {
-      console.log('Sending audio blob to the server', recordingBlob);
-      const reader = new FileReader();
-      reader.onload = function (event) {
-        const arrayBuffer = event.target.result;
-        socket.emit('audio_data', arrayBuffer)
-      };
-
-      reader.readAsArrayBuffer(recordingBlob);
-    }
-  }, [recordingBlob]);
-
   return (
     <div
       style={{
@@ -183,7 +328,7 @@ export default function App() {
             messages={messages}
             playingId={playingId}
             paused={paused}
-            onPlay={(url,id)=>playAudio(url,id)}
+            onPlay={(url,id)=>{ chunkQueue.current = { reqId: null, urls: [], playing: false }; playAudio(url,id); }}
             onPause={pauseAudio}
             onResume={resumeAudio}/>
         </div>
@@ -208,11 +353,14 @@ export default function App() {
               },
             })}
             color="primary"
-            onClick={isRecording ? handleStopRecording : startRecording}
+            onClick={isRecording ? handleStopRecording : handleStartRecording}
             aria-label={isRecording ? "Stop recording" : "Start recording"}
         >
           {isRecording ? <StopIcon sx={{ fontSize: '5rem' }} /> : <MicIcon sx={{ fontSize: '5rem' }} />}
         </IconButton>
+        <Button variant="outlined" onClick={handleNewCase} disabled={isRecording}>
+          New case
+        </Button>
       </div>
     </div>
   );
@@ -0,0 +1,40 @@
+import { useRef, useState } from 'react';
+
+// Records with MediaRecorder in timeslice mode and hands every slice to onChunk(seq, blob, final)
+// while the caller is still talking, so the backend transcribes as the audio arrives.
+// seq restarts at 0 per recording; the last call has final: true and no audio
+export function useChunkedRecorder(onChunk, timeslice = 250) {
+  const [isRecording, setIsRecording] = useState(false);
+  const recorder = useRef(null);
+
+  const startRecording = async () => {
+    if (recorder.current) return;
+    let stream;
+    try {
+      stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    } catch (err) {
+      console.warn('Microphone unavailable:', err);
+      return;
+    }
+    const rec = new MediaRecorder(stream);
+    let seq = 0;
+    rec.ondataavailable = (e) => {
+      if (e.data && e.data.size) onChunk(seq++, e.data, false);
+    };
+    rec.onstop = () => {
+      onChunk(seq, null, true);
+      stream.getTracks().forEach(track => track.stop());
+      recorder.current = null;
+      setIsRecording(false);
+    };
+    recorder.current = rec;
+    rec.start(timeslice);
+    setIsRecording(true);
+  };
+
+  const stopRecording = () => {
+    if (recorder.current && recorder.current.state !== 'inactive') recorder.current.stop();
+  };
+
+  return { startRecording, stopRecording, isRecording };
+}
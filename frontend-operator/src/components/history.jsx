@@ -108,7 +108,7 @@ function History({ messages, onPlay, onPause, onResume, playingId, paused }) {
                                             {msg.data.hospitals.slice(0, 3).map((h, idx) => (
                                                 <div key={idx} style={{marginTop: '12px', borderTop: idx > 0 ? '1px solid #ddd' : 'none', paddingTop: '8px'}}>
                                                     <p><strong>{h.name}</strong></p>
-                                                    <p style={{fontSize: '0.9em'}}>{h.address}</p>
+                                                    <p style={{fontSize: '0.9em'}}>{h.address}{h.distance_km != null && ` · ${h.distance_km} km`}</p>
                                                     <p><strong>Blood:</strong> {h.blood_plasma.length} types ({h.blood_plasma.map(b => `${b.type}: ${b.stock}`).join(', ')})</p>
                                                     <p><strong>Meds:</strong> {h.medications.slice(0, 2).map(m => m.name).join(', ')}</p>
                                                 </div>
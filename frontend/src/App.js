@@ -3,9 +3,9 @@ import axios from 'axios';
 import IconButton from '@mui/material/IconButton';
 import MicIcon from '@mui/icons-material/Mic';
 import StopIcon from '@mui/icons-material/Stop';
-import { useAudioRecorder } from 'react-audio-voice-recorder';
 import { io } from "socket.io-client";
 import History from "./components/history";
+import { useChunkedRecorder } from "./chunkedRecorder";
 
 import "./App.css";
 
@@ -13,12 +13,12 @@ const host = 'http://localhost:5000/'
 const socket = io(host)
 
 export default function App() {
+  // Each slice goes out as an audio_chunk (binary attachment) while the caller is still talking
   const {
     startRecording,
     stopRecording,
-    recordingBlob,
     isRecording
-  } = useAudioRecorder();
+  } = useChunkedRecorder((seq, data, final) => socket.emit('audio_chunk', { seq, data, final }));
 
   const [messages, setMessages] = useState(
       [{id: "card-1", role: "card", audioUrl: `${host}static/audio/20251004_202134.mp3`},
@@ -27,13 +27,24 @@ export default function App() {
 
   // ONE shared audio element
   const playerRef = useRef(new Audio());
+  // AUDIO_TRANSPORT=binary: reply chunks per req_id, and replies already played from them
+  const binaryChunks = useRef({});
+  const binaryPlayed = useRef(new Set());
+  // STREAM_RESPONSES: the reply's sentence clips (audio_chunk), played one after another in seq
+  // order as they arrive; replies played that way don't replay their joined audio_url
+  const chunkQueue = useRef({ reqId: null, urls: [], playing: false });
+  const chunkPlayed = useRef(new Set());
   const [playingId, setPlayingId] = useState("card-1");
   const [paused, setPaused] = useState(true);
   const [isFirstClick, setIsFirstClick] = useState(true);
 
   useEffect(() => {
     const a = playerRef.current;
-    const onEnded = () => { setPlayingId(null); setPaused(false); };
+    const onEnded = () => {
+      setPlayingId(null);
+      setPaused(false);
+      if (chunkQueue.current.playing) playNextChunk();
+    };
     const onPause = () => setPaused(true);
     const onPlay = () => setPaused(false);
 
@@ -65,6 +76,28 @@ export default function App() {
     }
   };
 
+  const playNextChunk = () => {
+    const queue = chunkQueue.current;
+    const next = queue.urls.shift();
+    queue.playing = next !== undefined;
+    if (queue.playing) playAudio(next.url, queue.reqId);
+  };
+
+  const upsertTranscript = (reqId, text) => {
+    const id = `${reqId}:t`;
+    setMessages(prev => prev.some(m => m.id === id)
+      ? prev.map(m => m.id === id ? { ...m, text } : m)
+      : [...prev, { id, role: 'user', text }]);
+  };
+
+  // Streamed reply text: one message per req_id, grown by response_delta, replaced by the final text
+  const upsertReply = (id, text, append) => {
+    setMessages(prev => {
+      if (!prev.some(m => m.id === id)) return [...prev, { id, role: 'bot', text, audioUrl: null }];
+      return prev.map(m => m.id === id ? { ...m, text: append ? m.text + text : text } : m);
+    });
+  };
+
   const pauseAudio = () => {
     const a = playerRef.current;
     if (!a.paused) a.pause(); // `paused` will flip via event listener
@@ -82,11 +115,23 @@ export default function App() {
   useEffect(() => {
     socket.on('connect', () => {
       console.log('Connected to WebSocket server');
+      // Share the caller's position so operators get the nearest suitable hospitals
+      if (navigator.geolocation) {
+        navigator.geolocation.getCurrentPosition(
+          (pos) => socket.emit('caller_location', { lat: pos.coords.latitude, lon: pos.coords.longitude }),
+          (err) => console.warn('Location unavailable:', err.message)
+        );
+      }
+    });
+
+    // The running transcript while the caller is still talking, replaced by `transcription`
+    socket.on('transcription_partial', (data) => {
+      upsertTranscript(data.req_id, data.text);
     });
 
     socket.on('transcription', (data) => {
       console.log('Transcription:', data.text);
-      setMessages(prev => [...prev, { id: `${data.req_id}:t`, role: 'user', text: data.text }]);
+      upsertTranscript(data.req_id, data.text);
       // Optionally update the UI to show the transcription
     });
 
@@ -98,15 +143,57 @@ export default function App() {
       ]);
     });
 
+    socket.on('busy', (data) => {
+      const wait = Math.max(1, Math.round(data.estimated_wait));
+      const politeMsg = `The service is busy right now. Please try again in about ${wait} second${wait === 1 ? '' : 's'}.`;
+      setMessages(prev => [
+        ...prev,
+        { id: `${data.req_id}:busy`, role: 'user', type: 'error', text: politeMsg }
+      ]);
+    });
+
     socket.on('response', (data) => {
-      setMessages(prev => [...prev, { id: data.req_id, role: 'bot', text: data.text, audioUrl: null }]);
+      upsertReply(data.req_id, data.text, false);
       console.log('Response Text:', data.text);
       // Optionally update the UI to show the response text
     });
 
+    socket.on('response_delta', (data) => {
+      upsertReply(data.req_id, data.text, true);
+    });
+
+    socket.on('audio_chunk', (data) => {
+      let queue = chunkQueue.current;
+      if (queue.reqId !== data.req_id) {
+        queue = chunkQueue.current = { reqId: data.req_id, urls: [], playing: false };
+      }
+      chunkPlayed.current.add(data.req_id);
+      queue.urls.push({ seq: data.seq, url: host + data.url });
+      queue.urls.sort((a, b) => a.seq - b.seq);
+      if (!queue.playing) playNextChunk();
+    });
+
+    // The reply as binary attachments, ahead of audio_url: play it without fetching the file
+    socket.on('audio_binary', (data) => {
+      const parts = binaryChunks.current[data.req_id] || (binaryChunks.current[data.req_id] = []);
+      if (!data.final) {
+        parts.push(data.data);
+        return;
+      }
+      delete binaryChunks.current[data.req_id];
+      if (!data.complete) return;
+      const url = URL.createObjectURL(new Blob(parts, { type: 'audio/mpeg' }));
+      binaryPlayed.current.add(data.req_id);
+      setMessages(prev => prev.map(m => m.id === data.req_id ? { ...m, audioUrl: url } : m));
+      playAudio(url, data.req_id);
+    });
+
     socket.on('audio_url', (data) => {
+      if (binaryPlayed.current.delete(data.req_id)) return;
       const full = host + data.url;
       setMessages(prev => prev.map(m => m.id === data.req_id ? { ...m, audioUrl: full } : m));
+      // Already heard sentence by sentence: keep the joined clip for replay only
+      if (chunkPlayed.current.delete(data.req_id)) return;
       // AUTOPLAY right away
       playAudio(full, data.req_id);
       console.log('Received audio URL:', host + data.url);
@@ -116,9 +203,14 @@ export default function App() {
     return () => {
       socket.off('connect');
       socket.off('transcription');
+      socket.off('transcription_partial');
       socket.off('no_transcription');
+      socket.off('busy');
       socket.off('response');
+      socket.off('response_delta');
+      socket.off('audio_chunk');
       socket.off('audio_url');
+      socket.off('audio_binary');
     };
   }, []);
 
@@ -126,19 +218,6 @@ export default function App() {
     axios.get(host + 'healthz').then(r => console.log('Is backend reached:', r.data));
   }, []);
 
-  useEffect(() => {
-    if (recordingBlob) {
-      console.log('Sending audio blob to the server', recordingBlob);
-      const reader = new FileReader();
-      reader.onload = function (event) {
-        const arrayBuffer = event.target.result;
-        socket.emit('audio_data', arrayBuffer)
-      };
-
-      reader.readAsArrayBuffer(recordingBlob);
-    }
-  }, [recordingBlob]);
-
   return (
     <div
       style={{
@@ -158,7 +237,7 @@ export default function App() {
             messages={messages}
             playingId={playingId}
             paused={paused}
-            onPlay={(url,id)=>playAudio(url,id)}
+            onPlay={(url,id)=>{ chunkQueue.current = { reqId: null, urls: [], playing: false }; playAudio(url,id); }}
             onPause={pauseAudio}
             onResume={resumeAudio}
             isFirstClick={isFirstClick}